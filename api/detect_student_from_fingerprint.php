@@ -111,19 +111,22 @@ try {
         exit();
     }
     
-    // Try to match fingerprint against each student
+    // Match the fingerprint against every student of the session in a single Python process
     $best_match = null;
     $best_score = 0;
     
+    $students_by_id = [];
     foreach ($students as $student) {
-        $result = verifyFingerprintWithPython($image_path, $student['student_id'], $config);
-        
-        if ($result['success'] && isset($result['is_valid']) && $result['is_valid']) {
-            $score = $result['match_score'] ?? 0;
-            if ($score > $best_score) {
-                $best_score = $score;
-                $best_match = $student;
-            }
+        $students_by_id[(string)$student['student_id']] = $student;
+    }
+    
+    $result = identifyFingerprintWithPython($image_path, array_keys($students_by_id), $config);
+    
+    if ($result['success'] && !empty($result['best_match'])) {
+        $match_id = (string)$result['best_match']['student_id'];
+        if (isset($students_by_id[$match_id]) && !empty($result['best_match']['is_valid'])) {
+            $best_score = $result['best_match']['match_score'] ?? 0;
+            $best_match = $students_by_id[$match_id];
         }
     }
     
@@ -155,17 +158,18 @@ try {
 echo json_encode($response, JSON_PRETTY_PRINT);
 
 /**
- * Verify fingerprint using Python script
+ * Identify fingerprint among the given students using the Python script (1:N)
  */
-function verifyFingerprintWithPython($image_path, $student_id, $config) {
+function identifyFingerprintWithPython($image_path, $student_ids, $config) {
+    $ids_path = null;
     try {
         // Check if Python script exists
         if (!file_exists($config['python_script'])) {
             return [
                 'success' => false,
                 'message' => 'Fingerprint verification script not found',
-                'is_valid' => false,
-                'match_score' => 0
+                'best_match' => null,
+                'matches' => []
             ];
         }
         
@@ -178,15 +182,20 @@ function verifyFingerprintWithPython($image_path, $student_id, $config) {
             return [
                 'success' => false,
                 'message' => 'Python is not available or not in PATH',
-                'is_valid' => false,
-                'match_score' => 0
+                'best_match' => null,
+                'matches' => []
             ];
         }
         
+        // Candidate student IDs are passed through a temp file to avoid command-line limits
+        $ids_path = $config['uploads_dir'] . '/fingerprint_candidates_' . uniqid() . '.txt';
+        file_put_contents($ids_path, implode("\n", array_map('strval', $student_ids)));
+        
         // Prepare command
         $cmd = $python . ' ' . escapeshellarg($config['python_script']) .
+               ' --identify' .
                ' --captured ' . escapeshellarg($image_path) .
-               ' --student-id ' . escapeshellarg($student_id) .
+               ' --student-ids-file ' . escapeshellarg($ids_path) .
                ' --uploads-dir ' . escapeshellarg($config['uploads_dir']);
         
         // Execute Python script
@@ -194,17 +203,6 @@ function verifyFingerprintWithPython($image_path, $student_id, $config) {
         $exit_code = 0;
         exec($cmd . ' 2>&1', $output, $exit_code);
         
-        if ($exit_code !== 0) {
-            $error_output = implode("\n", $output);
-            error_log("Python script failed with exit code $exit_code: $error_output");
-            return [
-                'success' => false,
-                'message' => 'Fingerprint verification failed: ' . $error_output,
-                'is_valid' => false,
-                'match_score' => 0
-            ];
-        }
-        
         // Parse JSON output
         $json_output = implode("\n", $output);
         
@@ -216,12 +214,12 @@ function verifyFingerprintWithPython($image_path, $student_id, $config) {
         $result = json_decode($json_output, true);
         
         if (json_last_error() !== JSON_ERROR_NONE) {
-            error_log("JSON decode error: " . json_last_error_msg() . " for output: " . $json_output);
+            error_log("Python script failed with exit code $exit_code: " . implode("\n", $output));
             return [
                 'success' => false,
-                'message' => 'Invalid response from fingerprint verification script: ' . json_last_error_msg(),
-                'is_valid' => false,
-                'match_score' => 0
+                'message' => 'Invalid response from fingerprint identification script: ' . json_last_error_msg(),
+                'best_match' => null,
+                'matches' => []
             ];
         }
         
@@ -229,18 +227,22 @@ function verifyFingerprintWithPython($image_path, $student_id, $config) {
         return [
             'success' => $result['success'] ?? false,
             'message' => $result['message'] ?? 'Unknown error',
-            'is_valid' => $result['is_valid'] ?? false,
-            'match_score' => $result['match_score'] ?? 0
+            'best_match' => $result['best_match'] ?? null,
+            'matches' => $result['matches'] ?? []
         ];
         
     } catch (Exception $e) {
-        error_log("Exception in verifyFingerprintWithPython: " . $e->getMessage());
+        error_log("Exception in identifyFingerprintWithPython: " . $e->getMessage());
         return [
             'success' => false,
-            'message' => 'Error executing fingerprint verification: ' . $e->getMessage(),
-            'is_valid' => false,
-            'match_score' => 0
+            'message' => 'Error executing fingerprint identification: ' . $e->getMessage(),
+            'best_match' => null,
+            'matches' => []
         ];
+    } finally {
+        if ($ids_path !== null && file_exists($ids_path)) {
+            unlink($ids_path);
+        }
     }
 }
 ?>
@@ -1,5 +1,6 @@
 <?php
 require_once __DIR__ . '/../lib/db.php';
+require_once __DIR__ . '/../lib/face_service.php';
 if (session_status() !== PHP_SESSION_ACTIVE) { @session_start(); }
 header('Content-Type: application/json');
 header('Access-Control-Allow-Origin: *');
@@ -73,24 +74,36 @@ try {
         throw new RuntimeException('Identification script or photos dir missing');
     }
 
-    $isWindows = strtoupper(substr(PHP_OS, 0, 3)) === 'WIN';
-    $python = $isWindows ? 'python' : 'python3';
-    $dq = function($s) { return '"' . str_replace('"', '""', $s) . '"'; };
-    $arg = function($s) use ($isWindows, $dq) { return $isWindows ? $dq($s) : escapeshellarg($s); };
-    $cmd = $python
-        . ' ' . $arg($script)
-        . ' --image_path ' . $arg($targetPath)
-        . ' --photos_dir ' . $arg($photosDir)
-        . ' --allowed_ids_path ' . $arg($allowedIdsPath)
-        . ' --threshold ' . ($isWindows ? $dq((string)$config['identification_threshold']) : escapeshellarg((string)$config['identification_threshold']))
-        . ' --min_margin ' . ($isWindows ? $dq('0.01') : escapeshellarg('0.01'))
-        . ' 2>&1';
-
+    // Prefer the resident face service (templates already loaded); fall back to the CLI
+    $cmd = null;
     $output = [];
     $code = 0;
-    exec($cmd, $output, $code);
-    $json = implode("\n", $output);
-    $ident = json_decode($json, true);
+    $ident = face_service_request('/identify', [
+        'image_path' => $targetPath,
+        'allowed_ids' => array_map('strval', $eligible),
+        'threshold' => $config['identification_threshold'],
+        'min_margin' => 0.01
+    ]);
+    $json = $ident !== null ? json_encode($ident) : '';
+
+    if ($ident === null) {
+        $isWindows = strtoupper(substr(PHP_OS, 0, 3)) === 'WIN';
+        $python = $isWindows ? 'python' : 'python3';
+        $dq = function($s) { return '"' . str_replace('"', '""', $s) . '"'; };
+        $arg = function($s) use ($isWindows, $dq) { return $isWindows ? $dq($s) : escapeshellarg($s); };
+        $cmd = $python
+            . ' ' . $arg($script)
+            . ' --image_path ' . $arg($targetPath)
+            . ' --photos_dir ' . $arg($photosDir)
+            . ' --allowed_ids_path ' . $arg($allowedIdsPath)
+            . ' --threshold ' . ($isWindows ? $dq((string)$config['identification_threshold']) : escapeshellarg((string)$config['identification_threshold']))
+            . ' --min_margin ' . ($isWindows ? $dq('0.01') : escapeshellarg('0.01'))
+            . ' 2>&1';
+
+        exec($cmd, $output, $code);
+        $json = implode("\n", $output);
+        $ident = json_decode($json, true);
+    }
 
     // Cleanup temp files
     if (file_exists($targetPath)) unlink($targetPath);
@@ -1,5 +1,6 @@
 <?php
 require_once __DIR__ . '/../lib/db.php';
+require_once __DIR__ . '/../lib/face_service.php';
 header('Content-Type: application/json');
 header('Access-Control-Allow-Origin: *');
 header('Access-Control-Allow-Methods: POST, GET, OPTIONS');
@@ -329,6 +330,19 @@ function performFaceVerification($student_id, $captured_image_path, $config) {
         ];
     }
     
+    // Prefer the resident face service, which keeps reference templates loaded
+    $service_result = face_service_request('/verify', [
+        'student_id' => (string)$student_id,
+        'image_path' => realpath($captured_image_path) ?: $captured_image_path,
+        'threshold' => $config['validation_threshold']
+    ]);
+    if ($service_result !== null) {
+        if (!isset($service_result['timestamp'])) {
+            $service_result['timestamp'] = date('Y-m-d H:i:s');
+        }
+        return $service_result;
+    }
+    
     // Build the command
     $command = sprintf(
         'python3 "%s" --verify --student_id "%s" --image_path "%s" --photos_dir "%s" --threshold %f --output_format json 2>&1',
@@ -3,6 +3,7 @@ header('Content-Type: application/json');
 header('Cache-Control: no-cache, no-store, must-revalidate');
 
 require_once __DIR__ . '/../lib/db.php';
+require_once __DIR__ . '/../lib/stage_service.php';
 
 // Function to trigger display notifications
 function trigger_display_notification($graduate_id) {
@@ -157,6 +158,8 @@ try {
             if ($_POST['confirm'] === 'true') {
                 $db->prepare("UPDATE graduates SET queued_at = NULL, announced_at = NULL")->execute();
                 $db->prepare("UPDATE current_announcement SET graduate_id = NULL, updated_at = datetime('now') WHERE id = 1")->execute();
+                // Drop the resident service's tracks and cached queue too (null when it is not running)
+                stage_service_request('/reset', [], 2.0);
                 
                 $response = ['success' => true, 'message' => 'Queue reset successfully'];
             } else {
@@ -165,64 +168,57 @@ try {
             break;
             
         case 'process_stage_frame':
-            // Process a stage detection frame using the Python CLI script
+            // Process a stage detection frame; the JPEG bytes go straight to Python, never via a copy on disk
             if (empty($_FILES['frame']) || $_FILES['frame']['error'] !== UPLOAD_ERR_OK) {
                 throw new RuntimeException('No frame uploaded');
             }
-            
-            $python_script = __DIR__ . '/../integrations/stage_detection_cli.py';
-            if (!file_exists($python_script)) {
-                throw new RuntimeException('Detection script not found');
+            $frame = file_get_contents($_FILES['frame']['tmp_name']);
+            if ($frame === false || $frame === '') {
+                throw new RuntimeException('Failed to read uploaded frame');
             }
             
-            // Save uploaded frame temporarily
-            $tmpPath = $_FILES['frame']['tmp_name'];
-            $uploadsDir = realpath(__DIR__ . '/../uploads');
-            if (!$uploadsDir) {
-                $uploadsDir = __DIR__ . '/../uploads';
-                if (!is_dir($uploadsDir)) {
-                    mkdir($uploadsDir, 0755, true);
-                }
-            }
-            $targetPath = $uploadsDir . '/stage_' . uniqid() . '.jpg';
-            if (!move_uploaded_file($tmpPath, $targetPath)) {
-                throw new RuntimeException('Failed to store uploaded frame');
-            }
+            // Prefer the resident stage service, which keeps the detector loaded and tracks people between frames
+            $result = stage_service_send_frame($frame);
             
-            try {
-                // Execute Python script
+            if ($result === null) {
+                $python_script = __DIR__ . '/../integrations/stage_detection_cli.py';
+                if (!file_exists($python_script)) {
+                    throw new RuntimeException('Detection script not found');
+                }
+                
+                // Execute Python script, feeding the frame on stdin
                 $isWindows = strtoupper(substr(PHP_OS, 0, 3)) === 'WIN';
                 $python = $isWindows ? 'python' : 'python3';
                 $command = sprintf(
-                    '%s "%s" --image_path "%s" --db_path "%s" --output_format json 2>&1',
+                    '%s "%s" --stdin --db_path "%s" --output_format json',
                     $python,
                     $python_script,
-                    $targetPath,
                     realpath(__DIR__ . '/../data/app.sqlite')
                 );
-                
-                $output = [];
-                $return_code = 0;
-                exec($command, $output, $return_code);
-                $json_output = implode("\n", $output);
+                $descriptorSpec = [0 => ['pipe', 'r'], 1 => ['pipe', 'w'], 2 => ['pipe', 'w']];
+                $proc = proc_open($command, $descriptorSpec, $pipes);
+                if (!\is_resource($proc)) {
+                    throw new RuntimeException('Failed to start detection process');
+                }
+                fwrite($pipes[0], $frame);
+                fclose($pipes[0]);
+                $json_output = stream_get_contents($pipes[1]);
+                $stderr = stream_get_contents($pipes[2]);
+                fclose($pipes[1]);
+                fclose($pipes[2]);
+                proc_close($proc);
                 $result = json_decode($json_output, true);
                 
                 if (json_last_error() !== JSON_ERROR_NONE) {
-                    throw new RuntimeException('Invalid Python script output: ' . $json_output);
-                }
-                
-                $response = [
-                    'success' => true,
-                    'message' => 'Stage detection processed successfully',
-                    'data' => $result
-                ];
-                
-            } finally {
-                // Clean up temporary file
-                if (file_exists($targetPath)) {
-                    unlink($targetPath);
+                    throw new RuntimeException('Invalid Python script output: ' . $json_output . $stderr);
                 }
             }
+            
+            $response = [
+                'success' => true,
+                'message' => 'Stage detection processed successfully',
+                'data' => $result
+            ];
             break;
             
         default:
@@ -168,7 +168,7 @@ try {
             'fingerprint_validation' => [
                 'is_valid' => $result['is_valid'] ?? false,
                 'match_score' => $result['match_score'] ?? 0.0,
-                'threshold' => $result['threshold'] ?? 0.25,
+                'threshold' => $result['threshold'] ?? 0.75,
                 'confidence' => $result['match_score'] ?? 0.0
             ]
         ];
@@ -199,7 +199,7 @@ try {
             'fingerprint_validation' => [
                 'is_valid' => false,
                 'match_score' => 0.0,
-                'threshold' => 0.25,
+                'threshold' => 0.75,
                 'confidence' => 0.0
             ]
         ];
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Benchmark Runner
+Times the integration hot paths on synthetic data and writes the results as JSON, so runs from
+different commits can be compared (--compare) before a ceremony instead of during one.
+
+Suites:
+  face         FaceRecognitionValidator.load_student_photos (cold and cached) and validate_student_face
+  identify     1:N identification against 100 / 1k / 10k known faces, LBPH train vs saved model
+  fingerprint  FingerprintVerifier preprocessing, extract_features, compare_fingerprints(_batch)
+  qr           decode_qr.decode_image across rotations and scales, plus a frame without a code
+  stage        StageDetector.process_frame per HOG profile, and the tracking/decision path alone
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'integrations'))
+
+import synthetic  # noqa: E402
+from timing import percentiles  # noqa: E402
+
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+
+def measure(fn, repeat, warmup=1, setup=None):
+    """
+    Call fn repeat times (after warmup untimed calls) and return latency percentiles in ms.
+    setup, if given, runs untimed before every call; its return value is passed to fn.
+    """
+    for _ in range(warmup):
+        fn(setup() if setup else None)
+    samples = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        started = time.perf_counter()
+        fn(arg)
+        samples.append((time.perf_counter() - started) * 1000.0)
+    return percentiles(samples)
+
+
+@contextlib.contextmanager
+def quiet():
+    """The integrations print progress per photo/frame; keep it out of the benchmark output"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def bench_face(config, workdir):
+    from face_recognition_validator import FaceRecognitionValidator
+    results = OrderedDict()
+    photos_dir = os.path.join(workdir, 'faces')
+    synthetic.write_student_photos(photos_dir, config['photos'])
+    cache_dir = os.path.join(photos_dir, '.face_cache')
+
+    def load(_):
+        with quiet():
+            validator = FaceRecognitionValidator(photos_dir, use_dcgan=False, autoload=False)
+            return validator.load_student_photos()
+
+    def cold():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    results['face.load_student_photos.cold'] = measure(load, config['load_repeat'], warmup=0, setup=cold)
+    results['face.load_student_photos.cold']['photos'] = config['photos']
+    load(None)
+    results['face.load_student_photos.cached'] = measure(load, config['load_repeat'], warmup=0)
+
+    with quiet():
+        validator = FaceRecognitionValidator(photos_dir, use_dcgan=False)
+    frames = [synthetic.make_face_frame(i) for i in range(config['frames'])]
+
+    def validate(_):
+        i = validate.calls % len(frames)
+        validate.calls += 1
+        validator.validate_student_face(frames[i], synthetic.student_id(i))
+    validate.calls = 0
+    results['face.validate_student_face'] = measure(validate, config['repeat'])
+    # Accuracy guard: a faster path that stops verifying the right student is not an improvement
+    results['face.validate_student_face']['verified'] = sum(
+        int(validator.validate_student_face(frame, synthetic.student_id(i))['is_valid'])
+        for i, frame in enumerate(frames))
+    results['face.validate_student_face']['frames'] = len(frames)
+    return results
+
+
+def bench_identify(config, workdir):
+    from face_recognition_validator import FaceRecognitionValidator
+    results = OrderedDict()
+    photos_dir = os.path.join(workdir, 'identify')
+    base_paths = synthetic.write_student_photos(photos_dir, config['identify_base'])
+    with quiet():
+        validator = FaceRecognitionValidator(photos_dir, use_dcgan=False, use_template_index=False, autoload=False)
+        base = [t for t in (validator.create_face_template(p) for p in base_paths) if t is not None]
+    rng = np.random.default_rng(0)
+    frame = synthetic.make_face_frame(0)
+    query = validator.extract_faces_with_boxes(frame)[0][0]
+
+    for size in config['gallery_sizes']:
+        validator.known_faces = {}
+        validator._gallery = None
+        for i in range(size):
+            noise = rng.integers(-12, 13, base[0].shape)
+            template = np.clip(base[i % len(base)].astype(np.int16) + noise, 0, 255).astype(np.uint8)
+            validator._store_known_face(synthetic.student_id(i), os.path.join(photos_dir, f"n{i}.jpg"), template)
+        started = time.perf_counter()
+        validator._identification_gallery()
+        key = f"identify.n{size}"
+        results[f"{key}.gallery_build"] = {'count': 1, 'mean': round((time.perf_counter() - started) * 1000.0, 2)}
+        results[f"{key}.identify_template"] = measure(lambda _: validator.identify_template(query), config['repeat'])
+        allowed = set(synthetic.student_id(i) for i in range(0, size, max(1, size // 100)))
+        results[f"{key}.identify_template_allowed"] = measure(
+            lambda _: validator.identify_template(query, allowed_ids=allowed), config['repeat'])
+        results[f"{key}.identify_template_allowed"]['allowed'] = len(allowed)
+        results[f"{key}.identify_frame"] = measure(lambda _: validator.identify(frame), config['repeat'])
+        if size > config['lbph_max_gallery']:
+            continue
+        # LBPH: training on the whole gallery vs reading the model saved for this photo set
+        results[f"{key}.lbph_train"] = measure(lambda _: validator.build_lbph_model(), config['load_repeat'], warmup=0)
+        validator.save_lbph_model()
+
+        def load_saved(_):
+            validator._lbph = None
+            validator.load_lbph_model()
+        results[f"{key}.lbph_load_saved"] = measure(load_saved, config['load_repeat'], warmup=0)
+        results[f"{key}.lbph_predict_allowed"] = measure(
+            lambda _: validator.lbph_predict(query, allowed_ids=allowed), config['repeat'])
+    return results
+
+
+def bench_fingerprint(config, workdir):
+    logging.getLogger('fingerprint_verification').setLevel(logging.ERROR)
+    from fingerprint_verification import FingerprintVerifier
+    results = OrderedDict()
+    prints_dir = os.path.join(workdir, 'fingerprints')
+    os.makedirs(prints_dir, exist_ok=True)
+    paths = []
+    for i in range(config['fingerprints']):
+        path = os.path.join(prints_dir, f"{synthetic.student_id(i)}_ref.png")
+        cv2.imwrite(path, synthetic.make_fingerprint(i))
+        paths.append(path)
+    probe_path = os.path.join(prints_dir, 'probe.png')
+    cv2.imwrite(probe_path, synthetic.make_fingerprint(0, impression=1))
+    verifier = FingerprintVerifier(uploads_dir=prints_dir, use_feature_cache=False)
+
+    results['fingerprint.preprocess'] = measure(lambda _: verifier.preprocess_fingerprint(probe_path), config['repeat'])
+    probe_image = verifier.preprocess_fingerprint(probe_path)
+    results['fingerprint.extract_features'] = measure(lambda _: verifier.extract_features(probe_image), config['repeat'])
+    probe = verifier.extract_features(probe_image)
+    references = [verifier.extract_features(verifier.preprocess_fingerprint(p)) for p in paths]
+    results['fingerprint.compare_fingerprints'] = measure(
+        lambda _: verifier.compare_fingerprints(probe, references[0]), config['repeat'])
+    stacked = verifier.stack_reference_features(references)
+    results['fingerprint.compare_fingerprints_batch'] = measure(
+        lambda _: verifier.compare_fingerprints_batch(probe, stacked), config['repeat'])
+    results['fingerprint.compare_fingerprints_batch']['references'] = len(references)
+    scores = verifier.compare_fingerprints_batch(probe, stacked)
+    results['fingerprint.compare_fingerprints_batch']['genuine_rank'] = int(np.argsort(-scores).tolist().index(0)) + 1
+    return results
+
+
+def bench_qr(config, workdir):
+    import decode_qr
+    results = OrderedDict()
+    text = f"{synthetic.student_id(7)}|Graduate 7|BSc Computer Science"
+    for rotation in (0, 90, 180, 270):
+        for scale in config['qr_scales']:
+            image = synthetic.make_qr(text, rotation=rotation, scale=scale, noise=6, seed=rotation)
+            stats = {}
+            decoded = decode_qr.decode_image(image, stats)
+            key = f"qr.rot{rotation}.scale{scale:g}"
+            results[key] = measure(lambda _: decode_qr.decode_image(image), config['repeat'])
+            results[key].update({'decoded': decoded == text, 'attempts': stats.get('attempts', 0)})
+    # No code at all: every rotation, scale and enhancement is tried
+    frame, _ = synthetic.make_stage_frame([300], width=640, height=480)
+    stats = {}
+    decode_qr.decode_image(frame, stats)
+    results['qr.no_code'] = measure(lambda _: decode_qr.decode_image(frame), max(1, config['repeat'] // 4))
+    results['qr.no_code']['attempts'] = stats.get('attempts', 0)
+    return results
+
+
+def bench_stage(config, workdir):
+    import database
+    from stage_detection import StageDetector
+    results = OrderedDict()
+    conn = database.connect(database.MEMORY_DB_PATH)
+    synthetic.make_graduates_db(conn, config['graduates'])
+    with quiet():
+        detector = StageDetector(db_path=database.MEMORY_DB_PATH, detection_workers=1, notify_display=False)
+        detector.connect_database()
+    walk = synthetic.walk_positions(config['frames'])
+    frames = [synthetic.make_stage_frame([x, 960 - x], seed=i) for i, x in enumerate(walk)]
+
+    def run(detect):
+        def step(_):
+            i = step.calls % len(frames)
+            step.calls += 1
+            frame, people = frames[i]
+            detector.process_frame(frame.copy(), None if detect else people, detect=detect,
+                                   now=step.calls / 30.0)
+        step.calls = 0
+        return step
+
+    with quiet():
+        for profile in ('fast', 'balanced', 'accurate'):
+            detector.detection_profile = profile
+            detector.load_custom_model()
+            results[f"stage.process_frame.{profile}"] = measure(run(True), config['repeat'])
+        results['stage.process_frame.decision_only'] = measure(run(False), config['repeat'] * 4)
+        results['stage.gate_frame'] = measure(
+            lambda _: detector.gate_frame(frames[0][0], time.time()), config['repeat'] * 4)
+    detector.notifier.stop()
+    database.release(database.MEMORY_DB_PATH)
+    return results
+
+
+SUITES = OrderedDict([
+    ('face', bench_face),
+    ('identify', bench_identify),
+    ('fingerprint', bench_fingerprint),
+    ('qr', bench_qr),
+    ('stage', bench_stage),
+])
+
+FULL = {'repeat': 30, 'load_repeat': 3, 'photos': 100, 'frames': 20, 'identify_base': 50,
+        'gallery_sizes': [100, 1000, 10000], 'fingerprints': 100, 'qr_scales': [0.5, 1.0, 2.0],
+        'graduates': 100, 'lbph_max_gallery': 1000}
+QUICK = {'repeat': 8, 'load_repeat': 1, 'photos': 20, 'frames': 8, 'identify_base': 10,
+         'gallery_sizes': [100, 1000], 'fingerprints': 20, 'qr_scales': [1.0],
+         'graduates': 20, 'lbph_max_gallery': 1000}
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                                text=True, timeout=10).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT_DIR,
+                               capture_output=True, text=True, timeout=30).stdout.strip()
+        return commit or None, bool(dirty)
+    except (OSError, subprocess.SubprocessError):
+        return None, False
+
+
+def environment(quick):
+    commit, dirty = git_commit()
+    return {
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'commit': commit,
+        'dirty': dirty,
+        'quick': quick,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+    }
+
+
+def compare(current, baseline_path, max_regression=None):
+    """Print p50 (or mean) changes against a baseline file; returns the keys slower than max_regression"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"Compared with {baseline_path} (commit {baseline.get('meta', {}).get('commit')})")
+    regressions = []
+    for key, stats in current['results'].items():
+        old = baseline.get('results', {}).get(key)
+        if not old:
+            continue
+        metric = 'p50' if 'p50' in stats and 'p50' in old else 'mean'
+        if not old.get(metric) or metric not in stats:
+            continue
+        change = stats[metric] / old[metric] - 1.0
+        flag = ''
+        if max_regression is not None and change > max_regression:
+            regressions.append(key)
+            flag = '  REGRESSION'
+        print(f"  {key:<52} {old[metric]:>9.2f} -> {stats[metric]:>9.2f} ms  {change:+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the integration hot paths on synthetic data')
+    parser.add_argument('--suite', action='append', choices=list(SUITES),
+                        help='Suite to run (repeatable; default: all)')
+    parser.add_argument('--quick', action='store_true', help='Smaller data sets and fewer repeats')
+    parser.add_argument('--repeat', type=int, default=None, help='Timed calls per benchmark')
+    parser.add_argument('--output', default=None,
+                        help='Result file (default: benchmarks/results/<timestamp>-<commit>.json)')
+    parser.add_argument('--compare', default=None, help='Earlier result file to compare against')
+    parser.add_argument('--max_regression', type=float, default=None,
+                        help='With --compare, exit 1 when a benchmark is this much slower (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    config = dict(QUICK if args.quick else FULL)
+    if args.repeat:
+        config['repeat'] = args.repeat
+    report = {'meta': environment(args.quick), 'config': config, 'results': OrderedDict()}
+    workdir = tempfile.mkdtemp(prefix='graduation-bench-')
+    try:
+        for name in args.suite or list(SUITES):
+            print(f"Running {name} benchmarks...", file=sys.stderr)
+            started = time.perf_counter()
+            try:
+                report['results'].update(SUITES[name](config, workdir))
+            except Exception as e:
+                print(f"{name} benchmarks failed: {e}", file=sys.stderr)
+                report['results'][f"{name}.error"] = {'error': str(e)}
+            print(f"  {name} done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{report['meta']['commit'] or 'nocommit'}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for key, stats in report['results'].items():
+        if 'p50' in stats:
+            print(f"{key:<52} p50 {stats['p50']:>9.2f} ms  p90 {stats['p90']:>9.2f} ms")
+        elif 'mean' in stats:
+            print(f"{key:<52} {stats['mean']:>13.2f} ms")
+    print(f"Results written to {output}")
+
+    if args.compare:
+        regressions = compare(report, args.compare, args.max_regression)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed by more than {args.max_regression:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Synthetic Benchmark Data
+Deterministic generators for the benchmark inputs: faces the Haar cascade detects, fingerprint
+ridge patterns, QR codes at any rotation and scale, stage frames with people, and a graduates database.
+Every generator takes a seed, so two runs (and two commits) time exactly the same data.
+"""
+
+import os
+import sqlite3
+
+import cv2
+import numpy as np
+
+GRADUATES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS graduates (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id TEXT NOT NULL,
+    full_name TEXT NOT NULL,
+    program TEXT NOT NULL,
+    cgpa REAL,
+    category TEXT,
+    photo_path TEXT,
+    qr_token TEXT NOT NULL UNIQUE,
+    registered_at TEXT NOT NULL,
+    attended_at TEXT,
+    face_verified_at TEXT,
+    queued_at TEXT,
+    announced_at TEXT
+);
+CREATE TABLE IF NOT EXISTS current_announcement (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    graduate_id INTEGER,
+    updated_at TEXT
+);
+INSERT OR IGNORE INTO current_announcement (id, graduate_id, updated_at) VALUES (1, NULL, datetime('now'));
+"""
+
+
+def student_id(i):
+    return f"2024{i:06d}"
+
+
+def make_face(seed, size=240, background=None):
+    """
+    Grayscale-looking BGR portrait of a schematic face: dark hair, eye and brow bands over a
+    lighter skin oval, which is the contrast pattern the frontal face cascade keys on.
+    Geometry and tones vary with the seed, so different seeds give different templates.
+    """
+    rng = np.random.default_rng(seed)
+    bg = int(rng.integers(60, 130)) if background is None else background
+    img = np.full((size, size), bg, np.uint8)
+    c = size // 2
+    fw = int(size * rng.uniform(0.27, 0.33))
+    fh = int(size * rng.uniform(0.37, 0.43))
+    skin = int(rng.integers(170, 220))
+    cv2.ellipse(img, (c, c + 10), (fw, fh), 0, 0, 360, skin, -1)
+    cv2.ellipse(img, (c, c - int(fh * 0.75)), (int(fw * 1.05), int(fh * 0.45)), 0, 180, 360,
+                int(rng.integers(20, 70)), -1)
+    eye_y = c - int(fh * rng.uniform(0.08, 0.16))
+    eye_x = int(fw * rng.uniform(0.40, 0.50))
+    eye_w, eye_h = int(fw * rng.uniform(0.28, 0.38)), int(fh * rng.uniform(0.07, 0.12))
+    for side in (-1, 1):
+        cv2.ellipse(img, (c + side * eye_x, eye_y), (eye_w, eye_h), 0, 0, 360, int(rng.integers(30, 70)), -1)
+        brow_y = eye_y - int(fh * rng.uniform(0.17, 0.23))
+        cv2.line(img, (c + side * eye_x - int(fw * 0.35), brow_y), (c + side * eye_x + int(fw * 0.35), brow_y),
+                 int(rng.integers(30, 70)), int(rng.integers(5, 10)))
+    cv2.ellipse(img, (c, c + int(fh * 0.2)), (int(fw * 0.15), int(fh * 0.06)), 0, 0, 360, skin - 50, -1)
+    cv2.ellipse(img, (c, c + int(fh * rng.uniform(0.44, 0.52))), (int(fw * rng.uniform(0.35, 0.5)), int(fh * 0.07)),
+                0, 0, 360, int(rng.integers(60, 100)), -1)
+    img = np.clip(img + rng.normal(0, 6, img.shape), 0, 255).astype(np.uint8)
+    return cv2.cvtColor(cv2.GaussianBlur(img, (7, 7), 0), cv2.COLOR_GRAY2BGR)
+
+
+def make_face_frame(seed, width=640, height=480):
+    """Camera-sized frame with one face placed off center"""
+    rng = np.random.default_rng(seed + 1_000_003)
+    frame = np.full((height, width, 3), int(rng.integers(70, 120)), np.uint8)
+    face = make_face(seed, size=min(width, height) // 2 + 40, background=int(frame[0, 0, 0]))
+    fh, fw = face.shape[:2]
+    y = int(rng.integers(0, height - fh))
+    x = int(rng.integers(0, width - fw))
+    frame[y:y + fh, x:x + fw] = face
+    return frame
+
+
+def write_student_photos(directory, count, start=0):
+    """student_<id>_photo.jpg files as the upload pages save them; returns the paths"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(start, start + count):
+        path = os.path.join(directory, f"student_{student_id(i)}_photo.jpg")
+        cv2.imwrite(path, make_face(i))
+        paths.append(path)
+    return paths
+
+
+def make_fingerprint(seed, size=256, impression=0):
+    """
+    Ridge pattern around a core (loop-like phase field with low-frequency warping) inside a
+    finger-shaped mask. impression > 0 gives another capture of the same finger: the same
+    pattern slightly shifted, rotated and noisier.
+    """
+    rng = np.random.default_rng(seed)
+    core_x, core_y = rng.uniform(0.4, 0.6) * size, rng.uniform(0.35, 0.55) * size
+    wavelength = rng.uniform(7.0, 10.0)
+    loop = rng.uniform(0.5, 2.0)
+    warp = rng.normal(0, 1, (4, 4)).astype(np.float32)
+    capture = np.random.default_rng((seed, impression))
+    dx, dy = (capture.normal(0, 3, 2) if impression else (0.0, 0.0))
+    angle = capture.normal(0, 3) if impression else 0.0
+
+    yy, xx = np.mgrid[0:size, 0:size].astype(np.float32)
+    r = np.hypot(xx - core_x - dx, yy - core_y - dy)
+    theta = np.arctan2(yy - core_y - dy, xx - core_x - dx)
+    warp_field = cv2.resize(warp, (size, size), interpolation=cv2.INTER_CUBIC) * 3.0
+    phase = 2 * np.pi * r / wavelength + loop * theta + warp_field
+    ridges = 128 + 110 * np.cos(phase)
+    mask = np.zeros((size, size), np.uint8)
+    cv2.ellipse(mask, (size // 2, size // 2), (int(size * 0.38), int(size * 0.47)), 0, 0, 360, 255, -1)
+    img = np.where(mask > 0, ridges, 235.0)
+    img += capture.normal(0, 8 + 4 * impression, img.shape)
+    img = np.clip(img, 0, 255).astype(np.uint8)
+    if angle:
+        rotation = cv2.getRotationMatrix2D((size / 2, size / 2), angle, 1.0)
+        img = cv2.warpAffine(img, rotation, (size, size), borderValue=235)
+    return cv2.cvtColor(cv2.GaussianBlur(img, (3, 3), 0), cv2.COLOR_GRAY2BGR)
+
+
+def make_qr(text, rotation=0, scale=1.0, module_pixels=6, border=40, noise=0.0, seed=0):
+    """QR code image of text as printed on the graduate passes, rotated by a multiple of 90 degrees and scaled"""
+    code = cv2.QRCodeEncoder.create().encode(text)
+    code = cv2.resize(code, None, fx=module_pixels, fy=module_pixels, interpolation=cv2.INTER_NEAREST)
+    code = cv2.copyMakeBorder(code, border, border, border, border, cv2.BORDER_CONSTANT, value=255)
+    rotations = {90: cv2.ROTATE_90_CLOCKWISE, 180: cv2.ROTATE_180, 270: cv2.ROTATE_90_COUNTERCLOCKWISE}
+    if rotation % 360:
+        code = cv2.rotate(code, rotations[rotation % 360])
+    if scale != 1.0:
+        code = cv2.resize(code, None, fx=scale, fy=scale,
+                          interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+    if noise:
+        rng = np.random.default_rng(seed)
+        code = np.clip(code + rng.normal(0, noise, code.shape), 0, 255).astype(np.uint8)
+    return cv2.cvtColor(code, cv2.COLOR_GRAY2BGR)
+
+
+def make_stage_frame(people_x, width=960, height=480, seed=0):
+    """
+    Stage frame with a standing figure (head, torso, legs) centered at each x in people_x.
+    Returns (frame, people) where people are the ground-truth boxes in the detector's format.
+    """
+    rng = np.random.default_rng(seed)
+    frame = np.empty((height, width, 3), np.uint8)
+    gradient = np.linspace(50, 110, height, dtype=np.float32)[:, None]
+    frame[:] = gradient[..., None].astype(np.uint8)
+    cv2.rectangle(frame, (0, int(height * 0.85)), (width, height), (40, 60, 90), -1)
+    people = []
+    for x in people_x:
+        body_h = int(height * 0.7)
+        top = int(height * 0.85) - body_h
+        head = body_h // 8
+        color = tuple(int(v) for v in rng.integers(20, 200, 3))
+        cv2.circle(frame, (int(x), top + head), head, (150, 170, 200), -1)
+        cv2.rectangle(frame, (int(x) - head, top + 2 * head), (int(x) + head, top + int(body_h * 0.55)), color, -1)
+        cv2.rectangle(frame, (int(x) - head, top + int(body_h * 0.55)), (int(x) - 2, top + body_h), (30, 30, 30), -1)
+        cv2.rectangle(frame, (int(x) + 2, top + int(body_h * 0.55)), (int(x) + head, top + body_h), (30, 30, 30), -1)
+        people.append({'x': int(x), 'y': top + body_h // 2, 'width': 2 * head + 8, 'height': body_h,
+                       'confidence': 1.0})
+    frame = np.clip(frame + rng.normal(0, 4, frame.shape), 0, 255).astype(np.uint8)
+    return frame, people
+
+
+def walk_positions(frames, width=960, margin=60):
+    """x of one person crossing the stage left to right over the given number of frames"""
+    return np.linspace(margin, width - margin, frames).astype(int).tolist()
+
+
+def make_graduates_db(conn, count, queued=True):
+    """Create the graduates tables on conn (a path or an open connection) with count graduates"""
+    own = isinstance(conn, (str, os.PathLike))
+    if own:
+        conn = sqlite3.connect(conn)
+    conn.executescript(GRADUATES_SCHEMA)
+    conn.executemany(
+        "INSERT INTO graduates (student_id, full_name, program, qr_token, registered_at, queued_at) "
+        "VALUES (?, ?, ?, ?, datetime('now'), " + ("datetime('now', ?)" if queued else "NULL") + ")",
+        [(student_id(i), f"Graduate {i}", 'BSc Computer Science', f"token-{i}") + ((f'+{i} seconds',) if queued else ())
+         for i in range(count)])
+    if conn.in_transaction:
+        conn.commit()
+    if own:
+        conn.close()
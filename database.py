@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Database Access
+Shared SQLite layer for the Python side: WAL journal, pooled per-thread connections and the hot queue statements
+"""
+
+import contextlib
+import os
+import sqlite3
+import sys
+import threading
+from urllib.request import pathname2url
+
+DEFAULT_DB_PATH = "data/app.sqlite"
+# Pooled path of a private in-memory database (one per thread), e.g. for dry runs
+MEMORY_DB_PATH = ":memory:"
+
+# Hot statements. sqlite3 keeps the compiled form of every statement it runs in a
+# per-connection cache keyed by the SQL text, so callers reuse these exact strings
+# on a pooled connection and each one is prepared once per thread.
+NEXT_QUEUED_GRADUATE = """
+    SELECT id, full_name, student_id, program
+    FROM graduates
+    WHERE queued_at IS NOT NULL AND announced_at IS NULL
+    ORDER BY queued_at ASC
+    LIMIT 1
+"""
+PENDING_GRADUATES = """
+    SELECT id, full_name, student_id, program
+    FROM graduates
+    WHERE queued_at IS NOT NULL AND announced_at IS NULL
+    ORDER BY queued_at ASC
+"""
+GRADUATE_BY_ID = """
+    SELECT id, full_name, student_id, program
+    FROM graduates
+    WHERE id = ?
+"""
+MARK_ANNOUNCED = """
+    UPDATE graduates
+    SET announced_at = datetime('now')
+    WHERE id = ? AND queued_at IS NOT NULL AND announced_at IS NULL
+"""
+SET_CURRENT_ANNOUNCEMENT = """
+    UPDATE current_announcement
+    SET graduate_id = ?, updated_at = datetime('now')
+    WHERE id = 1
+"""
+DATA_VERSION = "PRAGMA data_version"
+
+# Indexes the statements above rely on: (table, name, create statement).
+# The partial index matches the queue's WHERE clause, so the queue is read in
+# queued_at order without scanning announced graduates.
+INDEXES = [
+    ('graduates', 'idx_graduates_queue',
+     "CREATE INDEX IF NOT EXISTS idx_graduates_queue ON graduates(queued_at) "
+     "WHERE queued_at IS NOT NULL AND announced_at IS NULL"),
+]
+
+
+def configure_connection(conn, busy_timeout_ms=10000, synchronous='NORMAL'):
+    """
+    WAL lets PHP pages read while the detector writes (and the other way round);
+    synchronous=NORMAL is durable in WAL mode except for the last commits on power loss.
+    """
+    conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+    except sqlite3.DatabaseError as e:
+        # e.g. read-only media or a file system without shared memory support
+        print(f"Could not enable WAL journal: {e}", file=sys.stderr)
+    conn.execute(f"PRAGMA synchronous = {synchronous}")
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+
+def ensure_indexes(conn):
+    """Create any missing INDEXES whose table exists; returns the names that were created"""
+    tables = set(row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'"))
+    existing = set(row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'"))
+    created = []
+    for table, name, statement in INDEXES:
+        if table in tables and name not in existing:
+            conn.execute(statement)
+            created.append(name)
+    return created
+
+
+class ConnectionPool:
+    """
+    One configured connection per thread for a database file. Connections run in
+    autocommit mode; writes go through transaction() so they hold the lock briefly.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, busy_timeout_ms=10000, synchronous='NORMAL',
+                 cached_statements=64):
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.synchronous = synchronous
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._indexes_checked = False
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000.0,
+                               isolation_level=None, check_same_thread=True,
+                               cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row
+        configure_connection(conn, self.busy_timeout_ms, self.synchronous)
+        with self._lock:
+            if not self._indexes_checked:
+                try:
+                    ensure_indexes(conn)
+                except sqlite3.DatabaseError as e:
+                    print(f"Could not create database indexes: {e}", file=sys.stderr)
+                self._indexes_checked = True
+        self._local.conn = conn
+        return conn
+
+    def release(self):
+        """Close the calling thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        conn.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path=DEFAULT_DB_PATH):
+    key = db_path if db_path == MEMORY_DB_PATH else os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(db_path)
+        return pool
+
+
+def connect(db_path=DEFAULT_DB_PATH):
+    """Pooled connection for the calling thread"""
+    return get_pool(db_path).connection()
+
+
+def release(db_path=DEFAULT_DB_PATH):
+    get_pool(db_path).release()
+
+
+@contextlib.contextmanager
+def transaction(conn, immediate=True):
+    """BEGIN IMMEDIATE ... COMMIT, rolled back on error; IMMEDIATE takes the write lock up front"""
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def copy_database(source_path, conn):
+    """Copy a database file into conn (e.g. a MEMORY_DB_PATH connection); the source is only read"""
+    if not os.path.exists(source_path):
+        raise FileNotFoundError(f"Database not found: {source_path}")
+    source = sqlite3.connect(f"file:{pathname2url(os.path.abspath(source_path))}?mode=ro", uri=True)
+    try:
+        source.backup(conn)
+    finally:
+        source.close()
+
+
+def next_queued_graduate(conn):
+    row = conn.execute(NEXT_QUEUED_GRADUATE).fetchone()
+    return dict(row) if row else None
+
+
+def pending_graduates(conn):
+    return [dict(row) for row in conn.execute(PENDING_GRADUATES).fetchall()]
+
+
+def graduate_by_id(conn, graduate_id):
+    row = conn.execute(GRADUATE_BY_ID, (graduate_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def data_version(conn):
+    return conn.execute(DATA_VERSION).fetchone()[0]
+
+
+def announce_graduate(conn, graduate_id):
+    """
+    Mark a graduate announced and make them the current announcement in one transaction.
+    Returns False without writing if the graduate is no longer waiting (already announced, or
+    taken out of the queue, e.g. by a queue reset the cached queue has not seen yet).
+    """
+    with transaction(conn):
+        if conn.execute(MARK_ANNOUNCED, (graduate_id,)).rowcount == 0:
+            return False
+        conn.execute(SET_CURRENT_ANNOUNCEMENT, (graduate_id,))
+    return True
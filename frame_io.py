@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Frame Input
+Turns in-memory frame buffers (encoded JPEG/PNG bytes or raw BGR pixels) into OpenCV images
+without writing them to disk first
+"""
+
+import sys
+
+import cv2
+import numpy as np
+
+
+def parse_shape(text):
+    """'480x640' or '480x640x3' (height x width [x channels]) -> (height, width, channels)"""
+    try:
+        parts = [int(p) for p in text.lower().replace(',', 'x').split('x')]
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid frame shape: {text!r} (expected HEIGHTxWIDTH[xCHANNELS])")
+    if len(parts) == 2:
+        parts.append(3)
+    if len(parts) != 3 or min(parts) <= 0 or parts[2] not in (1, 3, 4):
+        raise ValueError(f"Invalid frame shape: {text!r} (expected HEIGHTxWIDTH[xCHANNELS])")
+    return tuple(parts)
+
+
+def decode_frame(data):
+    """
+    Decode an encoded image (JPEG, PNG, ...) held in bytes, bytearray or a memoryview.
+    np.frombuffer wraps the buffer in place, so the only copy is the decoded image itself.
+    """
+    buf = np.frombuffer(memoryview(data), dtype=np.uint8)
+    if buf.size == 0:
+        raise ValueError('Empty frame')
+    frame = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError('Failed to decode image')
+    return frame
+
+
+def frame_from_raw(data, shape, writable=False):
+    """
+    View a raw pixel buffer as a (height, width, channels) BGR image without copying it.
+    Single-channel and BGRA buffers are converted to BGR, which the detectors expect.
+
+    A 3-channel view is always returned read-only, so drawing on it (e.g. process_frame with
+    draw=True) fails loudly instead of depending on the buffer type. Pass writable=True for a
+    frame that can be drawn on; it is copied only when data itself is immutable (bytes).
+    """
+    height, width, channels = shape
+    buf = np.frombuffer(memoryview(data), dtype=np.uint8)
+    expected = height * width * channels
+    if buf.size != expected:
+        raise ValueError(f"Raw frame has {buf.size} bytes, expected {expected} for {height}x{width}x{channels}")
+    frame = buf.reshape(height, width, channels)
+    if channels == 1:
+        return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+    if channels == 4:
+        return cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+    if writable:
+        return frame if frame.flags.writeable else frame.copy()
+    frame.flags.writeable = False
+    return frame
+
+
+def load_frame(data, shape=None, writable=False):
+    """Raw pixels when a shape is given, otherwise an encoded image (see frame_from_raw for writable)"""
+    return frame_from_raw(data, shape, writable) if shape else decode_frame(data)
+
+
+def read_stdin_frame(shape=None, writable=False):
+    """Read a whole frame from stdin (binary)"""
+    return load_frame(sys.stdin.buffer.read(), shape, writable)
@@ -4,6 +4,12 @@ import os
 import json
 import re
 
+# Ensure we can import project modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Imported before cv2 so --timings includes its import time
+import timing  # type: ignore
+
 try:
     import cv2 as cv
 except Exception as e:
@@ -40,56 +46,53 @@ def extract_student_id(qr_text: str):
     return None
 
 
-def main():
-    if len(sys.argv) < 2:
-        print(json.dumps({"ok": False, "error": "Usage: decode_qr.py <image_path>"}))
-        return
-    image_path = sys.argv[1]
-    image = cv.imread(image_path)
-    if image is None:
-        print(json.dumps({"ok": False, "error": f"Cannot read image: {image_path}"}))
-        return
-    # Preprocess at multiple scales and rotations
-    def try_decode(img):
-        # OpenCV detector
-        detector = cv.QRCodeDetector()
-        data, points, _ = detector.detectAndDecode(img)
-        if points is not None and data:
-            return data
-        # pyzbar fallback
-        if _HAS_PYZBAR:
-            try:
-                gray = cv.cvtColor(img, cv.COLOR_BGR2GRAY)
-            except Exception:
-                gray = img
-            results = zbar_decode(gray)
-            if results:
-                return results[0].data.decode('utf-8', errors='ignore')
-        return None
-
-    def enhance(img):
+def try_decode(img):
+    # OpenCV detector
+    detector = cv.QRCodeDetector()
+    data, points, _ = detector.detectAndDecode(img)
+    if points is not None and data:
+        return data
+    # pyzbar fallback
+    if _HAS_PYZBAR:
         try:
             gray = cv.cvtColor(img, cv.COLOR_BGR2GRAY)
         except Exception:
             gray = img
-        try:
-            clahe = cv.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-            gray = clahe.apply(gray)
-        except Exception:
-            pass
-        try:
-            gray = cv.bilateralFilter(gray, 7, 75, 75)
-        except Exception:
-            pass
-        try:
-            thr = cv.adaptiveThreshold(gray, 255, cv.ADAPTIVE_THRESH_GAUSSIAN_C, cv.THRESH_BINARY, 31, 2)
-            return cv.cvtColor(thr, cv.COLOR_GRAY2BGR)
-        except Exception:
-            return cv.cvtColor(gray, cv.COLOR_GRAY2BGR) if len(gray.shape) == 2 else gray
+        results = zbar_decode(gray)
+        if results:
+            return results[0].data.decode('utf-8', errors='ignore')
+    return None
+
+
+def enhance(img):
+    try:
+        gray = cv.cvtColor(img, cv.COLOR_BGR2GRAY)
+    except Exception:
+        gray = img
+    try:
+        clahe = cv.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        gray = clahe.apply(gray)
+    except Exception:
+        pass
+    try:
+        gray = cv.bilateralFilter(gray, 7, 75, 75)
+    except Exception:
+        pass
+    try:
+        thr = cv.adaptiveThreshold(gray, 255, cv.ADAPTIVE_THRESH_GAUSSIAN_C, cv.THRESH_BINARY, 31, 2)
+        return cv.cvtColor(thr, cv.COLOR_GRAY2BGR)
+    except Exception:
+        return cv.cvtColor(gray, cv.COLOR_GRAY2BGR) if len(gray.shape) == 2 else gray
+
 
+def decode_image(image, stats=None):
+    """
+    Try the image at multiple scales and rotations, plain and enhanced; returns the first
+    QR text found or None. stats, if given, receives the number of decode attempts made.
+    """
     rotations = [0, 90, 180, 270]
     scales = [1.0, 1.3, 0.8]
-    candidates = []
+    attempts = 0
     for rot in rotations:
         if rot == 0:
             img_rot = image
@@ -110,16 +113,37 @@ def main():
             except Exception:
                 img_s = img_rot
             for variant in (img_s, enhance(img_s)):
+                attempts += 1
                 data = try_decode(variant)
                 if data:
-                    candidates.append(data)
                     # Return first successful to keep latency low
-                    sid = extract_student_id(data)
-                    print(json.dumps({"ok": True, "qr_text": data, "student_id": sid}))
-                    return
-    print(json.dumps({"ok": True, "qr_text": None, "student_id": None}))
+                    if stats is not None:
+                        stats['attempts'] = attempts
+                    return data
+    if stats is not None:
+        stats['attempts'] = attempts
+    return None
 
-if __name__ == '__main__':
-    main()
 
+def main():
+    args = [arg for arg in sys.argv[1:] if arg != '--timings']
+    timings = timing.Timings('decode_qr', enabled='--timings' in sys.argv[1:])
+    if len(args) < 1:
+        print(json.dumps({"ok": False, "error": "Usage: decode_qr.py <image_path> [--timings]"}))
+        return
+    image_path = args[0]
+    with timings.span('read_image'):
+        image = cv.imread(image_path)
+    if image is None:
+        print(json.dumps(timings.attach({"ok": False, "error": f"Cannot read image: {image_path}"})))
+        return
+    with timings.span('decode'):
+        data = decode_image(image)
+    if data:
+        sid = extract_student_id(data)
+        print(json.dumps(timings.attach({"ok": True, "qr_text": data, "student_id": sid})))
+        return
+    print(json.dumps(timings.attach({"ok": True, "qr_text": None, "student_id": None})))
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from face_recognition_validator import FaceRecognitionValidator  # type: ignore
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Face Enrollment CLI Tool (builds the template index)')
+    parser.add_argument('--photos_dir', required=True, help='Directory containing student photos')
+    parser.add_argument('--photos', nargs='+', default=None,
+                        help='Enroll only these photos (in --photos_dir) instead of scanning the whole directory')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes for uncached photos (default: one per CPU)')
+    parser.add_argument('--progress', action='store_true', help='Print progress to stderr')
+    args = parser.parse_args()
+
+    result = {
+        'success': False,
+        'message': '',
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'enrollment': {},
+    }
+
+    def report_progress(done, total):
+        print(f"Enrolled {done}/{total}", file=sys.stderr)
+
+    try:
+        # Suppress validator prints to keep stdout JSON-only
+        with contextlib.redirect_stdout(io.StringIO()):
+            validator = FaceRecognitionValidator(student_photos_dir=args.photos_dir, autoload=False)
+            if args.photos:
+                # The saved LBPH model needs the whole gallery; the next identification updates it
+                summary = validator.enroll_photo_files([os.path.basename(p) for p in args.photos])
+            else:
+                summary = validator.load_student_photos(workers=args.workers,
+                                                        progress=report_progress if args.progress else None)
+                # Add the new photos to the saved LBPH model, so identification requests only read it
+                summary['lbph_saved'] = validator.load_lbph_model()
+        result['enrollment'] = summary
+        result['success'] = summary['failed'] == 0 or not args.photos
+        result['message'] = (f"{summary['enrolled']} enrolled, {summary['cached']} cached, "
+                             f"{summary['failed']} failed in {summary['seconds']:.2f}s")
+        print(json.dumps(result))
+        return 0
+    except Exception as e:
+        result['message'] = f'Error: {str(e)}'
+        print(json.dumps(result))
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,22 @@
+import contextlib
+import copy
 import cv2 as cv
+import glob
+import hashlib
+import json
+import multiprocessing
 import numpy as np
 import os
-from typing import Optional, List, Dict
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, List, Dict, Tuple
 from datetime import datetime
 
+from face_template_index import FaceTemplateIndex
+
 # Optional advanced denoising imports
 try:
     from skimage import restoration, filters
@@ -12,22 +25,106 @@ try:
 except ImportError:
     ADVANCED_DENOISING_AVAILABLE = False
 
+# LBPH recognizer ships with opencv-contrib only
+LBPH_AVAILABLE = hasattr(cv, 'face') and hasattr(cv.face, 'LBPHFaceRecognizer_create')
+
+FRONTAL_FACE_CASCADE = 'haarcascade_frontalface_default.xml'
+FRONTAL_FACE_ALT_CASCADE = 'haarcascade_frontalface_alt2.xml'
+
+# Haar cascades are parsed from XML once per process and shared by every detector
+_CASCADES: Dict[str, tuple] = {}
+_CASCADES_LOCK = threading.Lock()
+
+
+def get_cascade(name: str = FRONTAL_FACE_CASCADE) -> tuple:
+    """Return (classifier, lock) for a bundled OpenCV Haar cascade, loading it on first use"""
+    with _CASCADES_LOCK:
+        entry = _CASCADES.get(name)
+        if entry is None:
+            entry = (cv.CascadeClassifier(cv.data.haarcascades + name), threading.Lock())
+            _CASCADES[name] = entry
+        return entry
+
+
+def detect_faces(gray: np.ndarray, scale_factor: float = 1.1, min_neighbors: int = 3, min_size=(50, 50)) -> List[tuple]:
+    """Detect faces as (x, y, w, h) with the default frontal cascade, falling back to alt2"""
+    for name in (FRONTAL_FACE_CASCADE, FRONTAL_FACE_ALT_CASCADE):
+        cascade, lock = get_cascade(name)
+        # A classifier keeps scratch buffers between calls, so threads take turns using it
+        with lock:
+            faces = cascade.detectMultiScale(gray, scaleFactor=scale_factor, minNeighbors=min_neighbors, minSize=min_size)
+        if len(faces) > 0:
+            return [tuple(int(v) for v in face) for face in faces]
+    return []
+
+
+def _lap(timings: Optional[Dict[str, float]], stage: str, started: float) -> float:
+    """Add the time since started to timings[stage] (if timings is given) and return now"""
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + (now - started)
+    return now
+
+
+# Enrollment worker processes each build one validator (without loading photos) and reuse it
+_ENROLLMENT_VALIDATOR = None
+
+
+def _init_enrollment_worker(settings: Dict):
+    global _ENROLLMENT_VALIDATOR
+    # Results go back through return values; keep worker chatter off the parent's stdout
+    sys.stdout = open(os.devnull, 'w')
+    _ENROLLMENT_VALIDATOR = FaceRecognitionValidator(autoload=False, **settings['kwargs'])
+    for name, value in settings['attributes'].items():
+        setattr(_ENROLLMENT_VALIDATOR, name, value)
+
+
+def _enroll_photos(photo_paths: List[str]) -> tuple:
+    timings: Dict[str, float] = {}
+    templates = _ENROLLMENT_VALIDATOR.create_face_templates(photo_paths, timings=timings)
+    return photo_paths, templates, timings
+
+
+# Loaded DCGAN generators by models directory, shared by every enhancer in the process
+_DCGAN_GENERATORS: Dict[str, tuple] = {}
+_DCGAN_GENERATORS_LOCK = threading.Lock()
+
+
 # Optional DCGAN enhancer (non-destructive). If models or torch are missing, it silently disables itself.
 class _OptionalDCGANEnhancer:
-    def __init__(self, models_dir: Optional[str]):
+    # Crops smaller than this are upscaled before the generator runs
+    target_size = 128
+
+    def __init__(self, models_dir: Optional[str], num_threads: Optional[int] = None, batch_size: int = 16):
         self.enabled = False
         self.device = None
         self.generator = None
         self.models_dir = models_dir
+        self.weights_path = None
+        self.torch = None
+        self.batch_size = max(1, int(batch_size))
         if not models_dir:
             return
         try:
             import torch  # type: ignore
             self.torch = torch
             self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+            if num_threads:
+                # Process-wide; enrollment workers use one thread each so the pool does not oversubscribe
+                torch.set_num_threads(int(num_threads))
         except Exception:
             self.torch = None
             return
+        # Scan and load the weights once per process, not once per validator
+        key = os.path.abspath(models_dir)
+        with _DCGAN_GENERATORS_LOCK:
+            if key not in _DCGAN_GENERATORS:
+                _DCGAN_GENERATORS[key] = self._load_generator(models_dir)
+            self.weights_path, self.generator = _DCGAN_GENERATORS[key]
+        self.enabled = self.generator is not None
+
+    def _load_generator(self, models_dir: str) -> tuple:
+        """Locate and load generator weights; returns (weights_path, generator) or (None, None)"""
         try:
             # Try to locate a generator weights file by common extensions
             candidates = []
@@ -36,9 +133,8 @@ class _OptionalDCGANEnhancer:
                 if lower.endswith(('.pt', '.pth', '.ckpt', '.pkl')) and 'gen' in lower:
                     candidates.append(os.path.join(models_dir, name))
             if not candidates:
-                return
+                return None, None
             weights_path = sorted(candidates)[-1]
-
             # Define a very simple DCGAN-like generator wrapper if actual class is not shipped.
             # We will load state_dict by key-match best effort. If it fails, we keep enhancer disabled.
             import torch.nn as nn  # type: ignore
@@ -75,52 +171,77 @@ class _OptionalDCGANEnhancer:
                 pass
 
             gen.eval()
-            self.generator = gen
-            self.enabled = True
+            return weights_path, gen
         except Exception:
-            self.enabled = False
+            return None, None
 
     def is_available(self) -> bool:
         return bool(self.enabled and self.generator is not None and self.torch is not None)
 
     def enhance_bgr_face(self, face_bgr: np.ndarray) -> np.ndarray:
-        # Best-effort enhancement. If anything fails, return original.
+        return self.enhance_bgr_faces([face_bgr])[0]
+
+    def enhance_bgr_faces(self, faces_bgr: List[np.ndarray]) -> List[np.ndarray]:
+        # Best-effort enhancement, batch_size crops per forward pass. If anything fails, return originals.
+        enhanced: List[np.ndarray] = []
+        for start in range(0, len(faces_bgr), self.batch_size):
+            enhanced.extend(self._enhance_batch(faces_bgr[start:start + self.batch_size]))
+        return enhanced
+
+    def _enhance_batch(self, faces_bgr: List[np.ndarray]) -> List[np.ndarray]:
         try:
             if not self.is_available():
-                return face_bgr
+                return list(faces_bgr)
             torch = self.torch
-            # Prepare tensor: BGR -> RGB, uint8 [0,255] -> float [-1,1]
-            rgb = cv.cvtColor(face_bgr, cv.COLOR_BGR2RGB)
-            h, w = rgb.shape[:2]
-            # Resize to a reasonable generator input size if needed (e.g., 128)
-            target = 128
-            if min(h, w) < target:
-                scale = float(target) / float(min(h, w))
-                new_w = max(1, int(round(w * scale)))
-                new_h = max(1, int(round(h * scale)))
-                rgb = cv.resize(rgb, (new_w, new_h), interpolation=cv.INTER_CUBIC)
-            img = rgb.astype(np.float32) / 127.5 - 1.0
-            tensor = torch.from_numpy(img).permute(2, 0, 1).unsqueeze(0).to(self.device)
-            with torch.no_grad():
+            # Prepare crops: BGR -> RGB, upscaled so the short side reaches target_size
+            rgbs = []
+            for face_bgr in faces_bgr:
+                rgb = cv.cvtColor(face_bgr, cv.COLOR_BGR2RGB)
+                h, w = rgb.shape[:2]
+                if min(h, w) < self.target_size:
+                    scale = float(self.target_size) / float(min(h, w))
+                    new_w = max(1, int(round(w * scale)))
+                    new_h = max(1, int(round(h * scale)))
+                    rgb = cv.resize(rgb, (new_w, new_h), interpolation=cv.INTER_CUBIC)
+                rgbs.append(rgb)
+            # Pad every crop to the largest one (repeating edge pixels) so they share one tensor
+            max_h = max(rgb.shape[0] for rgb in rgbs)
+            max_w = max(rgb.shape[1] for rgb in rgbs)
+            batch = np.stack([
+                np.pad(rgb, ((0, max_h - rgb.shape[0]), (0, max_w - rgb.shape[1]), (0, 0)), mode='edge')
+                for rgb in rgbs
+            ])
+            # uint8 [0,255] -> float [-1,1], NHWC -> NCHW
+            tensor = torch.from_numpy(batch.astype(np.float32) / 127.5 - 1.0).permute(0, 3, 1, 2).to(self.device)
+            with torch.inference_mode():
                 out = self.generator(tensor)
-            out = out.squeeze(0).permute(1, 2, 0).cpu().numpy()
+            out = out.permute(0, 2, 3, 1).cpu().numpy()
             out = np.clip((out + 1.0) * 127.5, 0, 255).astype(np.uint8)
-            out_bgr = cv.cvtColor(out, cv.COLOR_RGB2BGR)
-            # Resize back to original face size to keep downstream behavior consistent
-            out_bgr = cv.resize(out_bgr, (face_bgr.shape[1], face_bgr.shape[0]), interpolation=cv.INTER_CUBIC)
-            return out_bgr
+            enhanced = []
+            for face_bgr, rgb, result in zip(faces_bgr, rgbs, out):
+                out_bgr = cv.cvtColor(np.ascontiguousarray(result[:rgb.shape[0], :rgb.shape[1]]), cv.COLOR_RGB2BGR)
+                # Resize back to original face size to keep downstream behavior consistent
+                enhanced.append(cv.resize(out_bgr, (face_bgr.shape[1], face_bgr.shape[0]), interpolation=cv.INTER_CUBIC))
+            return enhanced
         except Exception:
-            return face_bgr
+            return list(faces_bgr)
 
 
 class FaceRecognitionValidator:
-    def __init__(self, student_photos_dir: str = "/uploads", use_dcgan: bool = True, dcgan_models_dir: Optional[str] = None, use_dcgan_realtime: bool = False, enable_denoising: bool = True):
+    # Below this many uncached photos, enrolling in-process beats starting worker processes
+    ENROLL_PARALLEL_MIN_PHOTOS = 16
+    # Photos handed to a worker (and to one DCGAN forward pass) at a time
+    ENROLL_BATCH_SIZE = 16
+
+    def __init__(self, student_photos_dir: str = "/uploads", use_dcgan: bool = True, dcgan_models_dir: Optional[str] = None, use_dcgan_realtime: bool = False, enable_denoising: bool = True, use_template_index: bool = True, autoload: bool = True, enroll_workers: Optional[int] = None, dcgan_threads: Optional[int] = None):
         self.student_photos_dir = student_photos_dir
         self.known_faces: Dict[str, Dict] = {}
+        # (mtime_ns, size) of every photo file seen, used by refresh_student_photos
+        self._photo_stats: Dict[str, tuple] = {}
         # Cosine similarity threshold; 0.0..1.0 (higher is more similar)
         self.validation_threshold = 0.6  # Lower threshold for better detection
         self.face_detection_confidence = 0.5
-        self.face_cascade = cv.CascadeClassifier(cv.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self.face_cascade = get_cascade(FRONTAL_FACE_CASCADE)[0]
         os.makedirs(student_photos_dir, exist_ok=True)
         # Performance parameters
         self.template_size = 80  # smaller templates to speed up vector ops
@@ -134,54 +255,364 @@ class FaceRecognitionValidator:
         # Optional DCGAN enhancer (auto-disabled if unavailable)
         if dcgan_models_dir is None:
             dcgan_models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dcgan_models')
-        self._dcgan_enhancer = _OptionalDCGANEnhancer(dcgan_models_dir) if use_dcgan else _OptionalDCGANEnhancer(None)
+        self.dcgan_threads = dcgan_threads
+        self._dcgan_enhancer = _OptionalDCGANEnhancer(dcgan_models_dir, num_threads=dcgan_threads) if use_dcgan else _OptionalDCGANEnhancer(None)
         # Separate control: apply DCGAN on template creation (once) vs live per-frame (disabled by default for speed)
         self._dcgan_enabled_templates = bool(use_dcgan and self._dcgan_enhancer.is_available())
         self._dcgan_enabled_realtime = bool(use_dcgan_realtime and self._dcgan_enhancer.is_available())
-        self.load_student_photos()
+        # Compiled template index under <photos_dir>/.face_cache, reused across processes
+        self.use_template_index = use_template_index
+        self._template_index: Optional[FaceTemplateIndex] = None
+        # Unit vectors of all known faces in one contiguous matrix, rebuilt when known_faces changes
+        self._gallery: Optional[Dict] = None
+        # Resident LBPH model (see build_lbph_model/load_lbph_model); None means predictions train on the candidates
+        self._lbph: Optional[Dict] = None
+        # Processes used to build templates for uncached photos (None = one per CPU)
+        self.enroll_workers = enroll_workers
+        self.last_enrollment: Dict = {}
+        # Set on snapshot() copies, whose lookups must not update shared state
+        self.read_only = False
+        if autoload:
+            self.load_student_photos()
+
+    @staticmethod
+    def _student_id_from_filename(photo_file: str) -> str:
+        # Expected format: student_<id>_anything.ext
+        match = re.match(r'^student_([^_]+)_', photo_file, flags=re.IGNORECASE)
+        if match:
+            return match.group(1)
+        # Fallback: take the first token before underscore or stem
+        return os.path.splitext(photo_file)[0].split('_')[0]
+
+    def _list_photo_files(self) -> List[str]:
+        return [f for f in os.listdir(self.student_photos_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+
+    def _remember_photo_stat(self, photo_path: str):
+        try:
+            st = os.stat(photo_path)
+            self._photo_stats[photo_path] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            pass
+
+    def template_signature(self) -> str:
+        """Settings that change template extraction; the template index is rebuilt when they differ"""
+        dcgan = 'off'
+        if self._dcgan_enabled_templates:
+            dcgan = os.path.basename(self._dcgan_enhancer.weights_path or '') or 'on'
+        return f"size={self.template_size};denoise={int(self.enable_denoising)};dcgan={dcgan}"
 
-    def load_student_photos(self):
+    def _open_template_index(self) -> Optional[FaceTemplateIndex]:
+        self._template_index = None
+        if self.use_template_index:
+            index_path = os.path.join(self.student_photos_dir, '.face_cache', 'templates.idx')
+            self._template_index = FaceTemplateIndex(index_path, dim=self.template_size ** 2,
+                                                     signature=self.template_signature())
+        return self._template_index
+
+    def _writable_template_index(self) -> Optional[FaceTemplateIndex]:
+        index = self._template_index
+        # Templates built after a settings change must not go into an index built with the old settings
+        if index is None or index.signature != self.template_signature():
+            return None
+        return index
+
+    def _store_known_face(self, student_id: str, photo_path: str, template: np.ndarray, pending: Optional[list] = None):
+        photo_file = os.path.basename(photo_path)
+        # Store by lowercased student id for case-insensitive lookup
+        self._gallery = None
+        self.known_faces[student_id.lower()] = {
+            'template': template,
+            'vector': self._template_to_unit_vector(template),
+            'photo_path': photo_path,
+            'name': photo_file.replace('.jpg', '').replace('.jpeg', '').replace('.png', ''),
+            'original_student_id': student_id  # Keep original case for reference
+        }
+        stat_key = self._photo_stats.get(photo_path)
+        if stat_key is None:
+            return
+        record = (student_id, photo_file, stat_key[0], stat_key[1], template, self.known_faces[student_id.lower()]['vector'])
+        if pending is not None:
+            pending.append(record)
+        else:
+            self._flush_template_index([record])
+
+    def _flush_template_index(self, records: list):
+        index = self._writable_template_index()
+        if index is None or not records:
+            return
+        if index.upsert_many(records):
+            self._bind_template_index()
+
+    def _bind_template_index(self):
+        """Point known faces at their memory-mapped rows (row numbers move when the index changes)"""
+        index = self._template_index
+        if index is None:
+            return
+        self._gallery = None
+        for entry in self.known_faces.values():
+            row = index.row_of(os.path.basename(entry.get('photo_path') or ''))
+            if row is not None:
+                entry['template'] = index.template(row).reshape(self.template_size, self.template_size)
+                entry['vector'] = index.vector(row)
+
+    def _indexed_row(self, photo_file: str) -> Optional[int]:
+        """Record the photo's stat and return its template index row if that row is still current"""
+        photo_path = os.path.join(self.student_photos_dir, photo_file)
+        self._remember_photo_stat(photo_path)
+        index = self._writable_template_index()
+        stat_key = self._photo_stats.get(photo_path)
+        if index is None or stat_key is None:
+            return None
+        return index.lookup(photo_file, stat_key[0], stat_key[1])
+
+    def _load_indexed_photo(self, photo_file: str, row: int):
+        index = self._template_index
+        student_id = self._student_id_from_filename(photo_file)
+        self._gallery = None
+        self.known_faces[student_id.lower()] = {
+            'template': index.template(row).reshape(self.template_size, self.template_size),
+            'vector': index.vector(row),
+            'photo_path': os.path.join(self.student_photos_dir, photo_file),
+            'name': photo_file.replace('.jpg', '').replace('.jpeg', '').replace('.png', ''),
+            'original_student_id': index.student_id(row)
+        }
+        print(f"Loaded indexed template for student {student_id} (stored as {student_id.lower()})")
+
+    def _load_photo_template(self, photo_file: str, template: Optional[np.ndarray], pending: Optional[list] = None) -> bool:
+        if template is None:
+            return False
+        student_id = self._student_id_from_filename(photo_file)
+        self._store_known_face(student_id, os.path.join(self.student_photos_dir, photo_file), template, pending)
+        print(f"Loaded photo for student {student_id} (stored as {student_id.lower()})")
+        return True
+
+    def _load_photo_file(self, photo_file: str, pending: Optional[list] = None) -> bool:
+        row = self._indexed_row(photo_file)
+        if row is not None:
+            self._load_indexed_photo(photo_file, row)
+            return True
+        template = self.create_face_template(os.path.join(self.student_photos_dir, photo_file))
+        return self._load_photo_template(photo_file, template, pending)
+
+    def _enrollment_settings(self) -> Dict:
+        return {
+            'kwargs': {
+                'student_photos_dir': self.student_photos_dir,
+                'use_dcgan': self._dcgan_enabled_templates,
+                'dcgan_models_dir': self._dcgan_enhancer.models_dir,
+                'enable_denoising': self.enable_denoising,
+                'use_template_index': False,
+                'dcgan_threads': self.dcgan_threads or 1,
+            },
+            'attributes': {
+                'template_size': self.template_size,
+                'bilateral_d': self.bilateral_d,
+                'bilateral_sigma_color': self.bilateral_sigma_color,
+                'bilateral_sigma_space': self.bilateral_sigma_space,
+            },
+        }
+
+    def enroll_photos(self, photo_files: List[str], workers: Optional[int] = None, progress=None) -> tuple:
+        """
+        Build templates for photo_files, in a process pool when there are enough of them.
+        Returns ({photo_file: template or None}, {stage: seconds summed over all photos}).
+        progress, if given, is called as progress(done, total) after each photo.
+        """
+        templates: Dict[str, Optional[np.ndarray]] = {}
+        stage_seconds: Dict[str, float] = {}
+        total = len(photo_files)
+        if workers is None:
+            workers = self.enroll_workers if self.enroll_workers is not None else (os.cpu_count() or 1)
+        workers = max(1, min(int(workers), total))
+        paths = [os.path.join(self.student_photos_dir, f) for f in photo_files]
+
+        def record(batch_paths, batch_templates, timings):
+            for photo_path, template in zip(batch_paths, batch_templates):
+                templates[os.path.basename(photo_path)] = template
+            for stage, seconds in timings.items():
+                stage_seconds[stage] = stage_seconds.get(stage, 0.0) + seconds
+            if progress is not None:
+                progress(len(templates), total)
+
+        # Photos go out in batches so DCGAN enhancement (when enabled) runs one forward pass per batch
+        batch_size = max(1, min(self.ENROLL_BATCH_SIZE, -(-total // workers)))
+        batches = [paths[i:i + batch_size] for i in range(0, total, batch_size)]
+        if workers > 1 and total >= self.ENROLL_PARALLEL_MIN_PHOTOS:
+            try:
+                # spawn: workers must not inherit the parent's threads or torch/OpenCV state
+                context = multiprocessing.get_context('spawn')
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_enrollment_worker,
+                                         initargs=(self._enrollment_settings(),)) as pool:
+                    for batch_paths, batch_templates, timings in pool.map(_enroll_photos, batches):
+                        record(batch_paths, batch_templates, timings)
+            except Exception as e:
+                print(f"Parallel enrollment failed, continuing in-process: {e}")
+        for batch_paths in batches:
+            if os.path.basename(batch_paths[0]) in templates:
+                continue
+            timings: Dict[str, float] = {}
+            record(batch_paths, self.create_face_templates(batch_paths, timings=timings), timings)
+        return templates, stage_seconds
+
+    def load_student_photos(self, workers: Optional[int] = None, progress=None) -> Dict:
+        """
+        Load all photos, reusing indexed templates and enrolling only new or changed files.
+        Returns (and keeps in last_enrollment) counts, wall time and per-stage timings.
+        """
         print("Loading student photos for face recognition...")
+        started = time.perf_counter()
+        summary: Dict = {'photos': 0, 'cached': 0, 'enrolled': 0, 'failed': 0, 'removed': 0,
+                         'seconds': 0.0, 'stage_seconds': {}}
+        self.last_enrollment = summary
         if not os.path.exists(self.student_photos_dir):
             print(f"Student photos directory not found: {self.student_photos_dir}")
-            return
-        import re
-        photo_files = [f for f in os.listdir(self.student_photos_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+            return summary
+        index = self._open_template_index()
+        photo_files = self._list_photo_files()
+        summary['photos'] = len(photo_files)
+        rows: Dict[str, Optional[int]] = {}
+        for photo_file in photo_files:
+            try:
+                rows[photo_file] = self._indexed_row(photo_file)
+            except Exception as e:
+                print(f"Error loading photo {photo_file}: {e}")
+                rows[photo_file] = None
+        to_enroll = [f for f in photo_files if rows[f] is None]
+        templates, summary['stage_seconds'] = self.enroll_photos(to_enroll, workers=workers, progress=progress)
+        pending: list = []
+        # Keep directory order so a later photo of the same student still wins
         for photo_file in photo_files:
             try:
-                # Expected format: student_<id>_anything.ext
-                match = re.match(r'^student_([^_]+)_', photo_file, flags=re.IGNORECASE)
-                if match:
-                    student_id = match.group(1)
+                if rows[photo_file] is not None:
+                    self._load_indexed_photo(photo_file, rows[photo_file])
+                    summary['cached'] += 1
+                elif self._load_photo_template(photo_file, templates.get(photo_file), pending):
+                    summary['enrolled'] += 1
                 else:
-                    # Fallback: take the first token before underscore or stem
-                    student_id = os.path.splitext(photo_file)[0].split('_')[0]
-                photo_path = os.path.join(self.student_photos_dir, photo_file)
-                template = self.create_face_template(photo_path)
-                if template is not None:
-                    # Store by lowercased student id for case-insensitive lookup
-                    self.known_faces[student_id.lower()] = {
-                        'template': template,
-                        'photo_path': photo_path,
-                        'name': photo_file.replace('.jpg', '').replace('.jpeg', '').replace('.png', ''),
-                        'original_student_id': student_id  # Keep original case for reference
-                    }
-                    print(f"Loaded photo for student {student_id} (stored as {student_id.lower()})")
+                    summary['failed'] += 1
             except Exception as e:
                 print(f"Error loading photo {photo_file}: {e}")
+                summary['failed'] += 1
+        if index is not None:
+            # Rows for deleted photos, then everything that had to be recomputed, in one write each
+            present = set(photo_files)
+            stale = [f for f in index.photo_files() if f not in present]
+            if stale:
+                index.remove(stale)
+                summary['removed'] = len(stale)
+            self._flush_template_index(pending)
+            self._bind_template_index()
+        summary['seconds'] = round(time.perf_counter() - started, 3)
+        summary['stage_seconds'] = {stage: round(sec, 3) for stage, sec in summary['stage_seconds'].items()}
         print(f"Loaded {len(self.known_faces)} student photos for face recognition")
+        return summary
 
-    def create_face_template(self, image_path: str) -> Optional[np.ndarray]:
+    def enroll_photo_files(self, photo_files: List[str]) -> Dict:
+        """
+        Add just photo_files (names in the photos directory, e.g. one newly registered photo) to
+        known_faces and the template index, without scanning the rest of the directory
+        """
+        started = time.perf_counter()
+        summary: Dict = {'photos': len(photo_files), 'cached': 0, 'enrolled': 0, 'failed': 0, 'removed': 0,
+                         'seconds': 0.0, 'stage_seconds': {}}
+        self.last_enrollment = summary
+        self._open_template_index()
+        pending: list = []
+        for photo_file in photo_files:
+            try:
+                if not os.path.isfile(os.path.join(self.student_photos_dir, photo_file)):
+                    print(f"Photo not found: {photo_file}")
+                    summary['failed'] += 1
+                elif self._indexed_row(photo_file) is not None:
+                    self._load_photo_file(photo_file)
+                    summary['cached'] += 1
+                elif self._load_photo_file(photo_file, pending):
+                    summary['enrolled'] += 1
+                else:
+                    summary['failed'] += 1
+            except Exception as e:
+                print(f"Error loading photo {photo_file}: {e}")
+                summary['failed'] += 1
+        self._flush_template_index(pending)
+        self._bind_template_index()
+        summary['seconds'] = round(time.perf_counter() - started, 3)
+        return summary
+
+    def refresh_student_photos(self) -> Dict[str, int]:
+        """Reload only photos that were added, changed or removed since the last load"""
+        summary = {'added': 0, 'updated': 0, 'removed': 0}
+        if not os.path.exists(self.student_photos_dir):
+            return summary
+        current = {}
+        for photo_file in self._list_photo_files():
+            photo_path = os.path.join(self.student_photos_dir, photo_file)
+            try:
+                st = os.stat(photo_path)
+            except OSError:
+                continue
+            current[photo_path] = (photo_file, (st.st_mtime_ns, st.st_size))
+        removed_files = []
+        for photo_path in [p for p in self._photo_stats if p not in current]:
+            self._gallery = None
+            del self._photo_stats[photo_path]
+            for sid, entry in list(self.known_faces.items()):
+                if entry.get('photo_path') == photo_path:
+                    del self.known_faces[sid]
+            removed_files.append(os.path.basename(photo_path))
+            summary['removed'] += 1
+        pending: list = []
+        for photo_path, (photo_file, stat_key) in current.items():
+            previous = self._photo_stats.get(photo_path)
+            if previous == stat_key:
+                continue
+            try:
+                self._load_photo_file(photo_file, pending)
+                summary['updated' if previous is not None else 'added'] += 1
+            except Exception as e:
+                print(f"Error loading photo {photo_file}: {e}")
+        index = self._writable_template_index()
+        if index is not None and removed_files:
+            index.remove(removed_files)
+        self._flush_template_index(pending)
+        if removed_files:
+            self._bind_template_index()
+        return summary
+
+    def create_face_template(self, image_path: str, timings: Optional[Dict[str, float]] = None) -> Optional[np.ndarray]:
+        # timings, if given, accumulates seconds per stage (read, detect, enhance, denoise, normalize)
+        return self.create_face_templates([image_path], timings=timings)[0]
+
+    def create_face_templates(self, image_paths: List[str], timings: Optional[Dict[str, float]] = None) -> List[Optional[np.ndarray]]:
+        """Templates for several photos; with DCGAN enabled, all face crops are enhanced in batches"""
+        crops = [self._template_face_crop(image_path, timings) for image_path in image_paths]
+        if self._dcgan_enabled_templates:
+            t = time.perf_counter()
+            found = [i for i, crop in enumerate(crops) if crop is not None]
+            enhanced = self._dcgan_enhancer.enhance_bgr_faces([crops[i] for i in found])
+            for i, crop in zip(found, enhanced):
+                crops[i] = crop
+            _lap(timings, 'enhance', t)
+        templates: List[Optional[np.ndarray]] = []
+        for image_path, face_bgr in zip(image_paths, crops):
+            try:
+                templates.append(None if face_bgr is None else self._face_crop_to_template(face_bgr, timings))
+            except Exception as e:
+                print(f"Error creating face template from {image_path}: {e}")
+                templates.append(None)
+        return templates
+
+    def _template_face_crop(self, image_path: str, timings: Optional[Dict[str, float]] = None) -> Optional[np.ndarray]:
+        """BGR crop of the largest face in a photo, or None"""
         try:
+            t = time.perf_counter()
             image = cv.imread(image_path)
+            t = _lap(timings, 'read', t)
             if image is None:
                 print(f"Could not load image: {image_path}")
                 return None
             gray = cv.cvtColor(image, cv.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=3, minSize=(50, 50))
-            if len(faces) == 0:
-                alt = cv.CascadeClassifier(cv.data.haarcascades + 'haarcascade_frontalface_alt2.xml')
-                faces = alt.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=3, minSize=(50, 50))
+            faces = detect_faces(gray)
+            _lap(timings, 'detect', t)
             if len(faces) == 0:
                 print(f"No faces found in {image_path}")
                 return None
@@ -190,25 +621,32 @@ class FaceRecognitionValidator:
             largest_face = max(faces, key=lambda x: x[2] * x[3])
             x, y, w, h = largest_face
             # Extract original BGR for optional enhancement, then convert to gray
-            face_bgr = image[y:y+h, x:x+w]
-            if self._dcgan_enabled_templates:
-                face_bgr = self._dcgan_enhancer.enhance_bgr_face(face_bgr)
-            face_img = cv.cvtColor(face_bgr, cv.COLOR_BGR2GRAY)
-            # Apply efficient denoising before further processing
-            if self.enable_denoising:
-                face_img = self._apply_efficient_denoising(face_img)
-            # Preprocess: contrast normalize (CLAHE), resize, and normalize range
-            clahe = cv.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-            face_img = clahe.apply(face_img)
-            face_template = cv.resize(face_img, (self.template_size, self.template_size))
-            face_template = cv.normalize(face_template, None, 0, 255, cv.NORM_MINMAX)
-            face_template = face_template.astype(np.uint8)
-            return face_template
+            return image[y:y+h, x:x+w]
         except Exception as e:
             print(f"Error creating face template from {image_path}: {e}")
             return None
 
+    def _face_crop_to_template(self, face_bgr: np.ndarray, timings: Optional[Dict[str, float]] = None) -> np.ndarray:
+        t = time.perf_counter()
+        face_img = cv.cvtColor(face_bgr, cv.COLOR_BGR2GRAY)
+        # Apply efficient denoising before further processing
+        if self.enable_denoising:
+            face_img = self._apply_efficient_denoising(face_img)
+            t = _lap(timings, 'denoise', t)
+        # Preprocess: contrast normalize (CLAHE), resize, and normalize range
+        clahe = cv.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        face_img = clahe.apply(face_img)
+        face_template = cv.resize(face_img, (self.template_size, self.template_size))
+        face_template = cv.normalize(face_template, None, 0, 255, cv.NORM_MINMAX)
+        face_template = face_template.astype(np.uint8)
+        _lap(timings, 'normalize', t)
+        return face_template
+
     def extract_face_from_frame(self, frame: np.ndarray) -> List[np.ndarray]:
+        return [template for template, _ in self.extract_faces_with_boxes(frame)]
+
+    def extract_faces_with_boxes(self, frame: np.ndarray) -> List[Tuple[np.ndarray, Dict]]:
+        """Templates with their face boxes ({'x','y','w','h'} in frame coordinates), largest face only"""
         try:
             # Downscale for faster detection if frame is wide
             h0, w0 = frame.shape[:2]
@@ -221,10 +659,7 @@ class FaceRecognitionValidator:
             else:
                 small = frame
             gray = cv.cvtColor(small, cv.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=3, minSize=(50, 50))
-            if len(faces) == 0:
-                alt = cv.CascadeClassifier(cv.data.haarcascades + 'haarcascade_frontalface_alt2.xml')
-                faces = alt.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=3, minSize=(50, 50))
+            faces = detect_faces(gray)
             if len(faces) == 0:
                 return []
             # Keep only the largest face for speed
@@ -245,7 +680,7 @@ class FaceRecognitionValidator:
             face_template = cv.resize(face_img, (self.template_size, self.template_size))
             face_template = cv.normalize(face_template, None, 0, 255, cv.NORM_MINMAX)
             face_template = face_template.astype(np.uint8)
-            return [face_template]
+            return [(face_template, {'x': x, 'y': y, 'w': w, 'h': h})]
         except Exception as e:
             print(f"Error extracting faces from frame: {e}")
             return []
@@ -272,7 +707,102 @@ class FaceRecognitionValidator:
         v = (v - np.mean(v)) / (np.std(v) + 1e-6)
         return v
 
-    def validate_student_face(self, frame: np.ndarray, student_id: str) -> Dict:
+    def _template_to_unit_vector(self, template: np.ndarray) -> np.ndarray:
+        v = self._template_to_standardized_vector(template)
+        return v / (float(np.linalg.norm(v)) + 1e-6)
+
+    def _identification_gallery(self) -> Dict:
+        """Known faces as one contiguous matrix of unit vectors plus a student-id-to-row index"""
+        if self._gallery is not None:
+            return self._gallery
+        ids = list(self.known_faces.keys())
+        index = self._writable_template_index()
+        rows: Optional[List[int]] = [] if index is not None else None
+        for sid in ids:
+            if rows is None:
+                break
+            photo_path = self.known_faces[sid].get('photo_path') or ''
+            stat_key = self._photo_stats.get(photo_path)
+            row = index.lookup(os.path.basename(photo_path), *stat_key) if stat_key else None
+            if row is None:
+                rows = None
+            else:
+                rows.append(row)
+        dim = self.template_size ** 2
+        if not ids:
+            matrix = np.zeros((0, dim), dtype=np.float32)
+        elif rows is not None and rows == list(range(len(index))):
+            # Every known face is an index row, in order: use the memory-mapped matrix as is
+            matrix = index.vectors
+        elif rows is not None:
+            matrix = np.ascontiguousarray(index.vectors[np.asarray(rows, dtype=np.int64)])
+        else:
+            matrix = np.ascontiguousarray(np.stack([
+                np.asarray(self.known_faces[sid].get('vector'), dtype=np.float32).reshape(-1)
+                if self.known_faces[sid].get('vector') is not None
+                else self._template_to_unit_vector(self.known_faces[sid]['template'])
+                for sid in ids
+            ]))
+        self._gallery = {'ids': ids, 'rows': {sid: i for i, sid in enumerate(ids)}, 'matrix': matrix}
+        return self._gallery
+
+    def identify_template(self, template: np.ndarray, allowed_ids=None, top_k: int = 5) -> Dict:
+        """
+        Rank known faces against a face template with one matrix product.
+        allowed_ids (lowercase ids) restricts the ranking to those students.
+        """
+        gallery = self._identification_gallery()
+        if allowed_ids is None:
+            positions = None
+            candidates = gallery['matrix']
+        else:
+            positions = np.array(sorted(gallery['rows'][sid] for sid in allowed_ids if sid in gallery['rows']),
+                                 dtype=np.int64)
+            candidates = gallery['matrix'][positions]
+        result: Dict = {
+            'best_student_id': None,
+            'best_confidence': 0.0,
+            'second_best': 0.0,
+            'margin': 0.0,
+            'candidates': [],
+            'compared': int(len(candidates)),
+        }
+        if len(candidates) == 0:
+            return result
+        query = self._template_to_unit_vector(template)
+        # Cosine similarity mapped from [-1, 1] to [0, 1]
+        similarities = (candidates @ query + 1.0) / 2.0
+        k = min(max(int(top_k), 2), len(similarities))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top], kind='stable')]
+        ranked = []
+        for pos in top:
+            sid = gallery['ids'][int(pos if positions is None else positions[pos])]
+            ranked.append({'student_id': sid, 'similarity': float(similarities[pos])})
+        best = ranked[0]
+        if best['similarity'] > 0.0:
+            result['best_student_id'] = best['student_id']
+            result['best_confidence'] = best['similarity']
+            result['second_best'] = ranked[1]['similarity'] if len(ranked) > 1 else 0.0
+            result['margin'] = max(0.0, result['best_confidence'] - result['second_best'])
+        result['candidates'] = ranked[:max(int(top_k), 1)]
+        return result
+
+    def identify(self, frame: np.ndarray, allowed_ids=None, top_k: int = 5) -> Dict:
+        """1:N identification of the largest face in frame against all (or allowed) known faces"""
+        faces = self.extract_faces_with_boxes(frame)
+        if len(faces) == 0:
+            return {'best_student_id': None, 'best_confidence': 0.0, 'second_best': 0.0, 'margin': 0.0,
+                    'candidates': [], 'compared': 0, 'face_detected': False, 'box': None}
+        template, box = faces[0]
+        result = self.identify_template(template, allowed_ids, top_k)
+        result['face_detected'] = True
+        result['box'] = box
+        return result
+
+    def validate_student_face(self, frame: np.ndarray, student_id: str, threshold: Optional[float] = None,
+                              timings: Optional[Dict[str, float]] = None) -> Dict:
+        # timings, if given, accumulates seconds for the 'detect' and 'match' stages
         validation_result: Dict = {
             'is_valid': False,
             'confidence': 0.0,
@@ -280,6 +810,7 @@ class FaceRecognitionValidator:
             'message': 'Unknown error',
             'face_detected': False,
             'known_student': False,
+            'box': None,
             'timestamp': datetime.now().isoformat()
         }
         try:
@@ -299,14 +830,16 @@ class FaceRecognitionValidator:
                     entry['vector'] = None
             known_vector = entry.get('vector')
 
-            current_templates = self.extract_face_from_frame(frame)
-            if len(current_templates) == 0:
+            t = time.perf_counter()
+            current_faces = self.extract_faces_with_boxes(frame)
+            t = _lap(timings, 'detect', t)
+            if len(current_faces) == 0:
                 validation_result['message'] = 'No face detected in camera'
                 validation_result['face_detected'] = False
                 return validation_result
             validation_result['face_detected'] = True
             # Compare only the largest face (first)
-            current_template = current_templates[0]
+            current_template, validation_result['box'] = current_faces[0]
             if known_vector is not None:
                 current_vector = self._template_to_standardized_vector(current_template)
                 dot = float(np.dot(known_vector, current_vector))
@@ -315,8 +848,11 @@ class FaceRecognitionValidator:
                 similarity = (cosine + 1.0) / 2.0
             else:
                 similarity = self.compare_faces(known_template, current_template)
+            _lap(timings, 'match', t)
             validation_result['confidence'] = max(0.0, min(1.0, similarity))
-            if validation_result['confidence'] >= self.validation_threshold:
+            if threshold is None:
+                threshold = self.validation_threshold
+            if validation_result['confidence'] >= threshold:
                 validation_result['is_valid'] = True
                 validation_result['message'] = f'Face verified for student {student_id}'
             else:
@@ -327,19 +863,212 @@ class FaceRecognitionValidator:
             validation_result['message'] = f'Face validation error: {str(e)}'
             return validation_result
 
+    @staticmethod
+    def _create_lbph_recognizer():
+        return cv.face.LBPHFaceRecognizer_create(radius=2, neighbors=8, grid_x=8, grid_y=8)
+
+    def build_lbph_model(self) -> bool:
+        """Train an LBPH model on all known faces once and keep it for lbph_predict"""
+        if not LBPH_AVAILABLE:
+            return False
+        self._lbph = {'model': None, 'faces': {}, 'labels': {}, 'samples': 0, 'next_label': 1}
+        self._sync_lbph_model()
+        return True
+
+    def _lbph_face_key(self, entry: Dict) -> tuple:
+        """The photo a face's LBPH sample came from: (file name, (mtime_ns, size))"""
+        photo_path = entry.get('photo_path') or ''
+        return os.path.basename(photo_path), self._photo_stats.get(photo_path)
+
+    def _lbph_signature(self) -> str:
+        return f"{self.template_signature()};lbph=r2n8g8x8"
+
+    def _lbph_version(self) -> str:
+        """Digest of the faces in the resident model; it changes whenever the photo set does"""
+        faces = sorted((sid, label, key[0], list(key[1] or ())) for sid, (label, key) in self._lbph['faces'].items())
+        return hashlib.sha1(json.dumps([self._lbph_signature(), faces]).encode('utf-8')).hexdigest()
+
+    def load_lbph_model(self) -> bool:
+        """
+        build_lbph_model backed by the model saved under <photos_dir>/.face_cache: the saved model
+        is read back, new or changed photos are added with update(), and it is saved again only
+        when that changed the photo set. Falls back to training when there is no usable model.
+        """
+        if not LBPH_AVAILABLE:
+            return False
+        cache_dir = os.path.join(self.student_photos_dir, '.face_cache')
+        saved_version = None
+        try:
+            with open(os.path.join(cache_dir, 'lbph.json'), 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved.get('signature') == self._lbph_signature():
+                model = self._create_lbph_recognizer()
+                model.read(os.path.join(cache_dir, os.path.basename(saved['model_file'])))
+                faces = {sid: (int(label), (photo_file, tuple(stat) if stat else None))
+                         for sid, label, photo_file, stat in saved['faces']}
+                self._lbph = {'model': model, 'faces': faces,
+                              'labels': {label: sid for sid, (label, _) in faces.items()},
+                              'samples': int(saved['samples']), 'next_label': int(saved['next_label'])}
+                saved_version = saved.get('version')
+        except (OSError, ValueError, KeyError, TypeError, cv.error):
+            saved_version = None
+        if saved_version is None:
+            self.build_lbph_model()
+        else:
+            self._sync_lbph_model()
+        if self._lbph_version() != saved_version:
+            self.save_lbph_model()
+        return True
+
+    def save_lbph_model(self) -> bool:
+        """
+        Write the resident LBPH model (base64 XML via model.write) and its label map to .face_cache.
+        The model file is named by version and lbph.json is replaced last, so concurrent readers
+        always find a model that matches the labels they read.
+        """
+        lbph = self._lbph
+        if lbph is None or lbph['model'] is None:
+            return False
+        cache_dir = os.path.join(self.student_photos_dir, '.face_cache')
+        version = self._lbph_version()
+        model_file = f"lbph_{version[:16]}.xml"
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_model = os.path.join(cache_dir, f"lbph.{os.getpid()}.tmp.xml")
+            lbph['model'].write(tmp_model + '?base64')
+            os.replace(tmp_model, os.path.join(cache_dir, model_file))
+            saved = {
+                'signature': self._lbph_signature(),
+                'version': version,
+                'model_file': model_file,
+                'samples': lbph['samples'],
+                'next_label': lbph['next_label'],
+                'faces': [[sid, label, key[0], list(key[1]) if key[1] else None]
+                          for sid, (label, key) in lbph['faces'].items()],
+            }
+            tmp_labels = os.path.join(cache_dir, f"lbph.{os.getpid()}.tmp.json")
+            with open(tmp_labels, 'w', encoding='utf-8') as f:
+                json.dump(saved, f)
+            os.replace(tmp_labels, os.path.join(cache_dir, 'lbph.json'))
+            for old in glob.glob(os.path.join(cache_dir, 'lbph_*.xml')):
+                if os.path.basename(old) != model_file:
+                    with contextlib.suppress(OSError):
+                        os.remove(old)
+            return True
+        except (OSError, cv.error) as e:
+            print(f"Could not save LBPH model: {e}")
+            return False
+
+    def _sync_lbph_model(self):
+        """Bring the resident LBPH model up to date with known_faces"""
+        lbph = self._lbph
+        faces: Dict[str, tuple] = {}
+        new_images, new_labels = [], []
+        for sid, entry in self.known_faces.items():
+            template = entry.get('template')
+            if template is None:
+                continue
+            key = self._lbph_face_key(entry)
+            known = lbph['faces'].get(sid)
+            if known is not None and known[1] == key:
+                faces[sid] = known
+                continue
+            faces[sid] = (lbph['next_label'], key)
+            new_images.append(np.ascontiguousarray(template))
+            new_labels.append(lbph['next_label'])
+            lbph['next_label'] += 1
+        # LBPH cannot forget samples; replaced or removed faces keep stale labels that predictions skip
+        stale = lbph['samples'] + len(new_labels) - len(faces)
+        if lbph['model'] is None or stale > max(16, len(faces) // 2):
+            lbph['model'] = None
+            lbph['samples'] = 0
+            faces = {}
+            new_images, new_labels = [], []
+            for label, (sid, entry) in enumerate(self.known_faces.items(), start=1):
+                if entry.get('template') is None:
+                    continue
+                faces[sid] = (label, self._lbph_face_key(entry))
+                new_images.append(np.ascontiguousarray(entry['template']))
+                new_labels.append(label)
+            lbph['next_label'] = len(self.known_faces) + 1
+            if new_images:
+                lbph['model'] = self._create_lbph_recognizer()
+                lbph['model'].train(new_images, np.array(new_labels))
+        elif new_images:
+            lbph['model'].update(new_images, np.array(new_labels))
+        if lbph['model'] is not None:
+            lbph['samples'] += len(new_labels)
+        lbph['faces'] = faces
+        lbph['labels'] = {label: sid for sid, (label, _) in faces.items()}
+
+    def lbph_predict(self, template: np.ndarray, allowed_ids=None) -> Optional[tuple]:
+        """
+        Nearest known face by LBPH distance as (student_id, distance), restricted to allowed_ids.
+        Uses the resident model when build_lbph_model or load_lbph_model was called (allowed_ids
+        then filters the per-label distances), otherwise trains on the allowed candidates.
+        """
+        if not LBPH_AVAILABLE:
+            return None
+        if self._lbph is not None:
+            if not self.read_only:
+                self._sync_lbph_model()
+            model = self._lbph['model']
+            if model is None:
+                return None
+            labels = self._lbph['labels']
+            collector = cv.face.StandardCollector_create()
+            model.predict_collect(template, collector)
+            best = None
+            for label, distance in collector.getResults(sorted=False):
+                sid = labels.get(int(label))
+                if sid is None or (allowed_ids is not None and sid not in allowed_ids):
+                    continue
+                if best is None or distance < best[1]:
+                    best = (sid, float(distance))
+            return best
+        candidate_ids, images = [], []
+        for sid, entry in self.known_faces.items():
+            if entry.get('template') is None or (allowed_ids is not None and sid not in allowed_ids):
+                continue
+            candidate_ids.append(sid)
+            images.append(np.ascontiguousarray(entry['template']))
+        if not images:
+            return None
+        model = self._create_lbph_recognizer()
+        model.train(images, np.arange(1, len(images) + 1))
+        label, distance = model.predict(template)
+        return candidate_ids[label - 1], float(distance)
+
+    def snapshot(self, lbph: bool = False) -> 'FaceRecognitionValidator':
+        """
+        Read-only copy for matching while this validator keeps loading photos: it has its own
+        known_faces entries and identification gallery (and, with lbph=True, its own LBPH model)
+        and shares only the template arrays, which are replaced rather than modified.
+        """
+        snap = copy.copy(self)
+        snap.known_faces = {sid: dict(entry) for sid, entry in self.known_faces.items()}
+        for entry in snap.known_faces.values():
+            if entry.get('vector') is None and entry.get('template') is not None:
+                entry['vector'] = self._template_to_standardized_vector(entry['template'])
+        snap._photo_stats = dict(self._photo_stats)
+        snap.last_enrollment = dict(self.last_enrollment)
+        snap._gallery = None
+        snap._identification_gallery()
+        snap._lbph = None
+        if lbph:
+            snap.build_lbph_model()
+        snap.read_only = True
+        return snap
+
     def add_student_photo(self, student_id: str, image_path: str) -> bool:
         try:
             import shutil
             target_path = os.path.join(self.student_photos_dir, f"{student_id}_photo.jpg")
             shutil.copy(image_path, target_path)
+            self._remember_photo_stat(target_path)
             template = self.create_face_template(target_path)
             if template is not None:
-                self.known_faces[student_id.lower()] = {
-                    'template': template,
-                    'photo_path': target_path,
-                    'name': f"{student_id}_photo",
-                    'original_student_id': student_id
-                }
+                self._store_known_face(student_id, target_path, template)
                 print(f"Added photo for student {student_id} (stored as {student_id.lower()})")
                 return True
             else:
@@ -353,14 +1082,10 @@ class FaceRecognitionValidator:
         try:
             photo_path = os.path.join(self.student_photos_dir, f"{student_id}_captured.jpg")
             cv.imwrite(photo_path, frame)
+            self._remember_photo_stat(photo_path)
             template = self.create_face_template(photo_path)
             if template is not None:
-                self.known_faces[student_id.lower()] = {
-                    'template': template,
-                    'photo_path': photo_path,
-                    'name': f"{student_id}_captured",
-                    'original_student_id': student_id
-                }
+                self._store_known_face(student_id, photo_path, template)
                 print(f"Captured and saved photo for student {student_id} (stored as {student_id.lower()})")
                 return True
             else:
@@ -556,12 +1281,13 @@ class FaceRecognitionUI:
     def draw_face_validation_overlay(frame: np.ndarray, validation_result: Dict) -> np.ndarray:
         overlay_frame = frame.copy()
         height, width = frame.shape[:2]
-        face_cascade = cv.CascadeClassifier(cv.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=4, minSize=(60, 60))
-        if len(faces) == 0:
-            alt_cascade = cv.CascadeClassifier(cv.data.haarcascades + 'haarcascade_frontalface_alt2.xml')
-            faces = alt_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=4, minSize=(60, 60))
+        box = validation_result.get('box')
+        if box:
+            # Reuse the box found during validation instead of detecting again
+            faces = [(box['x'], box['y'], box['w'], box['h'])]
+        else:
+            gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
+            faces = detect_faces(gray, min_neighbors=4, min_size=(60, 60))
         for (x, y, w, h) in faces:
             color = (0, 255, 0) if validation_result['is_valid'] else (0, 0, 255)
             cv.rectangle(overlay_frame, (int(x), int(y)), (int(x+w), int(y+h)), color, 3)
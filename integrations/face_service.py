@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Face Recognition Service
+Long-lived HTTP service that keeps student face templates loaded between requests.
+
+The /verify and /identify endpoints return the same JSON as face_verification_cli.py
+and face_identification_cli.py, so PHP can call the service and fall back to the CLIs.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import cv2 as cv
+import numpy as np
+from flask import Flask, request, jsonify
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from face_recognition_validator import FaceRecognitionValidator  # type: ignore
+from face_identification_cli import identify_face, read_allowed_ids  # type: ignore
+from face_verification_cli import verify_face  # type: ignore
+
+
+class FaceService:
+    """
+    Requests match against self.faces, a read-only snapshot of the validator. Reloads run on the
+    validator under self.lock and publish a new snapshot, so identification never waits for them.
+    """
+
+    def __init__(self, photos_dir: str, uploads_dir: str = None, watch_interval: float = 2.0):
+        self.photos_dir = photos_dir
+        self.uploads_dir = os.path.realpath(uploads_dir or photos_dir)
+        self.watch_interval = watch_interval
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.last_refresh = None
+        self.validator = FaceRecognitionValidator(student_photos_dir=photos_dir)
+        # LBPH is trained once per snapshot, i.e. at start and after photos change
+        self.faces = self.validator.snapshot(lbph=True)
+        self._stop_event = threading.Event()
+        self._watcher = threading.Thread(target=self._watch, daemon=True)
+        self._watcher.start()
+
+    def _watch(self):
+        # Poll the photos directory and reload only new, changed or removed photos
+        while not self._stop_event.wait(self.watch_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Face service refresh failed: {e}", file=sys.stderr)
+
+    def refresh(self) -> dict:
+        with self.lock:
+            summary = self.validator.refresh_student_photos()
+            if any(summary.values()):
+                self.faces = self.validator.snapshot(lbph=True)
+        self.last_refresh = datetime.now().isoformat()
+        if any(summary.values()):
+            print(f"Face service reloaded photos: {summary}", file=sys.stderr)
+        return summary
+
+    def stop(self):
+        self._stop_event.set()
+
+
+app = Flask(__name__)
+service: FaceService = None  # type: ignore
+
+
+def _request_data() -> dict:
+    data = request.get_json(silent=True)
+    if data is None:
+        data = request.form.to_dict()
+    return data or {}
+
+
+def _upload_path(path: str):
+    """Real path of path if it is inside the uploads directory, else None"""
+    if not path:
+        return None
+    real = os.path.realpath(path)
+    try:
+        inside = os.path.commonpath([real, service.uploads_dir]) == service.uploads_dir
+    except ValueError:
+        inside = False
+    return real if inside else None
+
+
+def _request_image(data: dict):
+    """Read the frame from an uploaded file ('image' or 'frame') or from image_path"""
+    upload = request.files.get('image') or request.files.get('frame')
+    if upload is not None:
+        buf = np.frombuffer(upload.read(), dtype=np.uint8)
+        image = cv.imdecode(buf, cv.IMREAD_COLOR) if buf.size else None
+        return image, None if image is not None else 'Failed to read image'
+    image_path = data.get('image_path') or ''
+    if image_path and _upload_path(image_path) is None:
+        return None, 'Image path must be inside the uploads directory'
+    if not image_path or not os.path.exists(image_path):
+        return None, f"Image not found: {image_path}"
+    image = cv.imread(image_path)
+    return image, None if image is not None else 'Failed to read image'
+
+
+@app.route('/health', methods=['GET'])
+def health():
+    return jsonify({
+        'status': 'ok',
+        'photos_dir': service.photos_dir,
+        'known_faces': len(service.faces.known_faces),
+        'uptime_seconds': round(time.time() - service.started_at, 1),
+        'last_refresh': service.last_refresh
+    })
+
+
+@app.route('/reload', methods=['POST'])
+def reload_photos():
+    return jsonify({'success': True, 'changes': service.refresh()})
+
+
+@app.route('/verify', methods=['POST'])
+def verify():
+    data = _request_data()
+    student_id = str(data.get('student_id') or '')
+    try:
+        threshold = float(data.get('threshold', 0.7))
+    except (TypeError, ValueError):
+        threshold = 0.7
+    result = {
+        "success": False,
+        "message": "",
+        "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "face_validation": {
+            "student_id": student_id,
+            "is_valid": False,
+            "confidence": 0.0,
+            "face_detected": False,
+            "known_student": False,
+            "box": None,
+        }
+    }
+    image, error = _request_image(data)
+    if image is None:
+        result["message"] = error
+        return jsonify(result)
+    try:
+        result = verify_face(service.faces, image, student_id, threshold=threshold)
+    except Exception as e:
+        result["message"] = f"Error: {str(e)}"
+    return jsonify(result)
+
+
+@app.route('/identify', methods=['POST'])
+def identify():
+    data = _request_data()
+    try:
+        threshold = float(data.get('threshold', 0.75))
+        min_margin = float(data.get('min_margin', 0.08))
+        top_k = int(data.get('top_k', 5))
+    except (TypeError, ValueError):
+        threshold, min_margin, top_k = 0.75, 0.08, 5
+    result = {
+        'success': False,
+        'message': '',
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'identification': {
+            'best_student_id': None,
+            'best_confidence': 0.0,
+            'face_detected': False,
+            'box': None,
+        }
+    }
+    image, error = _request_image(data)
+    if image is None:
+        result['message'] = error
+        return jsonify(result)
+    allowed_ids = data.get('allowed_ids')
+    if isinstance(allowed_ids, str):
+        allowed_ids = [sid for sid in allowed_ids.split(',')]
+    if isinstance(allowed_ids, list):
+        allowed_ids = set(str(sid).strip().lower() for sid in allowed_ids if str(sid).strip())
+    elif data.get('allowed_ids_path'):
+        allowed_ids_path = _upload_path(data['allowed_ids_path'])
+        if allowed_ids_path is None:
+            result['message'] = 'Allowed IDs path must be inside the uploads directory'
+            return jsonify(result)
+        allowed_ids = read_allowed_ids(allowed_ids_path)
+    else:
+        allowed_ids = None
+    try:
+        result = identify_face(service.faces, image, allowed_ids=allowed_ids,
+                               threshold=threshold, min_margin=min_margin, top_k=top_k)
+    except Exception as e:
+        result['message'] = f'Error: {str(e)}'
+    return jsonify(result)
+
+
+def main():
+    global service
+    default_photos = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'uploads')
+    parser = argparse.ArgumentParser(description='Face Recognition Service')
+    parser.add_argument('--photos_dir', default=os.environ.get('FACE_PHOTOS_DIR', default_photos))
+    parser.add_argument('--uploads_dir', default=os.environ.get('FACE_UPLOADS_DIR'),
+                        help='Directory image_path and allowed_ids_path must be in (default: photos_dir)')
+    parser.add_argument('--host', default=os.environ.get('FACE_SERVICE_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('FACE_SERVICE_PORT', '5112')))
+    parser.add_argument('--watch_interval', type=float, default=2.0, help='Seconds between photo directory scans')
+    args = parser.parse_args()
+
+    # Nothing reads this process's stdout, so the validator's progress prints go to the log on
+    # stderr. Swapping sys.stdout once here is safe; redirecting it per request across threads is not
+    sys.stdout = sys.stderr
+    service = FaceService(args.photos_dir, uploads_dir=args.uploads_dir, watch_interval=args.watch_interval)
+    print(f"Face service ready with {len(service.faces.known_faces)} known faces", file=sys.stderr)
+    try:
+        app.run(host=args.host, port=args.port, debug=False, use_reloader=False, threaded=True)
+    finally:
+        service.stop()
+
+
+if __name__ == '__main__':
+    main()
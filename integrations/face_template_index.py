@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Face Template Index
+Compiled, memory-mapped store of student face templates so they are computed once per photo
+"""
+
+import contextlib
+import json
+import logging
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl  # type: ignore
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt  # type: ignore
+except ImportError:
+    msvcrt = None
+
+logger = logging.getLogger(__name__)
+
+
+class FaceTemplateIndex:
+    """
+    Single-file index of the face templates for one photos directory.
+
+    Layout: a 4 KiB JSON header (format version, settings signature, template
+    dimension, row count and capacity), a fixed-width entry table (student id,
+    photo file name, source mtime and size), the N x dim float32 matrix of
+    unit-length standardized vectors, and the N x dim uint8 templates. Everything
+    after the header is opened with np.memmap, so opening the index costs the same
+    for 10 or 10,000 students.
+
+    Rows other processes may already have mapped (row < count) are never written:
+    new photos are appended in place past the current count, while replacing or
+    removing a row writes a new file and swaps it in with os.replace. Readers keep
+    the old, unchanged file mapped until their next _sync re-maps the new one.
+    """
+
+    FORMAT_VERSION = 2
+    MAGIC = b'FACEIDX\n'
+    HEADER_SIZE = 4096
+    MIN_CAPACITY = 64
+    ENTRY_DTYPE = np.dtype([
+        ('student_id', 'S64'),
+        ('photo_file', 'S192'),
+        ('mtime_ns', '<i8'),
+        ('size', '<i8'),
+    ])
+
+    def __init__(self, path, dim: int, signature: str = ''):
+        self.path = str(path)
+        self.dim = int(dim)
+        self.signature = signature
+        self._load()
+
+    def _layout(self, capacity: int) -> Tuple[int, int, int, int]:
+        entries_offset = self.HEADER_SIZE
+        vectors_offset = entries_offset + capacity * self.ENTRY_DTYPE.itemsize
+        vectors_offset = (vectors_offset + 63) // 64 * 64
+        templates_offset = vectors_offset + capacity * self.dim * 4
+        total_size = templates_offset + capacity * self.dim
+        return entries_offset, vectors_offset, templates_offset, total_size
+
+    def _header_bytes(self, count: int, capacity: int) -> bytes:
+        body = json.dumps({
+            'version': self.FORMAT_VERSION,
+            'signature': self.signature,
+            'dim': self.dim,
+            'count': int(count),
+            'capacity': int(capacity),
+        }).encode('utf-8')
+        return (self.MAGIC + body).ljust(self.HEADER_SIZE, b' ')
+
+    def _read_header(self) -> Optional[Dict]:
+        with open(self.path, 'rb') as f:
+            raw = f.read(self.HEADER_SIZE)
+        if len(raw) < self.HEADER_SIZE or not raw.startswith(self.MAGIC):
+            return None
+        return json.loads(raw[len(self.MAGIC):].rstrip(b' ').decode('utf-8'))
+
+    def _reset(self):
+        self.count = 0
+        self.capacity = 0
+        self._inode = None
+        self._entries = None
+        self._vectors = None
+        self._templates = None
+        self._rows: Dict[str, int] = {}
+        self._student_ids: List[str] = []
+        self._stats: List[Tuple[int, int]] = []
+
+    def _load(self):
+        """Map the index file, or start empty if it is missing or was built with other settings"""
+        self._reset()
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return
+        try:
+            header = self._read_header()
+            if (header is None
+                    or header.get('version') != self.FORMAT_VERSION
+                    or header.get('signature') != self.signature
+                    or header.get('dim') != self.dim):
+                logger.info(f"Ignoring stale face template index {self.path}")
+                return
+            count = int(header['count'])
+            capacity = int(header['capacity'])
+            entries_offset, vectors_offset, templates_offset, total_size = self._layout(capacity)
+            if capacity <= 0 or count > capacity or st.st_size < total_size:
+                return
+            self._entries = np.memmap(self.path, dtype=self.ENTRY_DTYPE, mode='r+',
+                                      offset=entries_offset, shape=(capacity,))
+            self._vectors = np.memmap(self.path, dtype=np.float32, mode='r+',
+                                      offset=vectors_offset, shape=(capacity, self.dim))
+            self._templates = np.memmap(self.path, dtype=np.uint8, mode='r+',
+                                        offset=templates_offset, shape=(capacity, self.dim))
+            entries = self._entries[:count]
+            photo_files = [name.decode('utf-8') for name in entries['photo_file'].tolist()]
+            self._student_ids = [sid.decode('utf-8') for sid in entries['student_id'].tolist()]
+            self._stats = list(zip(entries['mtime_ns'].tolist(), entries['size'].tolist()))
+            self._rows = {name: row for row, name in enumerate(photo_files)}
+            self.count = count
+            self.capacity = capacity
+            self._inode = st.st_ino
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable face template index {self.path}: {e}")
+            self._reset()
+
+    def _sync(self):
+        """Pick up rows written by another process since the index was mapped"""
+        try:
+            st = os.stat(self.path)
+            header = self._read_header() or {}
+        except OSError:
+            st, header = None, {}
+        if (st is None or st.st_ino != self._inode
+                or header.get('count') != self.count or header.get('capacity') != self.capacity):
+            self._load()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.lock', 'a+b') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            elif msvcrt is not None:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                elif msvcrt is not None:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _rewrite(self, records: Iterable[Tuple] = (), drop: Iterable[str] = ()):
+        """
+        Write the current rows minus drop, with records added or replaced, into a new file and
+        swap it in; mappings of the old file keep seeing its rows unchanged
+        """
+        drop = set(drop)
+        kept = sorted((row, photo_file) for photo_file, row in self._rows.items() if photo_file not in drop)
+        photo_files = [photo_file for _, photo_file in kept]
+        positions = {photo_file: pos for pos, photo_file in enumerate(photo_files)}
+        for record in records:
+            if record[1] not in positions:
+                positions[record[1]] = len(photo_files)
+                photo_files.append(record[1])
+        count = len(photo_files)
+        capacity = max(self.MIN_CAPACITY, self.capacity if count <= self.capacity else max(self.capacity * 2, count))
+        entries_offset, vectors_offset, templates_offset, total_size = self._layout(capacity)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self._header_bytes(count, capacity))
+            f.truncate(total_size)
+        if count:
+            entries = np.memmap(tmp_path, dtype=self.ENTRY_DTYPE, mode='r+', offset=entries_offset, shape=(count,))
+            vectors = np.memmap(tmp_path, dtype=np.float32, mode='r+', offset=vectors_offset,
+                                shape=(count, self.dim))
+            templates = np.memmap(tmp_path, dtype=np.uint8, mode='r+', offset=templates_offset,
+                                  shape=(count, self.dim))
+            if kept:
+                rows = np.asarray([row for row, _ in kept], dtype=np.int64)
+                entries[:len(kept)] = self._entries[rows]
+                vectors[:len(kept)] = self._vectors[rows]
+                templates[:len(kept)] = self._templates[rows]
+            for student_id, photo_file, mtime_ns, size, template, vector in records:
+                pos = positions[photo_file]
+                entries[pos] = (student_id.encode('utf-8'), photo_file.encode('utf-8'), int(mtime_ns), int(size))
+                vectors[pos] = np.asarray(vector, dtype=np.float32).reshape(-1)
+                templates[pos] = np.asarray(template, dtype=np.uint8).reshape(-1)
+            for arr in (entries, vectors, templates):
+                arr.flush()
+            del entries, vectors, templates
+        self._entries = self._vectors = self._templates = None
+        os.replace(tmp_path, self.path)
+        self._load()
+
+    def _write_header(self):
+        for arr in (self._entries, self._vectors, self._templates):
+            arr.flush()
+        with open(self.path, 'r+b') as f:
+            f.write(self._header_bytes(self.count, self.capacity))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def lookup(self, photo_file: str, mtime_ns: int, size: int) -> Optional[int]:
+        """
+        Return the row for photo_file if it was indexed from a file with this mtime and size
+        """
+        row = self._rows.get(photo_file)
+        if row is None or self._stats[row] != (mtime_ns, size):
+            return None
+        return row
+
+    def row_of(self, photo_file: str) -> Optional[int]:
+        return self._rows.get(photo_file)
+
+    def photo_files(self) -> List[str]:
+        return list(self._rows.keys())
+
+    def student_id(self, row: int) -> str:
+        return self._student_ids[row]
+
+    def template(self, row: int) -> np.ndarray:
+        return np.asarray(self._templates[row])
+
+    def vector(self, row: int) -> np.ndarray:
+        return np.asarray(self._vectors[row])
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Contiguous count x dim float32 matrix of unit-length vectors (memory-mapped)"""
+        if self._vectors is None:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.asarray(self._vectors[:self.count])
+
+    @property
+    def student_ids(self) -> List[str]:
+        return list(self._student_ids)
+
+    def upsert_many(self, records: Iterable[Tuple[str, str, int, int, np.ndarray, np.ndarray]]) -> bool:
+        """
+        Add or replace rows from (student_id, photo_file, mtime_ns, size, template, vector) records.
+        New photos are appended in place when they fit; replacing an existing row rewrites the file.
+        """
+        records = [r for r in records
+                   if len(r[0].encode('utf-8')) <= 64 and len(r[1].encode('utf-8')) <= 192]
+        if not records:
+            return True
+        try:
+            with self._locked():
+                self._sync()
+                new_files = set(r[1] for r in records if r[1] not in self._rows)
+                replaces = len(new_files) < len(set(r[1] for r in records))
+                if replaces or self.count + len(new_files) > self.capacity:
+                    self._rewrite(records)
+                    return True
+                # Only rows past the published count are written, so no reader sees them change
+                for student_id, photo_file, mtime_ns, size, template, vector in records:
+                    row = self._rows.get(photo_file)
+                    if row is None:
+                        row = self.count
+                        self.count += 1
+                        self._rows[photo_file] = row
+                        self._student_ids.append(student_id)
+                        self._stats.append((int(mtime_ns), int(size)))
+                    else:
+                        # The same new photo twice in one batch: its row is not published yet
+                        self._student_ids[row] = student_id
+                        self._stats[row] = (int(mtime_ns), int(size))
+                    self._entries[row] = (student_id.encode('utf-8'), photo_file.encode('utf-8'),
+                                          int(mtime_ns), int(size))
+                    self._vectors[row] = np.asarray(vector, dtype=np.float32).reshape(-1)
+                    self._templates[row] = np.asarray(template, dtype=np.uint8).reshape(-1)
+                self._write_header()
+            return True
+        except Exception as e:
+            logger.warning(f"Could not update face template index {self.path}: {e}")
+            self._load()
+            return False
+
+    def remove(self, photo_files: Iterable[str]) -> bool:
+        """
+        Drop rows for photo_files by rewriting the index without them
+        """
+        try:
+            with self._locked():
+                self._sync()
+                drop = [photo_file for photo_file in photo_files if photo_file in self._rows]
+                if drop:
+                    self._rewrite(drop=drop)
+            return True
+        except Exception as e:
+            logger.warning(f"Could not update face template index {self.path}: {e}")
+            self._load()
+            return False
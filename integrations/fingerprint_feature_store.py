@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Fingerprint Feature Store
+Persists extracted reference fingerprint features so they are computed once per file
+"""
+
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class FingerprintFeatureStore:
+    """
+    On-disk cache of fingerprint features, one small .npz file per reference image.
+
+    Entries are keyed by the reference's absolute path and validated against its
+    mtime and size, so a replaced or edited reference is re-extracted automatically.
+    The ``signature`` describes the extraction settings; entries written with a
+    different signature are treated as stale. Ridge features are stored at reduced
+    precision (uint8 block orientations, float16 block energies).
+    """
+
+    FORMAT_VERSION = 2
+
+    def __init__(self, cache_dir, signature: str = ''):
+        self.cache_dir = Path(cache_dir)
+        self.signature = signature
+
+    def _entry_path(self, image_path: Path) -> Path:
+        key = hashlib.sha1(str(image_path).encode('utf-8')).hexdigest()[:20]
+        return self.cache_dir / f"{key}.npz"
+
+    @staticmethod
+    def _stat(image_path: Path) -> Optional[os.stat_result]:
+        try:
+            return image_path.stat()
+        except OSError:
+            return None
+
+    def get(self, image_path) -> Optional[Dict]:
+        """
+        Return cached features for image_path, or None if missing or stale
+        """
+        image_path = Path(image_path).resolve()
+        st = self._stat(image_path)
+        entry_path = self._entry_path(image_path)
+        if st is None or not entry_path.exists():
+            return None
+        try:
+            with np.load(entry_path, allow_pickle=False) as data:
+                if (int(data['format_version']) != self.FORMAT_VERSION
+                        or str(data['signature']) != self.signature
+                        or str(data['source_path']) != str(image_path)
+                        or int(data['mtime_ns']) != st.st_mtime_ns
+                        or int(data['size']) != st.st_size):
+                    return None
+                return {
+                    'lbp_histogram': data['lbp_histogram'].astype(np.int64),
+                    'ridge_density': float(data['ridge_density']),
+                    'corner_points': data['corner_points'].astype(np.int32),
+                    'ridge_orientation': data['ridge_orientation'],
+                    'ridge_energy': data['ridge_energy'],
+                }
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable feature cache entry {entry_path}: {e}")
+            return None
+
+    def put(self, image_path, features: Dict) -> bool:
+        """
+        Store features for image_path, stamped with its current mtime and size
+        """
+        image_path = Path(image_path).resolve()
+        st = self._stat(image_path)
+        if st is None:
+            return False
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            entry_path = self._entry_path(image_path)
+            tmp_path = entry_path.with_name(entry_path.name + f".{os.getpid()}.tmp")
+            corner_points = np.asarray(features.get('corner_points', []), dtype=np.int16).reshape(-1, 2)
+            with open(tmp_path, 'wb') as f:
+                np.savez(
+                    f,
+                    format_version=np.int32(self.FORMAT_VERSION),
+                    signature=np.str_(self.signature),
+                    source_path=np.str_(str(image_path)),
+                    mtime_ns=np.int64(st.st_mtime_ns),
+                    size=np.int64(st.st_size),
+                    lbp_histogram=np.asarray(features['lbp_histogram'], dtype=np.uint32),
+                    ridge_density=np.float64(features['ridge_density']),
+                    corner_points=corner_points,
+                    ridge_orientation=np.asarray(features['ridge_orientation'], dtype=np.uint8),
+                    ridge_energy=np.asarray(features['ridge_energy'], dtype=np.float16),
+                )
+            os.replace(tmp_path, entry_path)
+            return True
+        except Exception as e:
+            logger.warning(f"Could not write feature cache for {image_path}: {e}")
+            return False
+
+    def invalidate(self, image_path) -> None:
+        """
+        Drop the cached entry for image_path, if any
+        """
+        entry_path = self._entry_path(Path(image_path).resolve())
+        try:
+            entry_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def prune(self) -> int:
+        """
+        Remove entries whose reference image no longer exists; returns the number removed
+        """
+        removed = 0
+        if not self.cache_dir.exists():
+            return removed
+        for entry_path in self.cache_dir.glob('*.npz'):
+            try:
+                with np.load(entry_path, allow_pickle=False) as data:
+                    source = Path(str(data['source_path']))
+                if source.exists():
+                    continue
+            except Exception:
+                pass
+            entry_path.unlink(missing_ok=True)
+            removed += 1
+        return removed
@@ -4,15 +4,24 @@ Fingerprint Verification System
 Compares captured fingerprint images with stored reference fingerprints
 """
 
-import cv2
-import numpy as np
 import os
 import sys
+
+# Ensure we can import project modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Imported before cv2 so --timings includes its import time
+import timing  # type: ignore
+import cv2
+import numpy as np
 import json
 import argparse
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional
 import logging
+import threading
+
+from fingerprint_feature_store import FingerprintFeatureStore
 
 # Custom JSON encoder to handle numpy types
 class NumpyEncoder(json.JSONEncoder):
@@ -26,7 +35,7 @@ class NumpyEncoder(json.JSONEncoder):
         return super(NumpyEncoder, self).default(obj)
 
 # Configure logging - only enable if not called from API
-if '--captured' in sys.argv:
+if '--captured' in sys.argv or '--enroll' in sys.argv:
     # Called from API, disable logging to avoid JSON interference
     logging.basicConfig(level=logging.ERROR, stream=sys.stderr)
 else:
@@ -35,10 +44,193 @@ else:
 
 logger = logging.getLogger(__name__)
 
+# Neighbour order (bit 0..7) used for LBP codes: clockwise from the top-left pixel
+LBP_NEIGHBOR_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1))
+LBP_METHODS = ('default', 'uniform', 'rotation_invariant')
+# Number of leading corner points compared between two prints
+CORNER_POINTS_COMPARED = 10
+# Relative weight of each similarity term; scores are divided by the sum of the weights applied
+COMPARISON_WEIGHTS = {'lbp': 0.4, 'density': 0.3, 'points': 0.3, 'ridge': 0.3}
+
+_LBP_MAPPINGS: Dict[str, Tuple[Optional[np.ndarray], int]] = {}
+
+
+def _lbp_mapping(method: str) -> Tuple[Optional[np.ndarray], int]:
+    """
+    Return (lookup table, number of bins) that maps raw 8-bit LBP codes to the given variant.
+
+    'default' keeps all 256 codes. 'uniform' keeps the 58 codes with at most two
+    circular 0/1 transitions and folds the rest into one extra bin. 'rotation_invariant'
+    maps every code to the minimum over its 8 circular rotations (36 bins).
+    """
+    if method not in _LBP_MAPPINGS:
+        if method == 'default':
+            _LBP_MAPPINGS[method] = (None, 256)
+        elif method == 'uniform':
+            uniform = [code for code in range(256)
+                       if bin(code ^ (((code >> 1) | (code << 7)) & 0xFF)).count('1') <= 2]
+            table = np.full(256, len(uniform), dtype=np.uint8)
+            table[uniform] = np.arange(len(uniform), dtype=np.uint8)
+            _LBP_MAPPINGS[method] = (table, len(uniform) + 1)
+        elif method == 'rotation_invariant':
+            minimal = [min(((code >> r) | (code << (8 - r))) & 0xFF for r in range(8)) for code in range(256)]
+            distinct = sorted(set(minimal))
+            index = {value: i for i, value in enumerate(distinct)}
+            table = np.array([index[value] for value in minimal], dtype=np.uint8)
+            _LBP_MAPPINGS[method] = (table, len(distinct))
+        else:
+            raise ValueError(f"Unknown LBP method: {method} (expected one of {', '.join(LBP_METHODS)})")
+    return _LBP_MAPPINGS[method]
+
+
+# Gabor filter bank defaults: 8 orientations x 3 wavelengths, 16x16-pixel ridge blocks
+GABOR_KERNEL_SIZE = 21
+GABOR_SIGMA = 8.0
+GABOR_GAMMA = 0.5
+DEFAULT_GABOR_ORIENTATIONS = 8
+DEFAULT_GABOR_WAVELENGTHS = (8.0, 10.0, 12.0)
+RIDGE_BLOCK_SIZE = 16
+# Blocks whose normalized Gabor energy is below this are treated as background
+RIDGE_MIN_ENERGY = 0.1
+
+
+class GaborFilterBank:
+    """
+    Precomputed Gabor kernels applied to an image in one batched FFT pass.
+
+    Kernel spectra are cached per padded image shape, so filtering a 256x256
+    print costs one forward FFT plus one batched inverse FFT for all filters.
+    """
+
+    def __init__(self, orientations: int = DEFAULT_GABOR_ORIENTATIONS,
+                 wavelengths: Tuple[float, ...] = DEFAULT_GABOR_WAVELENGTHS,
+                 ksize: int = GABOR_KERNEL_SIZE, sigma: float = GABOR_SIGMA, gamma: float = GABOR_GAMMA):
+        self.orientations = int(orientations)
+        self.wavelengths = tuple(float(w) for w in wavelengths)
+        self.ksize = int(ksize)
+        kernels = []
+        for wavelength in self.wavelengths:
+            for i in range(self.orientations):
+                theta = np.pi * i / self.orientations
+                kernels.append(cv2.getGaborKernel((self.ksize, self.ksize), sigma, theta, wavelength, gamma, 0,
+                                                  ktype=cv2.CV_32F))
+        # Shape: (wavelengths * orientations, ksize, ksize), orientation varies fastest
+        self.kernels = np.stack(kernels).astype(np.float32)
+        self._spectra: Dict[Tuple[int, int], np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def _kernel_spectra(self, shape: Tuple[int, int]) -> np.ndarray:
+        with self._lock:
+            spectra = self._spectra.get(shape)
+            if spectra is None:
+                half = self.ksize // 2
+                # filter2D correlates, so convolve with the flipped kernel centred at the origin
+                padded = np.zeros((len(self.kernels),) + shape, dtype=np.float32)
+                padded[:, :self.ksize, :self.ksize] = self.kernels[:, ::-1, ::-1]
+                padded = np.roll(padded, (-half, -half), axis=(1, 2))
+                spectra = np.fft.rfft2(padded).astype(np.complex64)
+                self._spectra[shape] = spectra
+            return spectra
+
+    def filter(self, image: np.ndarray) -> np.ndarray:
+        """
+        Return all filter responses for a grayscale image, shape (filters, height, width)
+        """
+        half = self.ksize // 2
+        padded = cv2.copyMakeBorder(image.astype(np.float32), half, half, half, half, cv2.BORDER_REFLECT_101)
+        spectra = self._kernel_spectra(padded.shape)
+        responses = np.fft.irfft2(np.fft.rfft2(padded)[None, :, :] * spectra, s=padded.shape)
+        return responses[:, half:half + image.shape[0], half:half + image.shape[1]].astype(np.float32)
+
+    def ridge_descriptor(self, image: np.ndarray, block_size: int = RIDGE_BLOCK_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Reduce the filter responses to a per-block dominant orientation and normalized energy.
+
+        Returns (orientation index per block as uint8, energy in [0, 1] per block as float16).
+        """
+        responses = np.abs(self.filter(image))
+        height = (image.shape[0] // block_size) * block_size
+        width = (image.shape[1] // block_size) * block_size
+        blocks = responses[:, :height, :width].reshape(
+            len(self.wavelengths), self.orientations, height // block_size, block_size, width // block_size, block_size
+        )
+        # Mean magnitude per block, summed over wavelengths -> (orientations, rows, cols)
+        energy = blocks.mean(axis=(3, 5)).sum(axis=0)
+        orientation = np.argmax(energy, axis=0).astype(np.uint8)
+        block_energy = energy.max(axis=0)
+        block_energy = block_energy / (block_energy.max() + 1e-8)
+        return orientation, block_energy.astype(np.float16)
+
+
+_GABOR_BANKS: Dict[Tuple, GaborFilterBank] = {}
+_GABOR_BANKS_LOCK = threading.Lock()
+
+
+def get_gabor_bank(orientations: int = DEFAULT_GABOR_ORIENTATIONS,
+                   wavelengths: Tuple[float, ...] = DEFAULT_GABOR_WAVELENGTHS) -> GaborFilterBank:
+    """
+    Return the process-wide Gabor bank for the given configuration, building it on first use
+    """
+    key = (int(orientations), tuple(float(w) for w in wavelengths))
+    with _GABOR_BANKS_LOCK:
+        bank = _GABOR_BANKS.get(key)
+        if bank is None:
+            bank = GaborFilterBank(*key)
+            _GABOR_BANKS[key] = bank
+        return bank
+
+
+def _ridge_orientation_similarity(orientation1: np.ndarray, energy1: np.ndarray,
+                                  orientations2: np.ndarray, energies2: np.ndarray, orientations: int) -> np.ndarray:
+    """
+    Energy-weighted agreement of block orientations between one print and a stack of prints.
+
+    orientation1/energy1 are flat per-block arrays; orientations2/energies2 are (N, blocks).
+    Blocks that are background in either print are ignored; rows with no usable blocks score 0.5.
+    """
+    energy1 = energy1.astype(np.float32)
+    energies2 = energies2.astype(np.float32)
+    diff = np.abs(orientations2.astype(np.int16) - orientation1.astype(np.int16))
+    diff = np.minimum(diff, orientations - diff)
+    agreement = 1.0 - diff / (orientations / 2.0)
+    weights = np.minimum(energies2, energy1)
+    weights = np.where((energies2 >= RIDGE_MIN_ENERGY) & (energy1 >= RIDGE_MIN_ENERGY), weights, 0.0)
+    total = weights.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        similarity = np.where(total > 0, (weights * agreement).sum(axis=1) / total, 0.5)
+    return similarity.astype(np.float64)
+
+
 class FingerprintVerifier:
-    def __init__(self, uploads_dir: str = "uploads"):
+    def __init__(self, uploads_dir: str = "uploads", lbp_method: str = 'default', lbp_radii: Tuple[int, ...] = (1,),
+                 use_feature_cache: bool = True, gabor_orientations: int = DEFAULT_GABOR_ORIENTATIONS,
+                 gabor_wavelengths: Tuple[float, ...] = DEFAULT_GABOR_WAVELENGTHS):
         self.uploads_dir = Path(uploads_dir)
-        self.min_match_score = 0.25  # Even lower threshold for easier matching
+        # On the weighted-average scale of compare_fingerprints; 0.75 accepts exactly what 0.25 did
+        # when the three original terms were summed and divided by three
+        self.min_match_score = 0.75
+        # LBP texture settings; the defaults reproduce the original 256-bin, radius-1 histogram
+        _lbp_mapping(lbp_method)
+        self.lbp_method = lbp_method
+        self.lbp_radii = tuple(int(r) for r in lbp_radii) or (1,)
+        if min(self.lbp_radii) < 1:
+            raise ValueError(f"LBP radii must be at least 1, got {', '.join(str(r) for r in self.lbp_radii)}")
+        # Shared, precomputed Gabor bank used for the ridge orientation descriptor
+        self.gabor_bank = get_gabor_bank(gabor_orientations, gabor_wavelengths)
+        # Reference features are extracted once and reused until the file changes
+        self.feature_store = None
+        if use_feature_cache:
+            self.feature_store = FingerprintFeatureStore(self.uploads_dir / '.fingerprint_cache',
+                                                         signature=self.feature_signature())
+
+    def feature_signature(self) -> str:
+        """
+        Describe the extraction settings so cached features are only reused when compatible
+        """
+        radii = ','.join(str(r) for r in self.lbp_radii)
+        wavelengths = ','.join(f"{w:g}" for w in self.gabor_bank.wavelengths)
+        return (f"lbp={self.lbp_method}:{radii};"
+                f"gabor={self.gabor_bank.orientations}x{wavelengths}:{RIDGE_BLOCK_SIZE}")
         
     def preprocess_fingerprint(self, image_path: str) -> Optional[np.ndarray]:
         """
@@ -85,16 +277,10 @@ class FingerprintVerifier:
             features = {}
             
             # 1. Ridge orientation analysis
-            # Apply Gabor filter to detect ridge patterns
-            angles = [0, 45, 90, 135]
-            gabor_responses = []
-            
-            for angle in angles:
-                kernel = cv2.getGaborKernel((21, 21), 8.0, np.radians(angle), 10.0, 0.5, 0, ktype=cv2.CV_32F)
-                response = cv2.filter2D(image, cv2.CV_8UC3, kernel)
-                gabor_responses.append(response)
-            
-            features['gabor_responses'] = gabor_responses
+            # Batched Gabor filtering reduced to a per-block dominant orientation and energy
+            orientation, energy = self.gabor_bank.ridge_descriptor(image)
+            features['ridge_orientation'] = orientation
+            features['ridge_energy'] = energy
             
             # 2. Minutiae points (simplified)
             # Find corners using Harris corner detection
@@ -110,8 +296,7 @@ class FingerprintVerifier:
             features['ridge_density'] = ridge_density
             
             # 4. Local Binary Pattern (LBP) for texture analysis
-            lbp = self._compute_lbp(image)
-            features['lbp_histogram'] = np.histogram(lbp, bins=256, range=(0, 256))[0].tolist()
+            features['lbp_histogram'] = self._compute_lbp_histogram(image).tolist()
             
             return features
             
@@ -119,37 +304,52 @@ class FingerprintVerifier:
             logger.error(f"Error extracting features: {e}")
             return {}
     
-    def _compute_lbp(self, image: np.ndarray) -> np.ndarray:
+    def _compute_lbp(self, image: np.ndarray, radius: int = 1) -> np.ndarray:
         """
-        Compute Local Binary Pattern
+        Compute Local Binary Pattern codes for the whole image at once.
+
+        Each of the 8 neighbours (at distance ``radius``) is compared against the
+        centre pixel using shifted array slices, so the result is identical to a
+        per-pixel loop. Border pixels that have no full neighbourhood stay 0.
         """
         lbp = np.zeros_like(image)
-        for i in range(1, image.shape[0] - 1):
-            for j in range(1, image.shape[1] - 1):
-                center = image[i, j]
-                code = 0
-                # 8-neighbor comparison
-                neighbors = [
-                    image[i-1, j-1], image[i-1, j], image[i-1, j+1],
-                    image[i, j+1], image[i+1, j+1], image[i+1, j],
-                    image[i+1, j-1], image[i, j-1]
-                ]
-                for k, neighbor in enumerate(neighbors):
-                    if neighbor >= center:
-                        code |= (1 << k)
-                lbp[i, j] = code
+        height, width = image.shape[:2]
+        if height <= 2 * radius or width <= 2 * radius:
+            return lbp
+        center = image[radius:height - radius, radius:width - radius]
+        codes = np.zeros(center.shape, dtype=np.uint8)
+        for bit, (dy, dx) in enumerate(LBP_NEIGHBOR_OFFSETS):
+            y0 = radius + dy * radius
+            x0 = radius + dx * radius
+            neighbor = image[y0:y0 + center.shape[0], x0:x0 + center.shape[1]]
+            codes |= (neighbor >= center).astype(np.uint8) << bit
+        lbp[radius:height - radius, radius:width - radius] = codes
         return lbp
+
+    def _compute_lbp_histogram(self, image: np.ndarray) -> np.ndarray:
+        """
+        Histogram of LBP codes for the configured method, concatenated over all radii
+        """
+        table, bins = _lbp_mapping(self.lbp_method)
+        histograms = []
+        for radius in self.lbp_radii:
+            codes = self._compute_lbp(image, radius)
+            if table is not None:
+                codes = table[codes]
+            histograms.append(np.bincount(codes.ravel(), minlength=bins))
+        return np.concatenate(histograms)
     
     def compare_fingerprints(self, features1: Dict, features2: Dict) -> float:
         """
-        Compare two fingerprint feature sets and return similarity score
+        Compare two fingerprint feature sets and return a similarity score in [0, 1]: the
+        COMPARISON_WEIGHTS-weighted average of the terms both feature sets support
         """
         try:
             score = 0.0
-            comparisons = 0
+            applied = 0.0
             weights = {}
             
-            # 1. Compare LBP histograms (40% weight)
+            # 1. Compare LBP histograms
             if 'lbp_histogram' in features1 and 'lbp_histogram' in features2:
                 hist1 = np.array(features1['lbp_histogram'])
                 hist2 = np.array(features2['lbp_histogram'])
@@ -176,13 +376,13 @@ class FingerprintVerifier:
                 
                 # Use the best of the three measures
                 lbp_score = max(correlation_score, cosine_score, chi_square_score)
-                score += lbp_score * 0.4
-                comparisons += 1
+                score += lbp_score * COMPARISON_WEIGHTS['lbp']
+                applied += COMPARISON_WEIGHTS['lbp']
                 weights['lbp'] = lbp_score
                 
                 logger.info(f"LBP comparison - Correlation: {correlation_score:.3f}, Cosine: {cosine_score:.3f}, Chi-square: {chi_square_score:.3f}, Best: {lbp_score:.3f}")
             
-            # 2. Compare ridge density (30% weight)
+            # 2. Compare ridge density
             if 'ridge_density' in features1 and 'ridge_density' in features2:
                 density1 = features1['ridge_density']
                 density2 = features2['ridge_density']
@@ -190,13 +390,13 @@ class FingerprintVerifier:
                 
                 # More lenient normalization
                 density_similarity = max(0, 1 - density_diff / 0.2)  # Increased tolerance
-                score += density_similarity * 0.3
-                comparisons += 1
+                score += density_similarity * COMPARISON_WEIGHTS['density']
+                applied += COMPARISON_WEIGHTS['density']
                 weights['density'] = density_similarity
                 
                 logger.info(f"Ridge density comparison - D1: {density1:.3f}, D2: {density2:.3f}, Diff: {density_diff:.3f}, Similarity: {density_similarity:.3f}")
             
-            # 3. Compare corner point distributions (30% weight)
+            # 3. Compare corner point distributions
             if 'corner_points' in features1 and 'corner_points' in features2:
                 points1 = features1['corner_points']
                 points2 = features2['corner_points']
@@ -204,9 +404,9 @@ class FingerprintVerifier:
                 if len(points1) > 0 and len(points2) > 0:
                     # Calculate average distance between points
                     distances = []
-                    for p1 in points1[:min(10, len(points1))]:  # Limit to first 10 points
+                    for p1 in points1[:CORNER_POINTS_COMPARED]:  # Limit to first 10 points
                         min_dist = float('inf')
-                        for p2 in points2[:min(10, len(points2))]:
+                        for p2 in points2[:CORNER_POINTS_COMPARED]:
                             dist = np.sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)
                             min_dist = min(min_dist, dist)
                         distances.append(min_dist)
@@ -215,22 +415,38 @@ class FingerprintVerifier:
                         avg_distance = np.mean(distances)
                         # More lenient normalization
                         point_similarity = max(0, 1 - avg_distance / 100)  # Increased tolerance
-                        score += point_similarity * 0.3
-                        comparisons += 1
+                        score += point_similarity * COMPARISON_WEIGHTS['points']
+                        applied += COMPARISON_WEIGHTS['points']
                         weights['points'] = point_similarity
                         
                         logger.info(f"Corner points comparison - Avg distance: {avg_distance:.1f}, Similarity: {point_similarity:.3f}")
                 else:
                     # If no corner points found, give a neutral score
                     point_similarity = 0.5
-                    score += point_similarity * 0.3
-                    comparisons += 1
+                    score += point_similarity * COMPARISON_WEIGHTS['points']
+                    applied += COMPARISON_WEIGHTS['points']
                     weights['points'] = point_similarity
                     logger.info(f"No corner points found, using neutral score: {point_similarity}")
             
+            # 4. Compare ridge orientation fields
+            if 'ridge_orientation' in features1 and 'ridge_orientation' in features2:
+                orientation1 = np.asarray(features1['ridge_orientation']).reshape(-1)
+                orientation2 = np.asarray(features2['ridge_orientation']).reshape(-1)
+                if orientation1.shape == orientation2.shape:
+                    ridge_similarity = float(_ridge_orientation_similarity(
+                        orientation1, np.asarray(features1['ridge_energy']).reshape(-1),
+                        orientation2[None, :], np.asarray(features2['ridge_energy']).reshape(1, -1),
+                        self.gabor_bank.orientations
+                    )[0])
+                    score += ridge_similarity * COMPARISON_WEIGHTS['ridge']
+                    applied += COMPARISON_WEIGHTS['ridge']
+                    weights['ridge'] = ridge_similarity
+                    
+                    logger.info(f"Ridge orientation comparison - Similarity: {ridge_similarity:.3f}")
+            
             # Return weighted average score
-            if comparisons > 0:
-                final_score = float(score / comparisons)
+            if applied > 0:
+                final_score = float(score / applied)
                 logger.info(f"Final comparison scores: {str(weights)}")
                 logger.info(f"Final weighted score: {final_score:.3f}")
                 return final_score
@@ -242,14 +458,139 @@ class FingerprintVerifier:
             logger.error(f"Error comparing fingerprints: {e}")
             return 0.0
     
-    def verify_fingerprint(self, captured_image_path: str, student_id: str) -> Dict:
+    def stack_reference_features(self, features_list: List[Dict]) -> Dict[str, np.ndarray]:
+        """
+        Stack reference feature sets into matrices for compare_fingerprints_batch
+        """
+        count = len(features_list)
+        hists = np.array([np.asarray(f['lbp_histogram'], dtype=np.float64) for f in features_list], dtype=np.float64)
+        hists = hists.reshape(count, -1)
+        hists = hists / (np.sum(hists, axis=1, keepdims=True) + 1e-8)
+        densities = np.array([float(f['ridge_density']) for f in features_list], dtype=np.float64)
+        # Only the first CORNER_POINTS_COMPARED points take part in the comparison
+        corners = np.zeros((count, CORNER_POINTS_COMPARED, 2), dtype=np.float64)
+        corner_counts = np.zeros(count, dtype=np.int64)
+        for i, f in enumerate(features_list):
+            points = np.asarray(f['corner_points'], dtype=np.float64).reshape(-1, 2)[:CORNER_POINTS_COMPARED]
+            corners[i, :len(points)] = points
+            corner_counts[i] = len(points)
+        return {
+            'lbp_histogram': hists,
+            'ridge_density': densities,
+            'corner_points': corners,
+            'corner_counts': corner_counts,
+            'ridge_orientation': np.stack([np.asarray(f['ridge_orientation'], dtype=np.uint8).reshape(-1)
+                                           for f in features_list]),
+            'ridge_energy': np.stack([np.asarray(f['ridge_energy'], dtype=np.float16).reshape(-1)
+                                      for f in features_list]),
+        }
+
+    def compare_fingerprints_batch(self, features: Dict, references: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        Score one probe feature set against a stack of references at once.
+
+        ``references`` comes from stack_reference_features, whose feature sets always have
+        all four terms. Returns one score per reference, equal to
+        compare_fingerprints(features, reference) for each row.
+        """
+        hists = references['lbp_histogram']
+        count = hists.shape[0]
+        if count == 0:
+            return np.zeros(0, dtype=np.float64)
+        
+        # 1. LBP histograms: correlation, cosine and chi-square for every row
+        probe = np.asarray(features['lbp_histogram'], dtype=np.float64)
+        probe = probe / (np.sum(probe) + 1e-8)
+        hists_centered = hists - hists.mean(axis=1, keepdims=True)
+        probe_centered = probe - probe.mean()
+        denom = np.sqrt(np.sum(hists_centered ** 2, axis=1) * np.sum(probe_centered ** 2))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            correlation = np.where(denom > 0, (hists_centered @ probe_centered) / denom, 0.0)
+        correlation_score = np.maximum(0.0, np.clip(correlation, -1.0, 1.0))
+        cosine_score = np.maximum(0.0, (hists @ probe) / (np.linalg.norm(hists, axis=1) * np.linalg.norm(probe) + 1e-8))
+        chi_square = np.sum((hists - probe) ** 2 / (hists + probe + 1e-8), axis=1)
+        chi_square_score = np.maximum(0.0, 1 - chi_square / 100)
+        lbp_score = np.maximum(np.maximum(correlation_score, cosine_score), chi_square_score)
+        
+        # 2. Ridge density
+        density_diff = np.abs(references['ridge_density'] - float(features['ridge_density']))
+        density_similarity = np.maximum(0.0, 1 - density_diff / 0.2)
+        
+        # 3. Corner points: mean nearest-neighbour distance over the first points
+        probe_points = np.asarray(features['corner_points'], dtype=np.float64).reshape(-1, 2)[:CORNER_POINTS_COMPARED]
+        corner_counts = references['corner_counts']
+        point_similarity = np.full(count, 0.5)
+        has_points = corner_counts > 0
+        if len(probe_points) > 0 and np.any(has_points):
+            diffs = probe_points[None, :, None, :] - references['corner_points'][:, None, :, :]
+            distances = np.sqrt(np.sum(diffs ** 2, axis=-1))
+            valid = np.arange(CORNER_POINTS_COMPARED)[None, :] < corner_counts[:, None]
+            distances = np.where(valid[:, None, :], distances, np.inf)
+            avg_distance = distances.min(axis=2).mean(axis=1)
+            point_similarity = np.where(has_points, np.maximum(0.0, 1 - avg_distance / 100), 0.5)
+        
+        # 4. Ridge orientation fields
+        ridge_similarity = _ridge_orientation_similarity(
+            np.asarray(features['ridge_orientation']).reshape(-1), np.asarray(features['ridge_energy']).reshape(-1),
+            references['ridge_orientation'], references['ridge_energy'], self.gabor_bank.orientations
+        )
+        
+        # Same weighted average as compare_fingerprints
+        w = COMPARISON_WEIGHTS
+        return (lbp_score * w['lbp'] + density_similarity * w['density'] + point_similarity * w['points']
+                + ridge_similarity * w['ridge']) / sum(w.values())
+
+    def get_reference_features(self, reference_path) -> Optional[Dict]:
         """
-        Verify captured fingerprint against stored reference
+        Return features for a stored reference, using the feature cache when it is still valid
+        """
+        if self.feature_store is not None:
+            cached = self.feature_store.get(reference_path)
+            if cached is not None:
+                return cached
+        processed = self.preprocess_fingerprint(str(reference_path))
+        if processed is None:
+            return None
+        features = self.extract_features(processed)
+        if not features:
+            return None
+        if self.feature_store is not None:
+            self.feature_store.put(reference_path, features)
+        return features
+
+    def enroll_reference(self, reference_path: str) -> Dict:
+        """
+        Extract and cache features for a newly stored reference fingerprint
+        """
+        if not os.path.exists(reference_path):
+            return {
+                'success': False,
+                'message': f'Reference fingerprint not found: {reference_path}'
+            }
+        if self.feature_store is not None:
+            self.feature_store.invalidate(reference_path)
+        features = self.get_reference_features(reference_path)
+        if features is None:
+            return {
+                'success': False,
+                'message': 'Failed to extract features from reference fingerprint'
+            }
+        return {
+            'success': True,
+            'message': 'Reference fingerprint enrolled',
+            'reference': str(reference_path),
+            'cached': self.feature_store is not None
+        }
+    
+    def verify_fingerprint(self, captured_image_path: str, student_id: str, timings=None) -> Dict:
+        """
+        Verify captured fingerprint against stored reference (timings: an optional timing.Timings)
         """
         try:
             # Find reference fingerprint for student
             reference_pattern = f"fingerprint_{student_id}_*.png"
-            reference_files = list(self.uploads_dir.glob(reference_pattern))
+            with timing.span(timings, 'find_references'):
+                reference_files = list(self.uploads_dir.glob(reference_pattern))
             
             logger.info(f"Looking for pattern: {reference_pattern}")
             logger.info(f"Found {len(reference_files)} reference files")
@@ -265,7 +606,8 @@ class FingerprintVerifier:
                 }
             
             # Preprocess captured image
-            captured_processed = self.preprocess_fingerprint(captured_image_path)
+            with timing.span(timings, 'preprocess'):
+                captured_processed = self.preprocess_fingerprint(captured_image_path)
             if captured_processed is None:
                 return {
                     'success': False,
@@ -275,7 +617,8 @@ class FingerprintVerifier:
                 }
             
             # Extract features from captured image
-            captured_features = self.extract_features(captured_processed)
+            with timing.span(timings, 'extract'):
+                captured_features = self.extract_features(captured_processed)
             if not captured_features:
                 return {
                     'success': False,
@@ -289,18 +632,15 @@ class FingerprintVerifier:
             best_reference = None
             
             for reference_file in reference_files:
-                # Preprocess reference image
-                reference_processed = self.preprocess_fingerprint(str(reference_file))
-                if reference_processed is None:
-                    continue
-                
-                # Extract features from reference image
-                reference_features = self.extract_features(reference_processed)
+                # Reference features come from the cache unless the file is new or changed
+                with timing.span(timings, 'load_references'):
+                    reference_features = self.get_reference_features(reference_file)
                 if not reference_features:
                     continue
                 
                 # Compare fingerprints
-                score = self.compare_fingerprints(captured_features, reference_features)
+                with timing.span(timings, 'match'):
+                    score = self.compare_fingerprints(captured_features, reference_features)
                 
                 if score > best_score:
                     best_score = score
@@ -327,22 +667,199 @@ class FingerprintVerifier:
                 'is_valid': False
             }
 
+    def find_reference_files(self, student_ids: List[str]) -> Dict[str, List[Path]]:
+        """
+        Map each student ID to its fingerprint_{student_id}_*.png references using one directory scan
+        """
+        wanted = set(student_ids)
+        references: Dict[str, List[Path]] = {sid: [] for sid in student_ids}
+        if not self.uploads_dir.exists():
+            return references
+        for entry in sorted(os.listdir(self.uploads_dir)):
+            if entry.endswith('.png'):
+                for sid in self.reference_owners(entry, wanted):
+                    references[sid].append(self.uploads_dir / entry)
+        return references
+
+    @staticmethod
+    def reference_owners(file_name: str, student_ids) -> List[str]:
+        """
+        The student IDs among student_ids whose fingerprint_{student_id}_* pattern matches file_name.
+        Names are fingerprint_<student_id>_<full name>, and both parts may contain '_', so the
+        ID can only be told apart from the name by checking it against known candidates.
+        """
+        prefix = 'fingerprint_'
+        if not file_name.startswith(prefix):
+            return []
+        rest = os.path.splitext(file_name)[0][len(prefix):]
+        # Same semantics as the glob: any "<student_id>_" prefix of the remainder
+        return [rest[:pos] for pos, char in enumerate(rest) if char == '_' and rest[:pos] in student_ids]
+
+    def identify_fingerprint(self, captured_image_path: str, student_ids: Optional[List[str]] = None,
+                             reference_paths: Optional[List[str]] = None, top_k: int = 5, timings=None) -> Dict:
+        """
+        Identify a captured fingerprint among many candidates (1:N) in a single pass.
+
+        Candidates are given as student IDs (references found by filename) and/or explicit
+        reference paths as "student_id=path", or as plain paths named for one of the given
+        student IDs (matched like find_reference_files; others are skipped). The captured print is
+        extracted once; reference features come from the feature cache. timings is an optional
+        timing.Timings.
+        """
+        try:
+            candidates: List[Tuple[str, Path]] = []
+            if student_ids:
+                with timing.span(timings, 'find_references'):
+                    references = self.find_reference_files(student_ids)
+                for sid, files in references.items():
+                    candidates.extend((sid, f) for f in files)
+            for ref in reference_paths or []:
+                if '=' in ref and not os.path.exists(ref):
+                    sid, path = ref.split('=', 1)
+                    candidates.append((sid, Path(path)))
+                    continue
+                owners = self.reference_owners(os.path.basename(ref), set(student_ids or []))
+                if not owners:
+                    logger.warning(f"Skipping reference {ref}: pass it as student_id=path or list its student ID")
+                candidates.extend((sid, Path(ref)) for sid in owners)
+            
+            logger.info(f"Identifying against {len(candidates)} reference files")
+            
+            if not candidates:
+                return {
+                    'success': False,
+                    'message': 'No reference fingerprints found for the given candidates',
+                    'matches': [],
+                    'best_match': None,
+                    'candidates': 0
+                }
+            
+            with timing.span(timings, 'preprocess'):
+                captured_processed = self.preprocess_fingerprint(captured_image_path)
+            if captured_processed is None:
+                return {
+                    'success': False,
+                    'message': 'Failed to process captured fingerprint',
+                    'matches': [],
+                    'best_match': None,
+                    'candidates': len(candidates)
+                }
+            with timing.span(timings, 'extract'):
+                captured_features = self.extract_features(captured_processed)
+            if not captured_features:
+                return {
+                    'success': False,
+                    'message': 'Failed to extract features from captured fingerprint',
+                    'matches': [],
+                    'best_match': None,
+                    'candidates': len(candidates)
+                }
+            
+            # Score every reference in one vectorized pass, then keep the best one per student
+            scored: List[Tuple[str, str]] = []
+            reference_features: List[Dict] = []
+            with timing.span(timings, 'load_references'):
+                for sid, reference_file in candidates:
+                    features = self.get_reference_features(reference_file)
+                    if features:
+                        scored.append((sid, str(reference_file)))
+                        reference_features.append(features)
+            best_per_student: Dict[str, Tuple[float, str]] = {}
+            if reference_features:
+                with timing.span(timings, 'match'):
+                    scores = self.compare_fingerprints_batch(captured_features,
+                                                             self.stack_reference_features(reference_features))
+                for (sid, reference), score in zip(scored, scores):
+                    if sid not in best_per_student or score > best_per_student[sid][0]:
+                        best_per_student[sid] = (float(score), reference)
+            
+            ranked = sorted(best_per_student.items(), key=lambda item: item[1][0], reverse=True)
+            matches = [
+                {
+                    'student_id': sid,
+                    'match_score': float(score),
+                    'is_valid': bool(score >= self.min_match_score),
+                    'reference': reference
+                }
+                for sid, (score, reference) in ranked[:max(1, top_k)]
+            ]
+            best_match = matches[0] if matches and matches[0]['is_valid'] else None
+            
+            return {
+                'success': True,
+                'message': 'Fingerprint identification completed',
+                'matches': matches,
+                'best_match': best_match,
+                'candidates': len(best_per_student),
+                'threshold': float(self.min_match_score)
+            }
+            
+        except Exception as e:
+            logger.error(f"Error in fingerprint identification: {e}")
+            return {
+                'success': False,
+                'message': f'Identification error: {str(e)}',
+                'matches': [],
+                'best_match': None
+            }
+
 def main():
     parser = argparse.ArgumentParser(description='Fingerprint Verification System')
-    parser.add_argument('--captured', required=True, help='Path to captured fingerprint image')
-    parser.add_argument('--student-id', required=True, help='Student ID to verify against')
+    parser.add_argument('--captured', help='Path to captured fingerprint image')
+    parser.add_argument('--student-id', help='Student ID to verify against')
+    parser.add_argument('--enroll', help='Path to a newly stored reference fingerprint to extract and cache')
+    parser.add_argument('--identify', action='store_true', help='Identify the captured fingerprint among many candidates (1:N)')
+    parser.add_argument('--student-ids', default='', help='Comma-separated candidate student IDs for --identify')
+    parser.add_argument('--student-ids-file', help='File with candidate student IDs for --identify (one per line)')
+    parser.add_argument('--references', nargs='*', default=[], help='Candidate reference paths for --identify (student_id=path, or a path named for one of --student-ids)')
+    parser.add_argument('--top-k', type=int, default=5, help='Number of ranked matches returned by --identify')
     parser.add_argument('--uploads-dir', default='uploads', help='Directory containing reference fingerprints')
     parser.add_argument('--output', help='Output file for results (JSON)')
+    parser.add_argument('--lbp-method', default='default', choices=LBP_METHODS, help='LBP variant used for texture histograms')
+    parser.add_argument('--lbp-radii', default='1', help='Comma-separated LBP radii (multi-radius histograms are concatenated)')
+    parser.add_argument('--no-cache', action='store_true', help='Do not read or write the reference feature cache')
+    parser.add_argument('--gabor-orientations', type=int, default=DEFAULT_GABOR_ORIENTATIONS, help='Number of Gabor filter orientations')
+    parser.add_argument('--gabor-wavelengths', default=','.join(f"{w:g}" for w in DEFAULT_GABOR_WAVELENGTHS),
+                        help='Comma-separated Gabor wavelengths in pixels')
+    timing.add_timing_argument(parser)
     
     args = parser.parse_args()
+    timings = timing.Timings('fingerprint_verification', enabled=args.timings)
+    if args.identify:
+        if not args.captured:
+            parser.error('--captured is required with --identify')
+    elif not args.enroll and not (args.captured and args.student_id):
+        parser.error('--captured and --student-id are required unless --enroll or --identify is given')
     
     # Initialize verifier
-    verifier = FingerprintVerifier(args.uploads_dir)
+    try:
+        lbp_radii = tuple(int(r) for r in args.lbp_radii.split(',') if r.strip())
+        gabor_wavelengths = tuple(float(w) for w in args.gabor_wavelengths.split(',') if w.strip())
+        with timings.span('setup'):
+            verifier = FingerprintVerifier(args.uploads_dir, lbp_method=args.lbp_method, lbp_radii=lbp_radii,
+                                           use_feature_cache=not args.no_cache,
+                                           gabor_orientations=args.gabor_orientations,
+                                           gabor_wavelengths=gabor_wavelengths)
+    except ValueError as e:
+        parser.error(str(e))
     
-    # Perform verification
-    result = verifier.verify_fingerprint(args.captured, args.student_id)
+    # Perform enrollment, identification or verification
+    if args.enroll:
+        with timings.span('enroll'):
+            result = verifier.enroll_reference(args.enroll)
+    elif args.identify:
+        student_ids = [sid.strip() for sid in args.student_ids.split(',') if sid.strip()]
+        if args.student_ids_file:
+            with open(args.student_ids_file, 'r', encoding='utf-8') as f:
+                student_ids.extend(line.strip() for line in f if line.strip())
+        result = verifier.identify_fingerprint(args.captured, student_ids=student_ids,
+                                               reference_paths=args.references, top_k=args.top_k,
+                                               timings=timings)
+    else:
+        result = verifier.verify_fingerprint(args.captured, args.student_id, timings=timings)
     
     # Output results
+    timings.attach(result)
     if args.output:
         with open(args.output, 'w') as f:
             json.dump(result, f, indent=2, cls=NumpyEncoder)
@@ -8,25 +8,25 @@ import argparse
 import json
 import os
 import sys
-import sqlite3
 import time
 from datetime import datetime
-import cv2
-import numpy as np
 
 # Ensure we can import project modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# Imported before cv2 and the detectors so --timings includes their import time
+import timing  # type: ignore
+import cv2
+import numpy as np
+
+import database  # type: ignore
+from frame_io import parse_shape, read_stdin_frame  # type: ignore
+from person_detection import add_detector_arguments, create_person_detector, detector_options_from_args  # type: ignore
+
 def connect_database(db_path="data/app.sqlite"):
-    """Connect to SQLite database"""
+    """Connect to SQLite database (WAL, tuned busy timeout; see database.py)"""
     try:
-        # Ensure database directory exists
-        db_dir = os.path.dirname(db_path)
-        if db_dir and not os.path.exists(db_dir):
-            os.makedirs(db_dir, exist_ok=True)
-        
-        conn = sqlite3.connect(db_path, timeout=10.0)
-        conn.row_factory = sqlite3.Row
+        conn = database.connect(db_path)
         
         # Test the connection
         cursor = conn.cursor()
@@ -41,75 +41,24 @@ def connect_database(db_path="data/app.sqlite"):
 def get_next_queued_graduate(conn):
     """Get the next graduate from the queue"""
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, full_name, student_id, program 
-            FROM graduates 
-            WHERE queued_at IS NOT NULL AND announced_at IS NULL 
-            ORDER BY queued_at ASC 
-            LIMIT 1
-        """)
-        result = cursor.fetchone()
-        return dict(result) if result else None
+        return database.next_queued_graduate(conn)
     except Exception as e:
         print(f"Database query error: {e}", file=sys.stderr)
         return None
 
 def announce_graduate(conn, graduate_id):
-    """Mark a graduate as announced"""
+    """Mark a graduate as announced (one transaction; False if already announced)"""
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE graduates 
-            SET announced_at = datetime('now') 
-            WHERE id = ?
-        """, (graduate_id,))
-        
-        cursor.execute("""
-            UPDATE current_announcement 
-            SET graduate_id = ?, updated_at = datetime('now') 
-            WHERE id = 1
-        """, (graduate_id,))
-        
-        conn.commit()
-        return True
+        return database.announce_graduate(conn, graduate_id)
     except Exception as e:
         print(f"Announcement error: {e}", file=sys.stderr)
-        conn.rollback()
         return False
 
-def detect_people_in_frame(frame):
-    """Detect people in the frame using HOG detector"""
+def detect_people_in_frame(frame, detector=None):
+    """Detect people in the frame with a person_detection backend (HOG by default)"""
     try:
-        # Convert to grayscale for better detection
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Create HOG detector
-        person_detector = cv2.HOGDescriptor()
-        person_detector.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
-        
-        # Detect people
-        boxes, weights = person_detector.detectMultiScale(
-            gray, 
-            winStride=(8, 8),
-            padding=(4, 4),
-            scale=1.05
-        )
-        
-        people = []
-        for i, (x, y, w, h) in enumerate(boxes):
-            if i < len(weights) and weights[i] > 0.3:  # Confidence threshold
-                center_x = x + w // 2
-                center_y = y + h // 2
-                people.append({
-                    'x': center_x,
-                    'y': center_y,
-                    'width': w,
-                    'height': h,
-                    'confidence': float(weights[i])
-                })
-        
-        return people
+        detector = detector or create_person_detector('hog')
+        return detector.detect(frame)
     except Exception as e:
         print(f"Person detection error: {e}", file=sys.stderr)
         return []
@@ -141,11 +90,11 @@ def analyze_movement_pattern(people, frame_width=960):
         print(f"Movement analysis error: {e}", file=sys.stderr)
         return None
 
-def process_stage_detection(image_path, db_path="data/app.sqlite"):
-    """Main function to process stage detection"""
-    result = {
+def empty_result(message=''):
+    """Result skeleton shared by the CLI and the stage service"""
+    return {
         'success': False,
-        'message': '',
+        'message': message,
         'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
         'detection': {
             'people_detected': 0,
@@ -154,22 +103,31 @@ def process_stage_detection(image_path, db_path="data/app.sqlite"):
             'graduate_announced': False
         }
     }
+
+def process_stage_detection(image_path=None, db_path="data/app.sqlite", detector=None, frame=None, timings=None):
+    """Main function to process stage detection (on image_path, or on an already decoded frame; timings: a timing.Timings)"""
+    result = empty_result()
     
     try:
-        # Check if image exists
-        if not os.path.exists(image_path):
-            result['message'] = f"Image not found: {image_path}"
-            return result
-        
-        # Read the image
-        frame = cv2.imread(image_path)
         if frame is None:
-            result['message'] = 'Failed to read image'
-            return result
+            # Check if image exists
+            if not image_path or not os.path.exists(image_path):
+                result['message'] = f"Image not found: {image_path}"
+                return result
+            
+            # Read the image
+            with timing.span(timings, 'read_image'):
+                frame = cv2.imread(image_path)
+            if frame is None:
+                result['message'] = 'Failed to read image'
+                return result
         
         # Detect people
-        people = detect_people_in_frame(frame)
+        with timing.span(timings, 'detect'):
+            people = detect_people_in_frame(frame, detector)
         result['detection']['people_detected'] = len(people)
+        if detector is not None:
+            result['detection']['detector'] = detector.latency_report()
         
         # Analyze movement
         movement = analyze_movement_pattern(people, frame.shape[1])
@@ -181,27 +139,28 @@ def process_stage_detection(image_path, db_path="data/app.sqlite"):
                 result['detection']['ready_for_announcement'] = True
         
         # Connect to database
-        conn = connect_database(db_path)
-        if not conn:
-            result['message'] = 'Failed to connect to database'
-            return result
-        
-        # Check if we should announce a graduate
-        if result['detection']['ready_for_announcement']:
-            next_graduate = get_next_queued_graduate(conn)
-            if next_graduate:
-                if announce_graduate(conn, next_graduate['id']):
-                    result['detection']['graduate_announced'] = True
-                    result['detection']['announced_graduate'] = next_graduate
-                    result['message'] = f"Graduate announced: {next_graduate['full_name']}"
+        with timing.span(timings, 'database'):
+            conn = connect_database(db_path)
+            if not conn:
+                result['message'] = 'Failed to connect to database'
+                return result
+            
+            # Check if we should announce a graduate
+            if result['detection']['ready_for_announcement']:
+                next_graduate = get_next_queued_graduate(conn)
+                if next_graduate:
+                    if announce_graduate(conn, next_graduate['id']):
+                        result['detection']['graduate_announced'] = True
+                        result['detection']['announced_graduate'] = next_graduate
+                        result['message'] = f"Graduate announced: {next_graduate['full_name']}"
+                    else:
+                        result['message'] = 'Failed to announce graduate'
                 else:
-                    result['message'] = 'Failed to announce graduate'
+                    result['message'] = 'No graduates in queue to announce'
             else:
-                result['message'] = 'No graduates in queue to announce'
-        else:
-            result['message'] = 'Stage detection completed'
-        
-        conn.close()
+                result['message'] = 'Stage detection completed'
+            
+            database.release(db_path)
         result['success'] = True
         
     except Exception as e:
@@ -213,21 +172,49 @@ def process_stage_detection(image_path, db_path="data/app.sqlite"):
 def main():
     """Main CLI function"""
     parser = argparse.ArgumentParser(description='Stage Detection CLI Tool')
-    parser.add_argument('--image_path', required=True, help='Path to captured image')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--image_path', help='Path to captured image')
+    source.add_argument('--stdin', action='store_true',
+                        help='Read the frame from stdin: encoded image bytes, or raw BGR pixels with --frame_shape')
+    parser.add_argument('--frame_shape', default=None,
+                        help='HEIGHTxWIDTH[xCHANNELS] of a raw pixel frame on stdin (e.g. 480x960x3)')
     parser.add_argument('--db_path', default='data/app.sqlite', help='Database path')
     parser.add_argument('--output_format', default='json', help='Output format (json)')
     parser.add_argument('--debug', action='store_true', help='Enable debug output')
+    add_detector_arguments(parser)
+    timing.add_timing_argument(parser)
     
     args = parser.parse_args()
+    timings = timing.Timings('stage_detection', enabled=args.timings)
+    
+    if args.frame_shape and not args.stdin:
+        parser.error('--frame_shape requires --stdin')
     
     if args.debug:
-        print(f"DEBUG: Processing image: {args.image_path}", file=sys.stderr)
+        print(f"DEBUG: Processing image: {args.image_path or 'stdin'}", file=sys.stderr)
         print(f"DEBUG: Database path: {args.db_path}", file=sys.stderr)
     
+    # Create the person detector; a missing dnn model falls back to HOG
+    with timings.span('load_detector'):
+        try:
+            detector = create_person_detector(args.detector, **detector_options_from_args(args))
+        except Exception as e:
+            print(f"Could not load {args.detector} person detector ({e}), falling back to HOG", file=sys.stderr)
+            detector = create_person_detector('hog', profile=args.profile, detection_width=args.detection_width)
+    
     # Process the detection
-    result = process_stage_detection(args.image_path, args.db_path)
+    if args.stdin:
+        try:
+            with timings.span('read_image'):
+                frame = read_stdin_frame(parse_shape(args.frame_shape) if args.frame_shape else None)
+            result = process_stage_detection(None, args.db_path, detector, frame=frame, timings=timings)
+        except ValueError as e:
+            result = empty_result(str(e))
+    else:
+        result = process_stage_detection(args.image_path, args.db_path, detector, timings=timings)
     
     # Output result
+    timings.attach(result)
     if args.output_format == 'json':
         print(json.dumps(result, indent=2))
     else:
@@ -236,6 +223,9 @@ def main():
         print(f"People detected: {result['detection']['people_detected']}")
         print(f"Zone: {result['detection']['movement_zone']}")
         print(f"Ready for announcement: {result['detection']['ready_for_announcement']}")
+        if 'timings' in result:
+            stages = ', '.join(f"{k} {v}" for k, v in result['timings']['stages_ms'].items())
+            print(f"Timings (ms): total {result['timings']['total_ms']}; {stages}")
     
     # Return appropriate exit code
     return 0 if result['success'] else 1
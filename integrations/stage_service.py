@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Stage Detection Service
+Long-lived HTTP service that keeps the person detector, database connection and person tracks
+warm between the frames the stage page posts.
+
+/process_frame returns the same JSON as stage_detection_cli.py, so PHP can call the service and
+fall back to the CLI. Unlike the CLI, it tracks people across frames and announces a graduate
+once per person, using StageDetector's sequencing.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+from flask import Flask, request, jsonify
+
+# Ensure we can import project modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frame_io import decode_frame, frame_from_raw, parse_shape  # type: ignore
+from person_detection import add_detector_arguments, detector_options_from_args  # type: ignore
+from stage_detection import StageDetector  # type: ignore
+from stage_detection_cli import empty_result  # type: ignore
+
+
+class StageService:
+    def __init__(self, db_path, detector_backend='hog', detector_options=None,
+                 sequence_window=10.0, max_track_distance=None, uploads_dir='uploads'):
+        self.db_path = db_path
+        self.uploads_dir = os.path.realpath(uploads_dir)
+        self.started_at = time.time()
+        self.frames = 0
+        self.frame_size = None
+        self.sequence_window = sequence_window
+        self.max_track_distance = max_track_distance
+        options = dict(detector_options or {})
+        self._detector_kwargs = {
+            'detection_profile': options.pop('profile', 'balanced') or 'balanced',
+            'detection_width': options.pop('detection_width', None),
+            'detector_backend': detector_backend,
+            'detector_options': options,
+        }
+        # StageDetector's SQLite connection belongs to one thread, so all frames run on this one
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='stage-service')
+        self.executor.submit(self._start).result()
+
+    def _start(self):
+        # The display page picks announcements up from the database, so no HTTP notification
+        self.detector = StageDetector(db_path=self.db_path, detection_workers=1, notify_display=False,
+                                      **self._detector_kwargs)
+        self.detector.sequence_window = self.sequence_window
+        if not self.detector.connect_database():
+            raise RuntimeError(f"Could not open database {self.db_path}")
+
+    def _configure(self, width, height):
+        self.detector.configure_zones(width, height)
+        # Frames arrive seconds apart, so people move further between them than between camera frames
+        self.detector.tracker.max_centroid_distance = self.max_track_distance or width / 4.0
+        self.frame_size = (width, height)
+
+    def _process(self, frame):
+        result = empty_result()
+        detector = self.detector
+        height, width = frame.shape[:2]
+        if self.frame_size != (width, height):
+            self._configure(width, height)
+
+        announced_before = detector.last_announcement
+        people = detector.detect_people(frame)
+        _, tracked, movement_result = detector.process_frame(frame, people, draw=False)
+        self.frames += 1
+
+        detection = result['detection']
+        detection['people_detected'] = len(people)
+        if tracked:
+            center_x = detector.center_zone[0] + detector.center_zone[2] // 2
+            closest = min(tracked, key=lambda p: abs(p['x'] - center_x))
+            detection['movement_zone'] = detector.zone_of(closest['x'])
+        detection['ready_for_announcement'] = movement_result == 'ready_for_announcement'
+        detection['sequence'] = movement_result
+        detection['tracks'] = tracked
+        detection['detector'] = detector.person_detector.latency_report()
+
+        if detector.last_announcement != announced_before and detector.last_announced_graduate:
+            graduate = dict(detector.last_announced_graduate)
+            detection['graduate_announced'] = True
+            detection['announced_graduate'] = graduate
+            result['message'] = f"Graduate announced: {graduate['full_name']}"
+        elif detection['ready_for_announcement'] and detector.get_next_queued_graduate() is None:
+            result['message'] = 'No graduates in queue to announce'
+        else:
+            result['message'] = 'Stage detection completed'
+        result['success'] = True
+        return result
+
+    def process(self, frame):
+        return self.executor.submit(self._process, frame).result()
+
+    def _reset(self):
+        detector = self.detector
+        detector.tracker.tracks = []
+        detector.ready_track_id = None
+        detector.last_announced_at = None
+        detector.last_announced_graduate = None
+        detector.graduate_queue.invalidate()
+        self.frame_size = None
+
+    def reset(self):
+        """Forget all tracked people and the cached queue (called by reset_queue on the stage API)"""
+        self.executor.submit(self._reset).result()
+
+    def stop(self):
+        self.executor.submit(self.detector.notifier.stop).result()
+        self.executor.shutdown(wait=True)
+
+
+app = Flask(__name__)
+service: StageService = None  # type: ignore
+
+
+def _request_data() -> dict:
+    data = request.get_json(silent=True)
+    if data is None:
+        data = request.form.to_dict()
+    return data or {}
+
+
+def _upload_path(path: str):
+    """Real path of path if it is inside the uploads directory, else None"""
+    if not path:
+        return None
+    real = os.path.realpath(path)
+    try:
+        inside = os.path.commonpath([real, service.uploads_dir]) == service.uploads_dir
+    except ValueError:
+        inside = False
+    return real if inside else None
+
+
+def _request_image():
+    """
+    Read the frame from the request, in order of preference:
+    - an image/* body (encoded bytes, e.g. image/jpeg)
+    - an application/octet-stream body of raw BGR pixels, shaped by ?shape= or X-Frame-Shape (HxW[xC])
+    - an uploaded file ('frame' or 'image')
+    - image_path in a JSON or form body
+    """
+    mimetype = request.mimetype or ''
+    try:
+        if mimetype.startswith('image/'):
+            return decode_frame(request.get_data(cache=False)), None
+        if mimetype == 'application/octet-stream':
+            shape = request.args.get('shape') or request.headers.get('X-Frame-Shape')
+            if not shape:
+                return None, 'Raw frames need a shape (?shape=HEIGHTxWIDTH[xCHANNELS])'
+            return frame_from_raw(request.get_data(cache=False), parse_shape(shape)), None
+        upload = request.files.get('frame') or request.files.get('image')
+        if upload is not None:
+            return decode_frame(upload.read()), None
+    except ValueError as e:
+        return None, str(e)
+    image_path = _request_data().get('image_path') or ''
+    if image_path and _upload_path(image_path) is None:
+        return None, 'Image path must be inside the uploads directory'
+    if not image_path or not os.path.exists(image_path):
+        return None, f"Image not found: {image_path}"
+    image = cv2.imread(image_path)
+    return image, None if image is not None else 'Failed to read image'
+
+
+@app.route('/health', methods=['GET'])
+def health():
+    detector = service.detector
+    return jsonify({
+        'status': 'ok',
+        'db_path': service.db_path,
+        'frames': service.frames,
+        'tracks': len(detector.tracker.tracks),
+        'detector': detector.person_detector.latency_report(),
+        'uptime_seconds': round(time.time() - service.started_at, 1)
+    })
+
+
+@app.route('/reset', methods=['POST'])
+def reset():
+    service.reset()
+    return jsonify({'success': True})
+
+
+@app.route('/process_frame', methods=['POST'])
+def process_frame():
+    image, error = _request_image()
+    if image is None:
+        return jsonify(empty_result(error))
+    result = empty_result()
+    try:
+        result = service.process(image)
+    except Exception as e:
+        result['message'] = f'Error processing stage detection: {str(e)}'
+        print(f"Stage detection error: {e}", file=sys.stderr)
+    return jsonify(result)
+
+
+def main():
+    global service
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    default_db = os.path.join(root, 'data', 'app.sqlite')
+    parser = argparse.ArgumentParser(description='Stage Detection Service')
+    parser.add_argument('--db_path', default=os.environ.get('STAGE_DB_PATH', default_db))
+    parser.add_argument('--uploads_dir', default=os.environ.get('STAGE_UPLOADS_DIR', os.path.join(root, 'uploads')),
+                        help='Directory image_path must be in')
+    parser.add_argument('--host', default=os.environ.get('STAGE_SERVICE_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('STAGE_SERVICE_PORT', '5113')))
+    parser.add_argument('--sequence_window', type=float, default=10.0,
+                        help='Seconds of zone history used for sequencing (frames arrive every ~2 s)')
+    parser.add_argument('--max_track_distance', type=float, default=None,
+                        help='Max pixels a person may move between frames and keep their track (default: width/4)')
+    add_detector_arguments(parser)
+    args = parser.parse_args()
+
+    service = StageService(args.db_path, detector_backend=args.detector,
+                           detector_options=detector_options_from_args(args),
+                           sequence_window=args.sequence_window, max_track_distance=args.max_track_distance,
+                           uploads_dir=args.uploads_dir)
+    print(f"Stage detection service ready on {args.host}:{args.port}", file=sys.stderr)
+    try:
+        app.run(host=args.host, port=args.port, debug=False, use_reloader=False, threaded=True)
+    finally:
+        service.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -18,6 +18,8 @@ function get_db(): PDO {
 
 function initialize_database(): void {
     $db = get_db();
+    // WAL (persistent) so stage detection writes do not block pages reading the announcement
+    $db->exec('PRAGMA journal_mode = WAL;');
     // Sessions table
     $db->exec(
         'CREATE TABLE IF NOT EXISTS sessions (
@@ -105,6 +107,9 @@ function initialize_database(): void {
     $db->exec('CREATE INDEX IF NOT EXISTS idx_reactions_graduate_id ON reactions(graduate_id)');
     $db->exec('CREATE INDEX IF NOT EXISTS idx_reactions_created_at ON reactions(created_at)');
     
+    // Stage detection reads the queue in queued_at order (see database.py)
+    $db->exec('CREATE INDEX IF NOT EXISTS idx_graduates_queue ON graduates(queued_at) WHERE queued_at IS NOT NULL AND announced_at IS NULL');
+    
     $db->exec(
         'CREATE TABLE IF NOT EXISTS current_announcement (
             id INTEGER PRIMARY KEY CHECK (id = 1),
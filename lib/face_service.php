@@ -0,0 +1,26 @@
+<?php
+declare(strict_types=1);
+
+/**
+ * Send a request to the resident face recognition service (integrations/face_service.py).
+ * Returns the decoded JSON result, or null when the service is not running so callers
+ * can fall back to spawning the CLI scripts.
+ */
+function face_service_request(string $endpoint, array $payload, float $timeout = 10.0): ?array {
+    $baseUrl = getenv('FACE_SERVICE_URL') ?: 'http://127.0.0.1:5112';
+    $context = stream_context_create([
+        'http' => [
+            'method' => 'POST',
+            'header' => "Content-Type: application/json\r\n",
+            'content' => json_encode($payload),
+            'timeout' => $timeout,
+            'ignore_errors' => true,
+        ],
+    ]);
+    $body = @file_get_contents(rtrim($baseUrl, '/') . $endpoint, false, $context);
+    if ($body === false) {
+        return null;
+    }
+    $decoded = json_decode($body, true);
+    return is_array($decoded) ? $decoded : null;
+}
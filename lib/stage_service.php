@@ -0,0 +1,49 @@
+<?php
+declare(strict_types=1);
+
+/**
+ * Send a request to the resident stage detection service (integrations/stage_service.py).
+ * Returns the decoded JSON result, or null when the service is not running so callers
+ * can fall back to spawning stage_detection_cli.py.
+ */
+function stage_service_request(string $endpoint, array $payload, float $timeout = 10.0): ?array {
+    $baseUrl = getenv('STAGE_SERVICE_URL') ?: 'http://127.0.0.1:5113';
+    $context = stream_context_create([
+        'http' => [
+            'method' => 'POST',
+            'header' => "Content-Type: application/json\r\n",
+            'content' => json_encode($payload),
+            'timeout' => $timeout,
+            'ignore_errors' => true,
+        ],
+    ]);
+    $body = @file_get_contents(rtrim($baseUrl, '/') . $endpoint, false, $context);
+    if ($body === false) {
+        return null;
+    }
+    $decoded = json_decode($body, true);
+    return is_array($decoded) ? $decoded : null;
+}
+
+/**
+ * Post an encoded frame (e.g. JPEG bytes) as the request body of /process_frame, so neither
+ * side has to write it to disk. Returns null when the service is not running.
+ */
+function stage_service_send_frame(string $frame, string $contentType = 'image/jpeg', float $timeout = 10.0): ?array {
+    $baseUrl = getenv('STAGE_SERVICE_URL') ?: 'http://127.0.0.1:5113';
+    $context = stream_context_create([
+        'http' => [
+            'method' => 'POST',
+            'header' => "Content-Type: {$contentType}\r\n",
+            'content' => $frame,
+            'timeout' => $timeout,
+            'ignore_errors' => true,
+        ],
+    ]);
+    $body = @file_get_contents(rtrim($baseUrl, '/') . '/process_frame', false, $context);
+    if ($body === false) {
+        return null;
+    }
+    $decoded = json_decode($body, true);
+    return is_array($decoded) ? $decoded : null;
+}
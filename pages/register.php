@@ -162,7 +162,24 @@ if ($_SERVER['REQUEST_METHOD'] === 'POST') {
                 . ' --out ' . escapeshellarg($qrFsPath);
             @exec($cmd . ' 2>&1', $outLines, $exitCode);
             $qrWebPath = 'qrcodes/' . $qrFilename;
-            
+            // Extract and cache the reference fingerprint features once, so verification never re-extracts them
+            $fpScript = __DIR__ . '/../integrations/fingerprint_verification.py';
+            $fpCmd = $python . ' ' . escapeshellarg($fpScript)
+                . ' --enroll ' . escapeshellarg(__DIR__ . '/../' . $fingerprintPath)
+                . ' --uploads-dir ' . escapeshellarg(__DIR__ . '/../uploads');
+            @exec($fpCmd . ' 2>&1', $fpOutLines, $fpExitCode);
+            // Add just the new photo to the face template index, in the background so neither the
+            // response nor the welcome email waits for it
+            $faceScript = __DIR__ . '/../integrations/face_enrollment_cli.py';
+            $faceCmd = $python . ' ' . escapeshellarg($faceScript)
+                . ' --photos_dir ' . escapeshellarg(__DIR__ . '/../uploads')
+                . ' --photos ' . escapeshellarg(__DIR__ . '/../' . $photoPath);
+            if (strtoupper(substr(PHP_OS, 0, 3)) === 'WIN') {
+                @pclose(@popen('start /B "" ' . $faceCmd . ' > NUL 2>&1', 'r'));
+            } else {
+                @exec($faceCmd . ' > /dev/null 2>&1 &');
+            }
+
             // Send welcome email with QR code
             $emailResult = '';
             try {
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Person Detection Backends
+Interchangeable person detectors for stage detection: OpenCV HOG (default) or a cv2.dnn model on CPU
+"""
+
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+# HOG speed/accuracy trade-offs. detection_width is the width the detection ROIs are
+# scaled to (relative to the full frame; None keeps full resolution); scale and win_stride
+# set the pyramid density. 'accurate' is the original detector: full resolution, scale 1.05.
+HOG_PROFILES = {
+    'fast': {'detection_width': 480, 'scale': 1.2, 'win_stride': (16, 16), 'padding': (0, 0)},
+    'balanced': {'detection_width': 640, 'scale': 1.1, 'win_stride': (8, 8), 'padding': (4, 4)},
+    'accurate': {'detection_width': None, 'scale': 1.05, 'win_stride': (8, 8), 'padding': (4, 4)},
+}
+# Pixels added around the zones' bounding box so people at its edge still fit a HOG window
+ROI_MARGIN = 32
+
+# cv2.dnn model layouts. 'ssd' expects the [1, 1, N, 7] DetectionOutput of MobileNet-SSD style
+# models (Caffe, TensorFlow); 'yolo' expects an ONNX YOLOv5 [B, N, 5 + classes] or
+# YOLOv8 [B, 4 + classes, N] head with boxes in input pixels.
+DNN_DEFAULTS = {
+    'ssd': {'input_size': (300, 300), 'scale': 1 / 127.5, 'mean': (127.5, 127.5, 127.5),
+            'swap_rb': False, 'person_class_id': 15},
+    'yolo': {'input_size': (640, 640), 'scale': 1 / 255.0, 'mean': (0, 0, 0),
+             'swap_rb': True, 'person_class_id': 0},
+}
+
+
+def merge_rois(rois):
+    """
+    Merge (x, y, w, h) rectangles that overlap so no pixel is searched twice. Rectangles that
+    only touch stay separate; a person straddling their shared edge fits in neither.
+    """
+    merged = [list(map(int, roi)) for roi in rois]
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                ax, ay, aw, ah = merged[i]
+                bx, by, bw, bh = merged[j]
+                if ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah:
+                    x0, y0 = min(ax, bx), min(ay, by)
+                    x1, y1 = max(ax + aw, bx + bw), max(ay + ah, by + bh)
+                    merged[i] = [x0, y0, x1 - x0, y1 - y0]
+                    del merged[j]
+                    changed = True
+                    break
+            if changed:
+                break
+    return [tuple(roi) for roi in merged]
+
+
+def bounding_roi(rois, margin=ROI_MARGIN):
+    """One (x, y, w, h) rectangle around all rois, grown by margin on every side (clipped when used)"""
+    x0 = min(int(x) for x, _, _, _ in rois) - margin
+    y0 = min(int(y) for _, y, _, _ in rois) - margin
+    x1 = max(int(x) + int(w) for x, _, w, _ in rois) + margin
+    y1 = max(int(y) + int(h) for _, y, _, h in rois) + margin
+    return (max(0, x0), max(0, y0), x1 - max(0, x0), y1 - max(0, y0))
+
+
+def boxes_to_people(boxes, scores):
+    """Convert full-frame (x, y, w, h) boxes into the person dicts used by StageDetector"""
+    people = []
+    for (x, y, w, h), score in zip(boxes, scores):
+        people.append({
+            'x': int(x + w // 2),
+            'y': int(y + h // 2),
+            'width': int(w),
+            'height': int(h),
+            'confidence': float(score)
+        })
+    return people
+
+
+class LatencyStats:
+    """Thread-safe detection timing shared by a detector and its clones"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.frames = 0
+        self.batches = 0
+        self.total_ms = 0.0
+        self.last_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, elapsed_ms, frames=1):
+        with self.lock:
+            self.frames += frames
+            self.batches += 1
+            self.total_ms += elapsed_ms
+            self.last_ms = elapsed_ms / max(1, frames)
+            self.max_ms = max(self.max_ms, self.last_ms)
+
+    def report(self):
+        with self.lock:
+            mean_ms = self.total_ms / self.frames if self.frames else 0.0
+            return {
+                'frames': self.frames,
+                'batches': self.batches,
+                'mean_ms': round(mean_ms, 2),
+                'last_ms': round(self.last_ms, 2),
+                'max_ms': round(self.max_ms, 2),
+                'fps': round(1000.0 / mean_ms, 1) if mean_ms else 0.0,
+            }
+
+
+class PersonDetector:
+    """
+    Backend interface. detect() returns person dicts with full-frame center x/y, width,
+    height and confidence; detect_batch() does the same for a list of frames.
+    """
+
+    name = 'base'
+
+    def __init__(self, confidence=0.5, nms_threshold=0.4, stats=None):
+        self.confidence = float(confidence)
+        self.nms_threshold = float(nms_threshold)
+        self.stats = stats or LatencyStats()
+
+    def _detect_batch(self, frames):
+        raise NotImplementedError
+
+    def detect(self, frame):
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames):
+        if not frames:
+            return []
+        started = time.perf_counter()
+        results = self._detect_batch(frames)
+        self.stats.record((time.perf_counter() - started) * 1000.0, len(frames))
+        return results
+
+    def clone(self):
+        """Independent detector with the same settings and shared latency stats (one per thread)"""
+        raise NotImplementedError
+
+    def latency_report(self):
+        report = {'backend': self.name}
+        report.update(self.describe())
+        report.update(self.stats.report())
+        return report
+
+    def describe(self):
+        return {}
+
+    def _nms(self, boxes, scores):
+        if len(boxes) < 2:
+            return boxes, scores
+        keep = np.asarray(cv2.dnn.NMSBoxes(boxes, scores, self.confidence, self.nms_threshold)).reshape(-1)
+        return [boxes[i] for i in keep], [scores[i] for i in keep]
+
+
+class HOGPersonDetector(PersonDetector):
+    """OpenCV's default HOG + linear SVM people detector, run on ROIs at a reduced resolution"""
+
+    name = 'hog'
+
+    def __init__(self, profile='balanced', detection_width=None, rois=None,
+                 confidence=0.3, nms_threshold=0.5, stats=None):
+        super().__init__(confidence, nms_threshold, stats)
+        if profile not in HOG_PROFILES:
+            raise ValueError(f"Unknown detection profile '{profile}', expected one of {sorted(HOG_PROFILES)}")
+        self.profile = profile
+        self.settings = dict(HOG_PROFILES[profile])
+        if detection_width:
+            self.settings['detection_width'] = int(detection_width)
+        # None searches the whole frame
+        self.rois = merge_rois(rois) if rois else None
+        self.hog = cv2.HOGDescriptor()
+        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+
+    def clone(self):
+        return HOGPersonDetector(self.profile, self.settings['detection_width'], self.rois,
+                                 self.confidence, self.nms_threshold, self.stats)
+
+    def describe(self):
+        return {'profile': self.profile, 'detection_width': self.settings['detection_width']}
+
+    def _detect_batch(self, frames):
+        return [self._detect_one(frame) for frame in frames]
+
+    def _detect_one(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        frame_h, frame_w = gray.shape[:2]
+        detection_width = self.settings['detection_width'] or frame_w
+        factor = min(1.0, detection_width / float(frame_w))
+        win_w, win_h = self.hog.winSize
+
+        boxes_found, scores = [], []
+        for (rx, ry, rw, rh) in (self.rois or [(0, 0, frame_w, frame_h)]):
+            # Clip the ROI to the frame
+            x0, y0 = max(0, rx), max(0, ry)
+            x1, y1 = min(frame_w, rx + rw), min(frame_h, ry + rh)
+            if x1 <= x0 or y1 <= y0:
+                continue
+            roi = gray[y0:y1, x0:x1]
+            if factor < 1.0:
+                roi = cv2.resize(roi, (max(1, int((x1 - x0) * factor)), max(1, int((y1 - y0) * factor))),
+                                 interpolation=cv2.INTER_AREA)
+            if roi.shape[0] < win_h or roi.shape[1] < win_w:
+                continue
+
+            boxes, weights = self.hog.detectMultiScale(
+                roi,
+                winStride=self.settings['win_stride'],
+                padding=self.settings['padding'],
+                scale=self.settings['scale']
+            )
+            weights = np.asarray(weights, dtype=np.float32).reshape(-1)
+            for (x, y, w, h), weight in zip(boxes, weights):
+                if weight > self.confidence:
+                    # Map back to full-frame coordinates
+                    boxes_found.append([int(x0 + x / factor), int(y0 + y / factor),
+                                        int(w / factor), int(h / factor)])
+                    scores.append(float(weight))
+
+        # Separate ROIs can see the same person at their shared edge
+        if self.rois and len(self.rois) > 1:
+            boxes_found, scores = self._nms(boxes_found, scores)
+        return boxes_to_people(boxes_found, scores)
+
+
+class DNNPersonDetector(PersonDetector):
+    """
+    Person detector on a local cv2.dnn model (ONNX, Caffe, TensorFlow or Darknet files)
+    running on the CPU. Frames are resized into one blob per batch. Many exported models
+    have a fixed batch of 1; if a batched forward fails, the detector drops to batch_size 1
+    for good and runs the frames one at a time.
+    """
+
+    name = 'dnn'
+
+    def __init__(self, model_path, config_path=None, kind=None, input_size=None, scale=None,
+                 mean=None, swap_rb=None, person_class_id=None, confidence=0.5,
+                 nms_threshold=0.4, batch_size=4, threads=None, stats=None):
+        super().__init__(confidence, nms_threshold, stats)
+        if not model_path or not os.path.exists(model_path):
+            raise FileNotFoundError(f"Person detection model not found: {model_path}")
+        if config_path and not os.path.exists(config_path):
+            raise FileNotFoundError(f"Person detection model config not found: {config_path}")
+        if kind is None:
+            kind = 'yolo' if model_path.lower().endswith('.onnx') else 'ssd'
+        if kind not in DNN_DEFAULTS:
+            raise ValueError(f"Unknown model kind '{kind}', expected one of {sorted(DNN_DEFAULTS)}")
+        defaults = DNN_DEFAULTS[kind]
+        self.model_path = model_path
+        self.config_path = config_path
+        self.kind = kind
+        self.input_size = tuple(int(v) for v in (input_size or defaults['input_size']))
+        self.scale = float(defaults['scale'] if scale is None else scale)
+        self.mean = tuple(defaults['mean'] if mean is None else mean)
+        self.swap_rb = bool(defaults['swap_rb'] if swap_rb is None else swap_rb)
+        self.person_class_id = int(defaults['person_class_id'] if person_class_id is None else person_class_id)
+        self.batch_size = max(1, int(batch_size))
+        self.threads = threads
+        if threads:
+            cv2.setNumThreads(int(threads))
+
+        self.net = cv2.dnn.readNet(model_path, config_path or '')
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.output_names = self.net.getUnconnectedOutLayersNames()
+
+    def clone(self):
+        # cv2.dnn.Net is not safe to share between threads
+        return DNNPersonDetector(self.model_path, self.config_path, self.kind, self.input_size,
+                                 self.scale, self.mean, self.swap_rb, self.person_class_id,
+                                 self.confidence, self.nms_threshold, self.batch_size,
+                                 self.threads, self.stats)
+
+    def describe(self):
+        return {'model': os.path.basename(self.model_path), 'kind': self.kind,
+                'input_size': list(self.input_size), 'batch_size': self.batch_size}
+
+    def _detect_chunk(self, chunk):
+        blob = cv2.dnn.blobFromImages(chunk, self.scale, self.input_size,
+                                      self.mean, swapRB=self.swap_rb, crop=False)
+        self.net.setInput(blob)
+        outputs = self.net.forward(self.output_names)
+        if self.kind == 'ssd':
+            return self._parse_ssd(outputs[0], chunk)
+        return self._parse_yolo(outputs[0], chunk)
+
+    def _detect_batch(self, frames):
+        results = []
+        start = 0
+        while start < len(frames):
+            chunk = frames[start:start + self.batch_size]
+            try:
+                results.extend(self._detect_chunk(chunk))
+            except (cv2.error, ValueError) as e:
+                if len(chunk) == 1:
+                    raise
+                # Fixed-batch model: the blob or the output does not fit, so retry these frames singly
+                print(f"Batched inference failed for {os.path.basename(self.model_path)} ({str(e).strip()}); "
+                      f"using batch_size 1", file=sys.stderr)
+                self.batch_size = 1
+                continue
+            start += len(chunk)
+        return results
+
+    def _parse_ssd(self, output, frames):
+        # Rows are [image_id, class_id, confidence, x1, y1, x2, y2] with normalized corners
+        rows = output.reshape(-1, 7)
+        rows = rows[(rows[:, 1] == self.person_class_id) & (rows[:, 2] >= self.confidence)]
+        results = []
+        for index, frame in enumerate(frames):
+            frame_h, frame_w = frame.shape[:2]
+            boxes, scores = [], []
+            for _, _, score, x1, y1, x2, y2 in rows[rows[:, 0] == index]:
+                x1, x2 = np.clip([x1, x2], 0.0, 1.0) * frame_w
+                y1, y2 = np.clip([y1, y2], 0.0, 1.0) * frame_h
+                boxes.append([int(x1), int(y1), int(x2 - x1), int(y2 - y1)])
+                scores.append(float(score))
+            boxes, scores = self._nms(boxes, scores)
+            results.append(boxes_to_people(boxes, scores))
+        return results
+
+    def _parse_yolo(self, output, frames):
+        # cv2.dnn may add unit axes for batched blobs; the head is the last two dimensions
+        output = output.reshape(len(frames), output.shape[-2], output.shape[-1])
+        # YOLOv8 heads are [B, 4 + classes, N]; YOLOv5 heads are [B, N, 5 + classes]
+        has_objectness = output.shape[1] > output.shape[2]
+        if not has_objectness:
+            output = output.transpose(0, 2, 1)
+        input_w, input_h = self.input_size
+        results = []
+        for index, frame in enumerate(frames):
+            frame_h, frame_w = frame.shape[:2]
+            rows = output[index]
+            if has_objectness:
+                scores = rows[:, 4] * rows[:, 5 + self.person_class_id]
+            else:
+                scores = rows[:, 4 + self.person_class_id]
+            rows, scores = rows[scores >= self.confidence], scores[scores >= self.confidence]
+            sx, sy = frame_w / float(input_w), frame_h / float(input_h)
+            boxes = [[int((cx - w / 2) * sx), int((cy - h / 2) * sy), int(w * sx), int(h * sy)]
+                     for cx, cy, w, h in rows[:, :4]]
+            boxes, scores = self._nms(boxes, [float(s) for s in scores])
+            results.append(boxes_to_people(boxes, scores))
+        return results
+
+
+def create_person_detector(backend='hog', **options):
+    """
+    Build a detector from configuration: backend 'hog' (options: profile, detection_width,
+    rois, confidence) or 'dnn' (options: model_path, config_path, kind, input_size,
+    confidence, nms_threshold, batch_size, threads). Unset (None) options use the defaults.
+    """
+    options = {key: value for key, value in options.items() if value is not None}
+    if backend == 'hog':
+        return HOGPersonDetector(**options)
+    if backend == 'dnn':
+        return DNNPersonDetector(**options)
+    raise ValueError(f"Unknown person detector backend '{backend}', expected 'hog' or 'dnn'")
+
+
+def add_detector_arguments(parser):
+    """Add the person detector options to an argparse parser"""
+    parser.add_argument('--detector', default=os.environ.get('STAGE_DETECTOR', 'hog'), choices=['hog', 'dnn'],
+                        help='Person detector backend')
+    parser.add_argument('--profile', default=os.environ.get('STAGE_DETECTOR_PROFILE', 'balanced'),
+                        choices=sorted(HOG_PROFILES), help='HOG speed/accuracy profile')
+    parser.add_argument('--detection_width', type=int, default=None, help='Override the HOG detection width')
+    parser.add_argument('--model', default=os.environ.get('STAGE_DETECTOR_MODEL'),
+                        help='cv2.dnn model file (.onnx, .caffemodel, .pb, .weights)')
+    parser.add_argument('--model_config', default=os.environ.get('STAGE_DETECTOR_CONFIG'),
+                        help='cv2.dnn model config (.prototxt, .pbtxt, .cfg)')
+    parser.add_argument('--model_kind', default=None, choices=sorted(DNN_DEFAULTS),
+                        help='Output layout of the dnn model (default: yolo for .onnx, otherwise ssd)')
+    parser.add_argument('--confidence', type=float, default=None, help='Minimum person confidence')
+    parser.add_argument('--nms_threshold', type=float, default=None, help='Non-maximum suppression IoU threshold')
+
+
+def detector_options_from_args(args):
+    """Map parsed add_detector_arguments options to create_person_detector keyword arguments"""
+    if args.detector == 'dnn':
+        return {'model_path': args.model, 'config_path': args.model_config, 'kind': args.model_kind,
+                'confidence': args.confidence, 'nms_threshold': args.nms_threshold}
+    return {'profile': args.profile, 'detection_width': args.detection_width,
+            'confidence': args.confidence, 'nms_threshold': args.nms_threshold}
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Person Tracking
+ID-preserving multi-person tracker for stage detection: IoU/centroid association with a Kalman filter per track
+"""
+
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+def box_of(person):
+    """(x1, y1, x2, y2) corners of a person dict (x/y are the box center)"""
+    half_w, half_h = person['width'] / 2.0, person['height'] / 2.0
+    return (person['x'] - half_w, person['y'] - half_h, person['x'] + half_w, person['y'] + half_h)
+
+
+def iou(a, b):
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    """One person: a constant-velocity Kalman filter on (cx, cy, w, h) and a ring buffer of zone visits"""
+
+    def __init__(self, track_id, person, now, history_size=64):
+        self.track_id = track_id
+        self.confidence = float(person.get('confidence', 0.0))
+        self.hits = 1
+        self.misses = 0
+        self.last_hit = now
+        self.last_time = now
+        self.announced = False
+        # (timestamp, zone) samples; deque(maxlen) drops the oldest sample itself
+        self.history = deque(maxlen=history_size)
+
+        # State [cx, cy, w, h, vx, vy, vw, vh], measurement [cx, cy, w, h]
+        self.kalman = cv2.KalmanFilter(8, 4)
+        self.kalman.measurementMatrix = np.eye(4, 8, dtype=np.float32)
+        self.kalman.transitionMatrix = np.eye(8, dtype=np.float32)
+        self.kalman.processNoiseCov = np.diag([1, 1, 1, 1, 10, 10, 1, 1]).astype(np.float32)
+        self.kalman.measurementNoiseCov = np.eye(4, dtype=np.float32) * 4.0
+        self.kalman.errorCovPost = np.diag([10, 10, 10, 10, 1000, 1000, 100, 100]).astype(np.float32)
+        self.kalman.statePost = np.array([[person['x']], [person['y']], [person['width']], [person['height']],
+                                          [0], [0], [0], [0]], dtype=np.float32)
+
+    def _measurement(self, person):
+        return np.array([[person['x']], [person['y']], [person['width']], [person['height']]], dtype=np.float32)
+
+    def predict(self, now):
+        """Advance the filter to now; a non-positive step leaves the estimate unchanged"""
+        dt = now - self.last_time
+        if dt <= 0:
+            # Keep the prior in step so a following correct() starts from the current estimate
+            self.kalman.statePre = self.kalman.statePost.copy()
+            self.kalman.errorCovPre = self.kalman.errorCovPost.copy()
+            return
+        for i in range(4):
+            self.kalman.transitionMatrix[i, i + 4] = dt
+        self.kalman.predict()
+        # Without a measurement the predicted state is the best estimate
+        self.kalman.statePost = self.kalman.statePre.copy()
+        self.kalman.errorCovPost = self.kalman.errorCovPre.copy()
+        self.last_time = now
+
+    def correct(self, person, now):
+        self.predict(now)
+        self.kalman.correct(self._measurement(person))
+        self.confidence = float(person.get('confidence', self.confidence))
+        self.hits += 1
+        self.misses = 0
+        self.last_hit = now
+
+    def person(self):
+        cx, cy, w, h = self.kalman.statePost[:4, 0]
+        return {
+            'x': int(round(cx)),
+            'y': int(round(cy)),
+            'width': max(1, int(round(w))),
+            'height': max(1, int(round(h))),
+            'confidence': self.confidence,
+            'track_id': self.track_id,
+        }
+
+    def stop(self):
+        """Zero the velocity, e.g. when the scene is known to be static"""
+        self.kalman.statePost[4:] = 0
+
+    def record_zone(self, zone, now, min_interval=0.1):
+        # Samples of an unchanged zone are thinned so the ring buffer spans several seconds
+        if self.history and self.history[-1][1] == zone and now - self.history[-1][0] < min_interval:
+            return
+        self.history.append((now, zone))
+
+    def zones_since(self, since):
+        """Zones visited since a timestamp, with consecutive repeats collapsed"""
+        zones = []
+        for timestamp, zone in self.history:
+            if timestamp >= since and (not zones or zones[-1] != zone):
+                zones.append(zone)
+        return zones
+
+    def samples_since(self, since, zone=None):
+        return sum(1 for timestamp, z in self.history if timestamp >= since and (zone is None or z == zone))
+
+
+class PersonTracker:
+    """
+    Keeps one Track per person between detections. update() associates new detections with
+    the tracks' predicted boxes (IoU first, then centroid distance), predict() moves tracks
+    along on frames that were not detected, and hold() keeps them in place on static frames.
+    """
+
+    def __init__(self, zone_of, iou_threshold=0.2, max_centroid_distance=120.0,
+                 max_misses=3, max_age_seconds=15.0, history_size=64):
+        self.zone_of = zone_of
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.max_misses = max_misses
+        self.max_age_seconds = max_age_seconds
+        self.history_size = history_size
+        self.tracks = []
+        self._next_id = 1
+
+    def _associate(self, people):
+        """Greedy matching of detections to tracks; returns (pairs, unmatched detection indexes)"""
+        candidates = []
+        predicted = [track.person() for track in self.tracks]
+        for ti, tracked in enumerate(predicted):
+            tracked_box = box_of(tracked)
+            for di, person in enumerate(people):
+                overlap = iou(tracked_box, box_of(person))
+                distance = np.hypot(tracked['x'] - person['x'], tracked['y'] - person['y'])
+                if overlap >= self.iou_threshold or distance <= self.max_centroid_distance:
+                    # Higher overlap wins; distance breaks ties between non-overlapping boxes
+                    candidates.append((-overlap, distance, ti, di))
+        candidates.sort()
+        used_tracks, used_people, pairs = set(), set(), []
+        for _, _, ti, di in candidates:
+            if ti in used_tracks or di in used_people:
+                continue
+            used_tracks.add(ti)
+            used_people.add(di)
+            pairs.append((ti, di))
+        return pairs, [di for di in range(len(people)) if di not in used_people]
+
+    def _record(self, now):
+        for track in self.tracks:
+            track.record_zone(self.zone_of(track.person()['x']), now)
+
+    def update(self, people, now=None):
+        """Fold in a fresh set of detections"""
+        now = time.time() if now is None else now
+        for track in self.tracks:
+            track.predict(now)
+        pairs, unmatched = self._associate(people)
+        matched_tracks = set()
+        for ti, di in pairs:
+            self.tracks[ti].correct(people[di], now)
+            matched_tracks.add(ti)
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.misses += 1
+        self.tracks = [t for t in self.tracks
+                       if t.misses <= self.max_misses and now - t.last_hit <= self.max_age_seconds]
+        for di in unmatched:
+            self.tracks.append(Track(self._next_id, people[di], now, self.history_size))
+            self._next_id += 1
+        self._record(now)
+        return self.people()
+
+    def predict(self, now=None):
+        """Move tracks to where their motion puts them at now (a frame without detection)"""
+        now = time.time() if now is None else now
+        for track in self.tracks:
+            track.predict(now)
+        self._record(now)
+        return self.people()
+
+    def hold(self, now=None):
+        """Nothing moved: keep every track where it is, but still count the time spent there"""
+        now = time.time() if now is None else now
+        for track in self.tracks:
+            track.stop()
+            track.last_time = max(track.last_time, now)
+        self.tracks = [t for t in self.tracks if now - t.last_hit <= self.max_age_seconds]
+        self._record(now)
+        return self.people()
+
+    def people(self):
+        return [track.person() for track in self.tracks]
+
+    def get(self, track_id):
+        for track in self.tracks:
+            if track.track_id == track_id:
+                return track
+        return None
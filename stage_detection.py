@@ -6,62 +6,399 @@ Real-time object detection for graduation ceremony stage sequencing
 
 import cv2
 import numpy as np
-import sqlite3
 import json
 import time
 import threading
+import queue
 from datetime import datetime
 import os
 import sys
+from collections import OrderedDict, namedtuple
+
+from person_detection import (add_detector_arguments, bounding_roi, create_person_detector,
+                              detector_options_from_args, merge_rois)
+from person_tracking import PersonTracker
+import database
+
+# What the pipeline hands the decision loop. people is None when the frame was not
+# detected; moving tells whether the tracker should predict (True) or hold (False).
+PipelineResult = namedtuple('PipelineResult', 'seq captured_at frame people moving')
+
+
+class FrameSlot:
+    """Holds only the newest captured frame; an older frame nobody took yet is dropped"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self._cond.notify()
+
+    def take(self, timeout=None):
+        """Return the newest (seq, captured_at, frame) item, or None on timeout"""
+        with self._cond:
+            if self._item is None:
+                self._cond.wait(timeout)
+            item, self._item = self._item, None
+            return item
+
+
+class MotionGate:
+    """
+    Cheap motion check run on every captured frame so HOG only runs when something moved.
+
+    Frames are shrunk to a small grayscale thumbnail and compared with the thumbnail of the
+    last frame that was sent to detection. Motion energy is the fraction of changed pixels
+    in the busiest detection zone, so slow movement still adds up until it crosses the
+    threshold, and a person walking through one zone is not diluted by the rest of the frame.
+    """
+
+    def __init__(self, zones, threshold=0.02, max_idle_seconds=5.0, width=160, pixel_delta=25):
+        self.zones = list(zones)
+        self.threshold = threshold
+        self.max_idle_seconds = max_idle_seconds
+        self.width = width
+        self.pixel_delta = pixel_delta
+        self.last_energy = 0.0
+        self._reference = None
+        self._frame_shape = None
+        self._zone_slices = []
+        self._last_pass = 0.0
+
+    def _thumbnail(self, frame):
+        height, width = frame.shape[:2]
+        scale = self.width / float(width)
+        small = cv2.resize(frame, (self.width, max(1, int(round(height * scale)))),
+                           interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0), scale
+
+    def _build_zones(self, shape, scale):
+        """Map the (x, y, w, h) detection zones onto the thumbnail"""
+        height, width = shape
+        self._zone_slices = []
+        for (x, y, w, h) in self.zones:
+            x0, y0 = max(0, int(x * scale)), max(0, int(y * scale))
+            x1, y1 = min(width, int(round((x + w) * scale))), min(height, int(round((y + h) * scale)))
+            if x1 > x0 and y1 > y0:
+                self._zone_slices.append((slice(y0, y1), slice(x0, x1)))
+        if not self._zone_slices:
+            self._zone_slices = [(slice(0, height), slice(0, width))]
+
+    def motion_energy(self, frame):
+        """Highest fraction of changed pixels in any zone since the reference frame"""
+        small, scale = self._thumbnail(frame)
+        # Zones are in frame pixels, so a new resolution needs new slices even at the same aspect
+        if self._reference is None or self._frame_shape != frame.shape[:2]:
+            self._frame_shape = frame.shape[:2]
+            self._build_zones(small.shape, scale)
+            return 1.0, small
+        diff = cv2.absdiff(small, self._reference)
+        changed = diff > self.pixel_delta
+        energy = max(float(np.count_nonzero(changed[zone])) / changed[zone].size
+                     for zone in self._zone_slices)
+        return energy, small
+
+    def check(self, frame, now=None):
+        """
+        Return True when frame should go to person detection.
+
+        Motion at or above the threshold passes the frame, and so does the first frame after
+        max_idle_seconds without one, so the last detections never go too stale. A passed
+        frame becomes the new reference.
+        """
+        now = time.time() if now is None else now
+        energy, small = self.motion_energy(frame)
+        self.last_energy = energy
+        if energy >= self.threshold or now - self._last_pass >= self.max_idle_seconds:
+            self._reference = small
+            self._last_pass = now
+            return True
+        return False
+
+
+class GraduateQueueCache:
+    """
+    Pending graduates (queued, not yet announced) kept in memory in queue order.
+
+    The list is reloaded only when PRAGMA data_version shows that another connection (the
+    PHP side) committed since the last load, or once ttl seconds have passed. The version is
+    only checked when a caller asks for it (peek(check=True), i.e. before announcing) and at
+    most every check_interval seconds; between reloads peek(check=False) runs no query at all.
+    """
+
+    def __init__(self, conn, ttl=30.0, check_interval=5.0):
+        self.conn = conn
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.pending = []
+        self.data_version = None
+        self.loaded_at = None
+        self.checked_at = 0.0
+        self.stats = {'reloads': 0, 'version_checks': 0}
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def refresh(self, force=False, check=True):
+        """Reload the pending graduates if the database changed; returns True when it reloaded"""
+        now = time.monotonic()
+        if not force and self.loaded_at is not None and now - self.loaded_at < self.ttl:
+            if not check or now - self.checked_at < self.check_interval:
+                return False
+            self.checked_at = now
+            self.stats['version_checks'] += 1
+            if database.data_version(self.conn) == self.data_version:
+                return False
+        self.data_version = database.data_version(self.conn)
+        self.pending = database.pending_graduates(self.conn)
+        self.loaded_at = self.checked_at = now
+        self.stats['reloads'] += 1
+        return True
+
+    def peek(self, check=True):
+        """Next graduate to announce, or None; check=False trusts the cached list until the ttl"""
+        self.refresh(check=check)
+        return dict(self.pending[0]) if self.pending else None
+
+    def pop(self, graduate_id):
+        """Drop an announced graduate from the cached queue and return its row"""
+        for i, graduate in enumerate(self.pending):
+            if graduate['id'] == graduate_id:
+                return self.pending.pop(i)
+        return None
+
+
+class NotificationDispatcher:
+    """
+    Sends display notifications from a background thread so the detection loop never waits on HTTP.
+
+    Pending notifications are keyed by graduate, so announcing the same graduate again before
+    the first one went out sends it once. The pending set is bounded; when it is full the
+    oldest notification goes straight to the file fallback. Each notification is retried with
+    exponential backoff over one keep-alive requests.Session, and only written to the file
+    fallback after every attempt failed.
+    """
+
+    def __init__(self, fallback, url='http://localhost/api/notify_graduation.php', max_pending=32,
+                 retries=3, backoff=0.5, timeout=5.0):
+        self.fallback = fallback
+        self.url = url
+        self.max_pending = max_pending
+        self.retries = max(1, int(retries))
+        self.backoff = backoff
+        self.timeout = timeout
+        self.pending = OrderedDict()
+        self.cond = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.session = None
+        self.stats = {'sent': 0, 'failed': 0, 'coalesced': 0, 'overflowed': 0}
+
+    def notify(self, graduate_id, label=None):
+        """Queue a notification; returns immediately"""
+        overflow = None
+        with self.cond:
+            if graduate_id in self.pending:
+                self.stats['coalesced'] += 1
+                return
+            if len(self.pending) >= self.max_pending:
+                overflow, _ = self.pending.popitem(last=False)
+                self.stats['overflowed'] += 1
+            self.pending[graduate_id] = label or f"ID {graduate_id}"
+            self.cond.notify()
+        if self.thread is None or not self.thread.is_alive():
+            self.start()
+        if overflow is not None:
+            self.fallback(overflow)
+
+    def start(self):
+        with self.cond:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name='stage-notify', daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout=2.0):
+        """Stop the sender; anything still pending is written to the file fallback"""
+        self.stop_event.set()
+        with self.cond:
+            self.cond.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=timeout)
+        with self.cond:
+            leftover, self.pending = list(self.pending), OrderedDict()
+        for graduate_id in leftover:
+            self.fallback(graduate_id)
+
+    def _open_session(self):
+        try:
+            import requests
+        except ImportError:
+            # requests module not available, use file system notification
+            print("requests module not available, using file system notification")
+            return None
+        session = requests.Session()
+        # Keep-alive pool sized for one sender thread
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _send(self, graduate_id, label):
+        """POST one notification; True once the display system has it (or rejected it for good)"""
+        response = self.session.post(self.url, data={'action': 'announce_graduation', 'graduate_id': graduate_id},
+                                     timeout=self.timeout)
+        if response.status_code != 200:
+            print(f"Display notification HTTP error: {response.status_code}")
+            return False
+        result = response.json()
+        if result.get('success'):
+            print(f"Display notification sent successfully for graduate {label}")
+        else:
+            # The endpoint answered; retrying would not change its mind
+            print(f"Display notification failed: {result.get('message')}")
+        return True
+
+    def _run(self):
+        self.session = self._open_session()
+        while True:
+            with self.cond:
+                while not self.pending and not self.stop_event.is_set():
+                    self.cond.wait()
+                if self.stop_event.is_set():
+                    break
+                graduate_id, label = self.pending.popitem(last=False)
+            if self.session is None:
+                self.fallback(graduate_id)
+                continue
+            delivered = False
+            for attempt in range(self.retries):
+                try:
+                    delivered = self._send(graduate_id, label)
+                except Exception as e:
+                    print(f"Display notification request failed: {e}")
+                if delivered or self.stop_event.wait(self.backoff * (2 ** attempt)):
+                    break
+            if delivered:
+                self.stats['sent'] += 1
+            else:
+                self.stats['failed'] += 1
+                # Fallback: try to trigger notification through file system
+                self.fallback(graduate_id)
+        if self.session is not None:
+            self.session.close()
+
 
 class StageDetector:
-    def __init__(self, db_path="data/app.sqlite"):
+    def __init__(self, db_path="data/app.sqlite", detection_workers=2,
+                 motion_threshold=0.02, motion_refresh_seconds=5.0, static_decision_interval=0.5,
+                 detection_profile='balanced', detection_width=None, detection_rois=None,
+                 detector_backend='hog', detector_options=None, detect_every_n_frames=3,
+                 notify_display=True):
         self.db_path = db_path
         self.cap = None
         self.is_running = False
         self.detection_thread = None
         
+        # Pipeline: capture thread -> FrameSlot -> detection workers -> results queue -> decision loop
+        self.detection_workers = max(1, int(detection_workers))
+        self.frame_slot = FrameSlot()
+        # One extra slot for tracking-only results (frames the tracker covers without detection)
+        self.detection_results = queue.Queue(maxsize=self.detection_workers + 1)
+        self.pipeline_threads = []
+        self.pipeline_stats = {'frames_dropped': 0, 'results_dropped': 0, 'last_latency_ms': 0.0,
+                               'frames_gated': 0, 'motion_energy': 0.0}
+        self.frames_captured = 0
+        
         # Detection zones
         self.left_zone = (0, 0, 320, 480)      # Left side of frame
         self.center_zone = (320, 0, 320, 480)  # Center of frame  
         self.right_zone = (640, 0, 320, 480)   # Right side of frame
         
-        # Person detection
-        self.person_detector = cv2.HOGDescriptor()
-        self.person_detector.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        # Motion gate: static frames hold the tracked people instead of running detection.
+        # A motion_threshold of 0 treats every frame as moving.
+        self.motion_gate = MotionGate([self.left_zone, self.center_zone, self.right_zone],
+                                      threshold=motion_threshold, max_idle_seconds=motion_refresh_seconds)
+        self.static_decision_interval = static_decision_interval
+        # While moving, detect every Nth frame and let the tracker predict the rest
+        self.detect_every_n_frames = max(1, int(detect_every_n_frames))
+        self.frames_since_detection = 0
+        self.last_static_decision = 0.0
         
-        # Movement tracking
-        self.person_positions = []
+        # Person detection. HOG only searches the ROIs: by default the zones' bounding box plus a margin
+        self.detector_backend = detector_backend
+        self.detector_options = dict(detector_options or {})
+        self.detection_profile = detection_profile
+        self.detection_width = detection_width
+        zones = [self.left_zone, self.center_zone, self.right_zone]
+        self.detection_rois = merge_rois(detection_rois) if detection_rois else [bounding_roi(zones)]
+        self.person_detector = None
+        
+        # Movement tracking: one track per person, sequences evaluated over the last 5 seconds
+        self.tracker = PersonTracker(self.zone_of)
+        self.sequence_window = 5.0
+        self.ready_track_id = None
         self.sequence_count = 0
         self.last_announcement = None
+        self.last_announced_graduate = None
+        # Cooldown between announcements, measured on the frame clock (time.time() live, video time on replay)
+        self.announcement_cooldown = 3.0
+        self.last_announced_at = None
+        
+        # Display notifications go out on their own thread
+        self.notify_display = notify_display
+        self.notifier = NotificationDispatcher(fallback=self.trigger_file_notification)
+        self.pipeline_stats['notifications'] = self.notifier.stats
         
         # Load pre-trained model for better detection
         self.load_custom_model()
     
+    def configure_zones(self, width, height):
+        """Split a width x height frame into equal left/center/right zones and re-aim detection at them"""
+        third = width // 3
+        self.left_zone = (0, 0, third, height)
+        self.center_zone = (third, 0, third, height)
+        self.right_zone = (2 * third, 0, width - 2 * third, height)
+        zones = [self.left_zone, self.center_zone, self.right_zone]
+        self.detection_rois = [bounding_roi(zones)]
+        self.motion_gate = MotionGate(zones, threshold=self.motion_gate.threshold,
+                                      max_idle_seconds=self.motion_gate.max_idle_seconds)
+        self.load_custom_model()
+    
+    def hog_detector_options(self):
+        return {'profile': self.detection_profile, 'detection_width': self.detection_width,
+                'rois': self.detection_rois}
+    
     def load_custom_model(self):
-        """Load a pre-trained model for better person detection"""
+        """Create the configured person detector backend, falling back to HOG if its model cannot be loaded"""
+        options = dict(self.detector_options)
+        if self.detector_backend == 'hog':
+            options = dict(self.hog_detector_options(), **options)
         try:
-            # Try to use YOLO if available, otherwise fall back to HOG
-            self.use_yolo = False
-            # You can add YOLO model loading here if needed
-        except:
-            self.use_yolo = False
+            self.person_detector = create_person_detector(self.detector_backend, **options)
+        except Exception as e:
+            print(f"Could not load {self.detector_backend} person detector ({e}), falling back to HOG")
+            self.person_detector = create_person_detector('hog', **self.hog_detector_options())
+        print(f"Person detector: {self.person_detector.latency_report()}")
     
     def connect_database(self):
-        """Connect to SQLite database"""
+        """Connect to SQLite database (pooled WAL connection for this thread)"""
         try:
             # Close existing connection if any
             if hasattr(self, 'conn'):
-                self.conn.close()
-            
-            # Ensure database directory exists
-            import os
-            db_dir = os.path.dirname(self.db_path)
-            if db_dir and not os.path.exists(db_dir):
-                os.makedirs(db_dir, exist_ok=True)
+                database.release(self.db_path)
             
-            self.conn = sqlite3.connect(self.db_path, timeout=10.0)
-            self.conn.row_factory = sqlite3.Row
+            self.conn = database.connect(self.db_path)
+            self.graduate_queue = GraduateQueueCache(self.conn)
             
             # Test the connection
             cursor = self.conn.cursor()
@@ -74,105 +411,46 @@ class StageDetector:
             print(f"Database connection error: {e}")
             return False
     
-    def get_next_queued_graduate(self):
-        """Get the next graduate from the queue"""
+    def get_next_queued_graduate(self, check=True):
+        """Get the next graduate from the queue (served from the in-memory queue cache)"""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                SELECT id, full_name, student_id, program 
-                FROM graduates 
-                WHERE queued_at IS NOT NULL AND announced_at IS NULL 
-                ORDER BY queued_at ASC 
-                LIMIT 1
-            """)
-            result = cursor.fetchone()
-            return dict(result) if result else None
+            return self.graduate_queue.peek(check=check)
         except Exception as e:
             print(f"Database query error: {e}")
+            self.graduate_queue.invalidate()
             return None
     
-    def announce_graduate(self, graduate_id):
+    def announce_graduate(self, graduate_id, now=None):
         """Mark a graduate as announced"""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                UPDATE graduates 
-                SET announced_at = datetime('now') 
-                WHERE id = ?
-            """, (graduate_id,))
-            
-            cursor.execute("""
-                UPDATE current_announcement 
-                SET graduate_id = ?, updated_at = datetime('now') 
-                WHERE id = 1
-            """, (graduate_id,))
+            # Both updates commit in one transaction; only a graduate still waiting is announced
+            if not database.announce_graduate(self.conn, graduate_id):
+                # Announced or dequeued elsewhere (e.g. from the stage page) since the cache was loaded
+                self.graduate_queue.invalidate()
+                print(f"Graduate ID {graduate_id} is no longer waiting to be announced")
+                return False
             
-            self.conn.commit()
+            graduate = self.graduate_queue.pop(graduate_id) or database.graduate_by_id(self.conn, graduate_id)
             self.last_announcement = datetime.now()
+            self.last_announced_at = time.time() if now is None else now
+            self.last_announced_graduate = graduate
             print(f"Announced graduate ID: {graduate_id}")
             
             # Notify the display system about the new announcement
-            self.notify_display_system(graduate_id)
+            self.notify_display_system(graduate_id, graduate)
             
             return True
         except Exception as e:
             print(f"Announcement error: {e}")
-            self.conn.rollback()
+            self.graduate_queue.invalidate()
             return False
     
-    def notify_display_system(self, graduate_id):
-        """Notify the display system about a new graduation announcement"""
-        try:
-            import requests
-            import json
-            
-            # Get graduate details for the notification
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                SELECT id, full_name, student_id, program 
-                FROM graduates 
-                WHERE id = ?
-            """, (graduate_id,))
-            
-            graduate = cursor.fetchone()
-            if graduate:
-                # Prepare notification data
-                notification_data = {
-                    'action': 'announce_graduation',
-                    'graduate_id': graduate_id
-                }
-                
-                # Send notification to the API
-                try:
-                    # Try to send HTTP notification
-                    response = requests.post(
-                        'http://localhost/api/notify_graduation.php',
-                        data=notification_data,
-                        timeout=5
-                    )
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        if result.get('success'):
-                            print(f"Display notification sent successfully for graduate {graduate['full_name']}")
-                        else:
-                            print(f"Display notification failed: {result.get('message')}")
-                    else:
-                        print(f"Display notification HTTP error: {response.status_code}")
-                        
-                except requests.exceptions.RequestException as e:
-                    print(f"Display notification request failed: {e}")
-                    # Fallback: try to trigger notification through file system
-                    self.trigger_file_notification(graduate_id)
-                    
-        except ImportError:
-            # requests module not available, use file system notification
-            print("requests module not available, using file system notification")
-            self.trigger_file_notification(graduate_id)
-        except Exception as e:
-            print(f"Display notification error: {e}")
-            # Fallback: try to trigger notification through file system
-            self.trigger_file_notification(graduate_id)
+    def notify_display_system(self, graduate_id, graduate=None):
+        """Notify the display system about a new graduation announcement (sent in the background)"""
+        if not self.notify_display:
+            return
+        label = graduate['full_name'] if graduate else None
+        self.notifier.notify(graduate_id, label)
     
     def trigger_file_notification(self, graduate_id):
         """Fallback notification method using file system"""
@@ -198,76 +476,56 @@ class StageDetector:
         except Exception as e:
             print(f"File notification error: {e}")
     
-    def detect_people(self, frame):
-        """Detect people in the frame using HOG detector"""
-        # Convert to grayscale for better detection
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Detect people
-        boxes, weights = self.person_detector.detectMultiScale(
-            gray, 
-            winStride=(8, 8),
-            padding=(4, 4),
-            scale=1.05
-        )
-        
-        people = []
-        for (x, y, w, h) in boxes:
-            if weights[0] > 0.3:  # Confidence threshold
-                center_x = x + w // 2
-                center_y = y + h // 2
-                people.append({
-                    'x': center_x,
-                    'y': center_y,
-                    'width': w,
-                    'height': h,
-                    'confidence': weights[0]
-                })
-        
-        return people
+    def detect_people(self, frame, detector=None):
+        """Detect people with the configured backend (a worker passes its own detector clone)"""
+        return (detector or self.person_detector).detect(frame)
     
-    def analyze_movement(self, people):
-        """Analyze movement patterns and determine sequencing"""
-        if not people:
-            return None
-        
-        # Find the person closest to center
-        center_x = 480  # Center of 960x480 frame
-        closest_person = min(people, key=lambda p: abs(p['x'] - center_x))
-        
-        # Determine zone
-        if closest_person['x'] < 320:
-            zone = "left"
-        elif closest_person['x'] > 640:
-            zone = "right"
+    def zone_of(self, x):
+        """Name of the zone containing horizontal position x"""
+        for zone, (zx, _, zw, _) in (('left', self.left_zone), ('center', self.center_zone),
+                                     ('right', self.right_zone)):
+            if zx <= x < zx + zw:
+                return zone
+        return "left" if x < self.center_zone[0] else "right"
+    
+    def analyze_movement(self, people, now=None, moving=True):
+        """
+        Update the person tracks and evaluate the left -> center -> right sequence per person.
+        people=None means no detection ran for this frame: tracks are predicted forward
+        when the scene is moving and held in place when it is static.
+        """
+        now = time.time() if now is None else now
+        if people is not None:
+            self.tracker.update(people, now)
+        elif moving:
+            self.tracker.predict(now)
         else:
-            zone = "center"
+            self.tracker.hold(now)
         
-        # Track movement pattern
-        self.person_positions.append({
-            'zone': zone,
-            'timestamp': time.time(),
-            'person': closest_person
-        })
-        
-        # Keep only recent positions (last 5 seconds)
-        current_time = time.time()
-        self.person_positions = [p for p in self.person_positions 
-                               if current_time - p['timestamp'] < 5.0]
-        
-        # Analyze sequence pattern
-        if len(self.person_positions) >= 3:
-            zones = [p['zone'] for p in self.person_positions]
+        # Analyze sequence pattern per track, nearest to center first
+        since = now - self.sequence_window
+        center_x = self.center_zone[0] + self.center_zone[2] // 2
+        sequence_complete = False
+        self.ready_track_id = None
+        for track in sorted(self.tracker.tracks, key=lambda t: abs(t.person()['x'] - center_x)):
+            if track.samples_since(since) < 3:
+                continue
+            zones = track.zones_since(since)
             
             # Check for left -> center -> right pattern
-            if "left" in zones and "center" in zones and "right" in zones:
-                # Simple pattern detection - could be enhanced
-                return "sequence_complete"
+            if "left" in zones and "center" in zones[zones.index("left"):] and \
+                    "right" in zones[zones.index("center", zones.index("left")):]:
+                sequence_complete = True
             
-            # Check for center presence (ready for announcement)
-            if zone == "center" and len([p for p in self.person_positions if p['zone'] == "center"]) >= 2:
-                return "ready_for_announcement"
+            # Check for center presence (ready for announcement), once per person
+            if (self.ready_track_id is None and not track.announced and zones[-1] == "center"
+                    and track.samples_since(since, "center") >= 2):
+                self.ready_track_id = track.track_id
         
+        if sequence_complete:
+            return "sequence_complete"
+        if self.ready_track_id is not None:
+            return "ready_for_announcement"
         return None
     
     def draw_detection_zones(self, frame):
@@ -295,7 +553,8 @@ class StageDetector:
         for person in people:
             x, y, w, h = person['x'] - person['width']//2, person['y'] - person['height']//2, person['width'], person['height']
             cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 255), 2)
-            cv2.putText(frame, f"Person ({person['confidence']:.2f})", 
+            label = f"Person {person['track_id']}" if 'track_id' in person else "Person"
+            cv2.putText(frame, f"{label} ({person['confidence']:.2f})", 
                        (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
     
     def draw_status(self, frame, status, next_graduate):
@@ -308,27 +567,36 @@ class StageDetector:
             cv2.putText(frame, f"Next: {next_graduate['full_name']}", (10, 470), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
     
-    def process_frame(self, frame):
-        """Process a single frame for detection and analysis"""
-        # Detect people
-        people = self.detect_people(frame)
+    def process_frame(self, frame, people=None, detect=True, moving=True, now=None, draw=True):
+        """Process a single frame for detection and analysis (draw=False leaves the frame untouched)"""
+        now = time.time() if now is None else now
+        
+        # Detect people (unless a detection worker already did, or the tracker covers this frame)
+        if people is None and detect:
+            people = self.detect_people(frame)
         
         # Analyze movement
-        movement_result = self.analyze_movement(people)
+        movement_result = self.analyze_movement(people, now=now, moving=moving)
+        people = self.tracker.people()
         
-        # Get next graduate from queue
-        next_graduate = self.get_next_queued_graduate()
+        # Get next graduate from queue. Only a pending announcement checks the database for
+        # changes; every other frame (and the status line) uses the cached queue
+        next_graduate = self.get_next_queued_graduate(check=movement_result == "ready_for_announcement")
         
         # Handle sequencing logic
         if movement_result == "ready_for_announcement" and next_graduate:
-            if (not self.last_announcement or 
-                (datetime.now() - self.last_announcement).seconds > 3):
-                self.announce_graduate(next_graduate['id'])
+            if (self.last_announced_at is None or
+                    now - self.last_announced_at > self.announcement_cooldown):
+                if self.announce_graduate(next_graduate['id'], now=now):
+                    track = self.tracker.get(self.ready_track_id)
+                    if track is not None:
+                        track.announced = True
         
         # Draw visual elements
-        self.draw_detection_zones(frame)
-        self.draw_people(frame, people)
-        self.draw_status(frame, movement_result or "detecting", next_graduate)
+        if draw:
+            self.draw_detection_zones(frame)
+            self.draw_people(frame, people)
+            self.draw_status(frame, movement_result or "detecting", next_graduate)
         
         return frame, people, movement_result
     
@@ -365,6 +633,120 @@ class StageDetector:
                 self.cap.release()
             return False
     
+    def capture_loop(self):
+        """Capture thread: read continuously so the camera buffer never lags behind"""
+        # Track consecutive frame failures
+        consecutive_failures = 0
+        max_consecutive_failures = 10
+        
+        while self.is_running and self.cap is not None:
+            ret, frame = self.cap.read()
+            if not ret:
+                consecutive_failures += 1
+                print(f"Failed to grab frame ({consecutive_failures}/{max_consecutive_failures})")
+                
+                if consecutive_failures >= max_consecutive_failures:
+                    print("Too many consecutive frame failures, attempting camera restart...")
+                    self.cap.release()
+                    time.sleep(1)
+                    if self.start_camera():
+                        consecutive_failures = 0
+                        print("Camera restarted successfully")
+                    else:
+                        print("Failed to restart camera, switching to simulation mode...")
+                        self.cap = None
+                else:
+                    time.sleep(0.1)  # Short delay before retry
+                continue
+            
+            # Reset failure counter on successful frame
+            consecutive_failures = 0
+            self.frames_captured += 1
+            now = time.time()
+            action = self.gate_frame(frame, now)
+            if action == 'detect':
+                self.frame_slot.put((self.frames_captured, now, frame))
+            elif action is not None:
+                self.publish_result(PipelineResult(self.frames_captured, now, frame, None, action == 'track'))
+    
+    def gate_frame(self, frame, now):
+        """
+        Decide what a captured frame needs: 'detect', 'track' (moving, but between detections),
+        'hold' (static scene, time for a decision) or None (static, nothing to do)
+        """
+        action = None
+        if self.motion_gate.check(frame, now):
+            moving = self.motion_gate.last_energy >= self.motion_gate.threshold
+            self.frames_since_detection += 1
+            # Motion: detect every Nth frame and track the frames in between.
+            # A refresh pass (no motion for a while) is always detected.
+            if not moving or self.frames_since_detection >= self.detect_every_n_frames:
+                self.frames_since_detection = 0
+                action = 'detect'
+            else:
+                action = 'track'
+        else:
+            # Nothing moved: skip detection, but still let the decision loop see the
+            # scene now and then so people standing still keep their zone
+            self.pipeline_stats['frames_gated'] += 1
+            if now - self.last_static_decision >= self.static_decision_interval:
+                self.last_static_decision = now
+                action = 'hold'
+        self.pipeline_stats['motion_energy'] = round(self.motion_gate.last_energy, 4)
+        return action
+    
+    def detection_worker(self):
+        """Detection worker: run person detection on the newest captured frame"""
+        # Each worker gets its own detector so they never share HOG or cv2.dnn state
+        detector = self.person_detector.clone()
+        while self.is_running:
+            item = self.frame_slot.take(timeout=0.5)
+            if item is None:
+                continue
+            seq, captured_at, frame = item
+            try:
+                people = self.detect_people(frame, detector)
+            except Exception as e:
+                print(f"Detection error: {e}")
+                continue
+            self.publish_result(PipelineResult(seq, captured_at, frame, people, True))
+    
+    def publish_result(self, result):
+        """Hand a PipelineResult to the decision loop"""
+        try:
+            self.detection_results.put_nowait(result)
+        except queue.Full:
+            if result.people is None:
+                # Tracking-only frames never push out a detection
+                self.pipeline_stats['results_dropped'] += 1
+                return
+            # Under load keep the newest detections: drop the oldest pending result
+            try:
+                self.detection_results.get_nowait()
+                self.pipeline_stats['results_dropped'] += 1
+            except queue.Empty:
+                pass
+            try:
+                self.detection_results.put_nowait(result)
+            except queue.Full:
+                self.pipeline_stats['results_dropped'] += 1
+    
+    def start_pipeline(self):
+        """Start the capture thread and the detection worker pool"""
+        self.pipeline_threads = [threading.Thread(target=self.capture_loop, name='stage-capture', daemon=True)]
+        for i in range(self.detection_workers):
+            self.pipeline_threads.append(
+                threading.Thread(target=self.detection_worker, name=f'stage-detect-{i}', daemon=True))
+        for thread in self.pipeline_threads:
+            thread.start()
+    
+    def stop_pipeline(self):
+        """Wait for pipeline threads to notice is_running is False"""
+        for thread in self.pipeline_threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=2.0)
+        self.pipeline_threads = []
+    
     def run_detection(self):
         """Main detection loop"""
         # Retry database connection with backoff
@@ -397,14 +779,16 @@ class StageDetector:
         if not camera_available:
             print("Failed to start camera after multiple attempts")
             print("Running in simulation mode (no camera)")
+            print("To test detection on a recording instead, run: python stage_replay.py <video or image folder>")
             self.cap = None  # Set to None to indicate no camera
         
         self.is_running = True
+        if self.cap is not None:
+            self.start_pipeline()
         print("Stage detection system started successfully.")
         
-        # Track consecutive frame failures
-        consecutive_failures = 0
-        max_consecutive_failures = 10
+        # Sequence number of the newest detected frame decided on; older results that finish late are skipped
+        last_seq = 0
         
         try:
             while self.is_running:
@@ -422,32 +806,24 @@ class StageDetector:
                     time.sleep(5)  # Check every 5 seconds in simulation mode
                     continue
                 
-                # Normal camera mode
-                ret, frame = self.cap.read()
-                if not ret:
-                    consecutive_failures += 1
-                    print(f"Failed to grab frame ({consecutive_failures}/{max_consecutive_failures})")
-                    
-                    if consecutive_failures >= max_consecutive_failures:
-                        print("Too many consecutive frame failures, attempting camera restart...")
-                        self.cap.release()
-                        time.sleep(1)
-                        if self.start_camera():
-                            consecutive_failures = 0
-                            print("Camera restarted successfully")
-                        else:
-                            print("Failed to restart camera, switching to simulation mode...")
-                            self.cap = None
-                            continue
-                    else:
-                        time.sleep(0.1)  # Short delay before retry
-                        continue
-                
-                # Reset failure counter on successful frame
-                consecutive_failures = 0
+                # Normal camera mode: decide on the newest detection result.
+                # Database access stays on this thread; capture and detection run in the pipeline.
+                try:
+                    result = self.detection_results.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                # Detections that finish late, and tracking frames older than the newest detection, are skipped
+                if result.seq <= last_seq:
+                    continue
+                if result.people is not None:
+                    last_seq = result.seq
+                self.pipeline_stats['frames_dropped'] = self.frame_slot.dropped
+                self.pipeline_stats['last_latency_ms'] = round((time.time() - result.captured_at) * 1000.0, 1)
+                self.pipeline_stats['detector'] = self.person_detector.latency_report()
                 
                 # Process frame
-                processed_frame, people, movement_result = self.process_frame(frame)
+                processed_frame, people, movement_result = self.process_frame(
+                    result.frame, result.people, detect=False, moving=result.moving, now=result.captured_at)
                 
                 # Only display frame if we have a display (not running in background)
                 try:
@@ -467,9 +843,6 @@ class StageDetector:
                     # Running in headless mode, skip display
                     pass
                 
-                # Small delay to prevent excessive CPU usage
-                time.sleep(0.03)
-                
         except KeyboardInterrupt:
             print("Detection stopped by user")
         except Exception as e:
@@ -480,11 +853,13 @@ class StageDetector:
     def cleanup(self):
         """Clean up resources"""
         self.is_running = False
+        self.stop_pipeline()
+        self.notifier.stop()
         if self.cap:
             self.cap.release()
         cv2.destroyAllWindows()
         if hasattr(self, 'conn'):
-            self.conn.close()
+            database.release(self.db_path)
     
     def start(self):
         """Start the detection system in a separate thread"""
@@ -504,7 +879,18 @@ class StageDetector:
 
 def main():
     """Main function to run the stage detection system"""
-    detector = StageDetector()
+    import argparse
+    parser = argparse.ArgumentParser(description='Stage Detection System')
+    parser.add_argument('--db_path', default='data/app.sqlite', help='Database path')
+    parser.add_argument('--workers', type=int, default=2, help='Detection worker threads')
+    add_detector_arguments(parser)
+    args = parser.parse_args()
+    
+    options = detector_options_from_args(args)
+    detector = StageDetector(db_path=args.db_path, detection_workers=args.workers,
+                             detection_profile=options.pop('profile', 'balanced'),
+                             detection_width=options.pop('detection_width', None),
+                             detector_backend=args.detector, detector_options=options)
     
     try:
         detector.start()
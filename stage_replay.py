@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Stage Detection Replay
+Feeds a recorded ceremony video or image sequence through StageDetector's capture and decision path
+(motion gate, detection, tracking, announcement) and reports throughput, per-stage latency and the
+announcement timeline. Announcements go to an in-memory copy of the database, never to the real one.
+"""
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import sys
+import time
+
+import cv2
+
+import database
+from person_detection import add_detector_arguments, detector_options_from_args
+from stage_detection import StageDetector
+from timing import percentiles
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+STAGES = ('read', 'gate', 'detect', 'decide', 'total')
+
+
+class ReplaySource:
+    """
+    Frames from a video file, a directory of images or an image glob pattern. Timestamps are on
+    the recording's clock (seconds from the first frame), taken from the video's frame rate or fps.
+    """
+
+    def __init__(self, path, fps=None):
+        self.path = path
+        self.images = None
+        if os.path.isdir(path):
+            self.images = sorted(p for p in glob.glob(os.path.join(path, '*'))
+                                 if p.lower().endswith(IMAGE_EXTENSIONS))
+        elif any(c in path for c in '*?['):
+            self.images = sorted(glob.glob(path))
+        elif not os.path.exists(path):
+            raise FileNotFoundError(f"Replay source not found: {path}")
+
+        if self.images is not None:
+            if not self.images:
+                raise ValueError(f"No images found in {path}")
+            self.fps = fps or 30.0
+            self.frame_count = len(self.images)
+        else:
+            cap = cv2.VideoCapture(path)
+            if not cap.isOpened():
+                raise ValueError(f"Could not open video {path}")
+            self.fps = fps or cap.get(cv2.CAP_PROP_FPS) or 30.0
+            self.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            cap.release()
+
+    def frames(self):
+        """Yield (index, timestamp, frame)"""
+        if self.images is not None:
+            for index, image_path in enumerate(self.images):
+                frame = cv2.imread(image_path)
+                if frame is None:
+                    print(f"Skipping unreadable image {image_path}", file=sys.stderr)
+                    continue
+                yield index, index / self.fps, frame
+            return
+        cap = cv2.VideoCapture(self.path)
+        try:
+            index = 0
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                yield index, index / self.fps, frame
+                index += 1
+        finally:
+            cap.release()
+
+
+class StageReplay:
+    """
+    Runs one source through a StageDetector the way run_detection does with a camera, but
+    synchronously on the calling thread. As fast as possible by default; realtime=True paces
+    frames at the recording's rate and, like the live capture slot, drops frames once
+    processing falls behind.
+    """
+
+    def __init__(self, detector, source, realtime=False, max_frames=None):
+        self.detector = detector
+        self.source = source
+        self.realtime = realtime
+        self.max_frames = max_frames
+        self.latency = {stage: [] for stage in STAGES}
+        self.actions = {'detect': 0, 'track': 0, 'hold': 0, 'gated': 0}
+        self.announcements = []
+        self.frames_read = 0
+        self.frames_dropped = 0
+
+    def _record_announcement(self, index, timestamp):
+        graduate = self.detector.last_announced_graduate or {}
+        self.announcements.append({
+            'frame': index,
+            'time': round(timestamp, 2),
+            'graduate_id': graduate.get('id'),
+            'full_name': graduate.get('full_name'),
+            'track_id': self.detector.ready_track_id,
+        })
+
+    def run(self):
+        detector = self.detector
+        frame_interval = 1.0 / self.source.fps
+        frame_size = None
+        timestamp = 0.0
+        started = time.perf_counter()
+        read_started = started
+        for index, timestamp, frame in self.source.frames():
+            if self.max_frames and self.frames_read >= self.max_frames:
+                break
+            read_ms = (time.perf_counter() - read_started) * 1000.0
+            self.frames_read += 1
+
+            if self.realtime:
+                lag = (time.perf_counter() - started) - timestamp
+                if lag < 0:
+                    time.sleep(-lag)
+                elif lag > frame_interval:
+                    # The camera would have moved on: this frame never reaches the pipeline
+                    self.frames_dropped += 1
+                    read_started = time.perf_counter()
+                    continue
+
+            frame_started = time.perf_counter()
+            height, width = frame.shape[:2]
+            if frame_size != (width, height):
+                detector.configure_zones(width, height)
+                frame_size = (width, height)
+            detector.frames_captured += 1
+
+            action = detector.gate_frame(frame, timestamp)
+            gated_at = time.perf_counter()
+            self.latency['read'].append(read_ms)
+            self.latency['gate'].append((gated_at - frame_started) * 1000.0)
+            if action is None:
+                self.actions['gated'] += 1
+                self.latency['total'].append(read_ms + (gated_at - frame_started) * 1000.0)
+                read_started = time.perf_counter()
+                continue
+            self.actions[action] += 1
+
+            people = None
+            if action == 'detect':
+                people = detector.detect_people(frame)
+                self.latency['detect'].append((time.perf_counter() - gated_at) * 1000.0)
+
+            decide_started = time.perf_counter()
+            announced_at = detector.last_announced_at
+            detector.process_frame(frame, people, detect=False, moving=action != 'hold',
+                                   now=timestamp, draw=False)
+            finished = time.perf_counter()
+            self.latency['decide'].append((finished - decide_started) * 1000.0)
+            self.latency['total'].append(read_ms + (finished - frame_started) * 1000.0)
+            if detector.last_announced_at != announced_at:
+                self._record_announcement(index, timestamp)
+            read_started = time.perf_counter()
+
+        wall_seconds = time.perf_counter() - started
+        processed = self.frames_read - self.frames_dropped
+        return {
+            'source': self.source.path,
+            'realtime': self.realtime,
+            'frames': self.frames_read,
+            'frames_dropped': self.frames_dropped,
+            'actions': self.actions,
+            'recording_seconds': round(timestamp + frame_interval, 2) if self.frames_read else 0.0,
+            'wall_seconds': round(wall_seconds, 2),
+            'fps': round(processed / wall_seconds, 1) if wall_seconds > 0 else 0.0,
+            'speed': round((timestamp + frame_interval) / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+            'latency_ms': {stage: percentiles(samples) for stage, samples in self.latency.items()},
+            'detector': detector.person_detector.latency_report(),
+            'announcements': self.announcements,
+        }
+
+
+def open_dry_run_detector(db_path, **detector_kwargs):
+    """StageDetector on a private in-memory copy of db_path, with display notifications off"""
+    conn = database.connect(database.MEMORY_DB_PATH)
+    database.copy_database(db_path, conn)
+    detector = StageDetector(db_path=database.MEMORY_DB_PATH, detection_workers=1, notify_display=False,
+                             **detector_kwargs)
+    if not detector.connect_database():
+        raise RuntimeError('Could not open the dry-run database')
+    return detector
+
+
+def print_report(report):
+    print(f"Source: {report['source']}")
+    print(f"Frames: {report['frames']} ({report['frames_dropped']} dropped), "
+          f"{report['recording_seconds']}s of recording in {report['wall_seconds']}s "
+          f"({report['fps']} fps, {report['speed']}x)")
+    print("Frames by action: " + ', '.join(f"{k} {v}" for k, v in report['actions'].items()))
+    print("Latency (ms)      count    mean     p50     p90     p99     max")
+    for stage, stats in report['latency_ms'].items():
+        if stats['count']:
+            print(f"  {stage:<14} {stats['count']:>7} {stats['mean']:>7} {stats['p50']:>7} "
+                  f"{stats['p90']:>7} {stats['p99']:>7} {stats['max']:>7}")
+    print(f"Announcements: {len(report['announcements'])}")
+    for item in report['announcements']:
+        print(f"  {item['time']:>8.2f}s  frame {item['frame']:<6} track {item['track_id']}  "
+              f"{item['full_name']} (ID {item['graduate_id']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a recorded ceremony through stage detection (dry run)')
+    parser.add_argument('source', help='Video file, image directory or image glob pattern')
+    parser.add_argument('--db_path', default='data/app.sqlite', help='Database to copy for the dry run')
+    parser.add_argument('--fps', type=float, default=None,
+                        help='Frame rate of an image sequence, or override the video frame rate')
+    parser.add_argument('--realtime', action='store_true',
+                        help='Pace frames at the recording rate and drop frames when behind')
+    parser.add_argument('--max_frames', type=int, default=None, help='Stop after this many frames')
+    parser.add_argument('--detect_every', type=int, default=3, help='Detect every Nth moving frame')
+    parser.add_argument('--motion_threshold', type=float, default=0.02, help='Motion gate threshold (0 = off)')
+    parser.add_argument('--output_format', default='text', choices=['text', 'json'])
+    add_detector_arguments(parser)
+    args = parser.parse_args()
+
+    options = detector_options_from_args(args)
+    try:
+        source = ReplaySource(args.source, fps=args.fps)
+        # Detector status lines go to stderr so --output_format json stays parseable
+        with contextlib.redirect_stdout(sys.stderr):
+            detector = open_dry_run_detector(
+                args.db_path, detection_profile=options.pop('profile', 'balanced'),
+                detection_width=options.pop('detection_width', None), detector_backend=args.detector,
+                detector_options=options, detect_every_n_frames=args.detect_every,
+                motion_threshold=args.motion_threshold)
+            try:
+                report = StageReplay(detector, source, realtime=args.realtime, max_frames=args.max_frames).run()
+            finally:
+                detector.notifier.stop()
+                database.release(database.MEMORY_DB_PATH)
+    except (FileNotFoundError, ValueError, RuntimeError) as e:
+        print(f"Replay error: {e}", file=sys.stderr)
+        return 1
+
+    if args.output_format == 'json':
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from face_recognition_validator import LBPH_AVAILABLE, FaceRecognitionValidator
+
+pytestmark = pytest.mark.skipif(not LBPH_AVAILABLE, reason='needs opencv-contrib (cv2.face)')
+
+
+def template(seed):
+    return np.random.default_rng(seed).integers(0, 256, (80, 80), dtype=np.uint8)
+
+
+def validator_with(photos_dir, seeds):
+    validator = FaceRecognitionValidator(str(photos_dir), use_dcgan=False, use_template_index=False, autoload=False)
+    for seed in seeds:
+        validator._store_known_face(f'S{seed}', os.path.join(str(photos_dir), f'student_S{seed}_a.jpg'),
+                                    template(seed))
+    return validator
+
+
+def saved_state(photos_dir):
+    with open(os.path.join(str(photos_dir), '.face_cache', 'lbph.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_model_is_saved_and_read_back(tmp_path):
+    first = validator_with(tmp_path, range(4))
+    assert first.load_lbph_model()
+    saved = saved_state(tmp_path)
+    assert saved['samples'] == 4
+    assert os.path.exists(tmp_path / '.face_cache' / saved['model_file'])
+
+    second = validator_with(tmp_path, range(4))
+    second.load_lbph_model()
+    # Nothing changed: the saved model is used as is
+    assert saved_state(tmp_path) == saved
+    assert second.lbph_predict(template(2)) == ('s2', 0.0)
+
+
+def test_new_photo_is_added_with_update(tmp_path):
+    validator_with(tmp_path, range(3)).load_lbph_model()
+    old = saved_state(tmp_path)
+    validator = validator_with(tmp_path, range(4))
+    validator.load_lbph_model()
+    saved = saved_state(tmp_path)
+    assert saved['samples'] == 4
+    assert saved['version'] != old['version']
+    # Labels of the faces already in the model are kept
+    labels = {sid: label for sid, label, _, _ in saved['faces']}
+    assert {sid: label for sid, label, _, _ in old['faces']}.items() <= labels.items()
+    assert sorted(os.listdir(tmp_path / '.face_cache')) == ['lbph.json', saved['model_file']]
+    assert validator.lbph_predict(template(3)) == ('s3', 0.0)
+
+
+def test_allowed_ids_filter_per_label_distances(tmp_path):
+    validator = validator_with(tmp_path, range(5))
+    validator.load_lbph_model()
+    sid, distance = validator.lbph_predict(template(1), allowed_ids={'s3', 's4'})
+    assert sid in ('s3', 's4')
+    assert distance > 0.0
+    assert validator.lbph_predict(template(1), allowed_ids=set()) is None
+
+
+def test_unreadable_model_is_retrained(tmp_path):
+    validator_with(tmp_path, range(3)).load_lbph_model()
+    saved = saved_state(tmp_path)
+    with open(tmp_path / '.face_cache' / saved['model_file'], 'w') as f:
+        f.write('corrupt')
+    validator = validator_with(tmp_path, range(3))
+    assert validator.load_lbph_model()
+    assert validator.lbph_predict(template(0)) == ('s0', 0.0)
@@ -0,0 +1,105 @@
+import numpy as np
+
+from face_template_index import FaceTemplateIndex
+
+DIM = 16
+
+
+def record(student_id, photo_file, seed, mtime_ns=1, size=100):
+    rng = np.random.default_rng(seed)
+    template = rng.integers(0, 256, DIM, dtype=np.uint8)
+    vector = rng.normal(size=DIM).astype(np.float32)
+    return student_id, photo_file, mtime_ns, size, template, vector / np.linalg.norm(vector)
+
+
+def open_index(tmp_path, signature='v1'):
+    return FaceTemplateIndex(tmp_path / 'templates.idx', dim=DIM, signature=signature)
+
+
+def test_upsert_and_reopen(tmp_path):
+    index = open_index(tmp_path)
+    assert len(index) == 0
+    records = [record(f'S{i}', f'student_S{i}_photo.jpg', i) for i in range(3)]
+    assert index.upsert_many(records)
+    reopened = open_index(tmp_path)
+    assert len(reopened) == 3
+    assert reopened.student_ids == ['S0', 'S1', 'S2']
+    for student_id, photo_file, mtime_ns, size, template, vector in records:
+        row = reopened.lookup(photo_file, mtime_ns, size)
+        assert reopened.student_id(row) == student_id
+        assert np.array_equal(reopened.template(row), template)
+        assert np.array_equal(reopened.vector(row), vector)
+    assert np.array_equal(reopened.vectors, np.stack([r[5] for r in records]))
+
+
+def test_lookup_misses_changed_photo(tmp_path):
+    index = open_index(tmp_path)
+    index.upsert_many([record('S0', 'a.jpg', 0, mtime_ns=5, size=10)])
+    assert index.lookup('a.jpg', 5, 10) == 0
+    assert index.lookup('a.jpg', 6, 10) is None
+    assert index.lookup('a.jpg', 5, 11) is None
+    assert index.lookup('b.jpg', 5, 10) is None
+
+
+def test_replace_keeps_row_order_and_old_views(tmp_path):
+    index = open_index(tmp_path)
+    index.upsert_many([record(f'S{i}', f'{i}.jpg', i) for i in range(3)])
+    reader = open_index(tmp_path)
+    before = reader.vectors
+    old_row = before[1].copy()
+
+    replacement = record('S1', '1.jpg', 99, mtime_ns=2)
+    assert index.upsert_many([replacement])
+    assert index.row_of('1.jpg') == 1
+    assert np.array_equal(index.vector(1), replacement[5])
+    # A reader's existing mapping is a different file now and still shows the old row
+    assert np.array_equal(before[1], old_row)
+    assert reader.lookup('1.jpg', 2, 100) is None
+    reader._sync()
+    assert reader.lookup('1.jpg', 2, 100) == 1
+    assert np.array_equal(reader.vector(1), replacement[5])
+
+
+def test_append_is_visible_to_other_readers(tmp_path):
+    index = open_index(tmp_path)
+    index.upsert_many([record('S0', '0.jpg', 0)])
+    reader = open_index(tmp_path)
+    index.upsert_many([record('S1', '1.jpg', 1)])
+    assert len(reader) == 1
+    reader._sync()
+    assert len(reader) == 2
+    assert reader.student_id(1) == 'S1'
+
+
+def test_remove(tmp_path):
+    index = open_index(tmp_path)
+    records = [record(f'S{i}', f'{i}.jpg', i) for i in range(4)]
+    index.upsert_many(records)
+    reader = open_index(tmp_path)
+    before = reader.vectors
+    assert index.remove(['1.jpg', 'missing.jpg'])
+    assert index.photo_files() == ['0.jpg', '2.jpg', '3.jpg']
+    assert index.student_ids == ['S0', 'S2', 'S3']
+    assert np.array_equal(index.vectors, np.stack([records[i][5] for i in (0, 2, 3)]))
+    assert np.array_equal(before[1], records[1][5])
+    reopened = open_index(tmp_path)
+    assert reopened.photo_files() == ['0.jpg', '2.jpg', '3.jpg']
+    assert reopened.lookup('1.jpg', 1, 100) is None
+
+
+def test_grows_past_capacity(tmp_path):
+    index = open_index(tmp_path)
+    count = FaceTemplateIndex.MIN_CAPACITY + 5
+    index.upsert_many([record(f'S{i}', f'{i}.jpg', i) for i in range(10)])
+    index.upsert_many([record(f'S{i}', f'{i}.jpg', i) for i in range(10, count)])
+    assert index.capacity >= count
+    reopened = open_index(tmp_path)
+    assert len(reopened) == count
+    assert reopened.student_id(count - 1) == f'S{count - 1}'
+    assert np.array_equal(reopened.vector(count - 1), record('x', 'x', count - 1)[5])
+
+
+def test_other_signature_starts_empty(tmp_path):
+    open_index(tmp_path).upsert_many([record('S0', '0.jpg', 0)])
+    assert len(open_index(tmp_path, signature='v2')) == 0
+    assert len(open_index(tmp_path)) == 1
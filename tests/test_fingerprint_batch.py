@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+import pytest
+
+from fingerprint_verification import FingerprintVerifier
+
+
+def ridge_image(seed, size=128):
+    """Blurred noise with ridge-like stripes at a random angle and spacing"""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:size, 0:size].astype(np.float32)
+    angle = rng.uniform(0, np.pi)
+    phase = (xx * np.cos(angle) + yy * np.sin(angle)) * 2 * np.pi / rng.uniform(6, 11)
+    image = 128 + 100 * np.cos(phase) + rng.normal(0, 20, (size, size))
+    return cv2.GaussianBlur(np.clip(image, 0, 255).astype(np.uint8), (3, 3), 0)
+
+
+@pytest.fixture(scope='module')
+def verifier(tmp_path_factory):
+    return FingerprintVerifier(str(tmp_path_factory.mktemp('uploads')), use_feature_cache=False)
+
+
+@pytest.fixture(scope='module')
+def references(verifier):
+    features = [verifier.extract_features(ridge_image(seed)) for seed in range(6)]
+    # A reference without corner points takes the neutral 0.5 points term
+    features[2]['corner_points'] = []
+    return features
+
+
+def test_batch_matches_scalar(verifier, references):
+    stacked = verifier.stack_reference_features(references)
+    for seed in (0, 3, 100, 101):
+        probe = verifier.extract_features(ridge_image(seed))
+        batch = verifier.compare_fingerprints_batch(probe, stacked)
+        scalar = [verifier.compare_fingerprints(probe, reference) for reference in references]
+        assert batch.shape == (len(references),)
+        assert batch == pytest.approx(scalar, abs=1e-9)
+
+
+def test_batch_matches_scalar_for_probe_without_corners(verifier, references):
+    probe = verifier.extract_features(ridge_image(7))
+    probe['corner_points'] = []
+    batch = verifier.compare_fingerprints_batch(probe, verifier.stack_reference_features(references))
+    scalar = [verifier.compare_fingerprints(probe, reference) for reference in references]
+    assert batch == pytest.approx(scalar, abs=1e-9)
+
+
+def test_same_image_scores_highest(verifier, references):
+    probe = verifier.extract_features(ridge_image(4))
+    scores = verifier.compare_fingerprints_batch(probe, verifier.stack_reference_features(references))
+    assert int(np.argmax(scores)) == 4
+    assert scores[4] == pytest.approx(1.0, abs=1e-6)
+    assert scores[4] >= verifier.min_match_score
+
+
+def test_empty_stack(verifier, references):
+    probe = verifier.extract_features(ridge_image(0))
+    empty = {'lbp_histogram': np.zeros((0, 256))}
+    assert verifier.compare_fingerprints_batch(probe, empty).shape == (0,)
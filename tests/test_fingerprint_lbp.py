@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from fingerprint_verification import FingerprintVerifier, LBP_NEIGHBOR_OFFSETS, _lbp_mapping
+
+
+def loop_lbp(image, radius=1):
+    """The original per-pixel LBP, generalized to any radius"""
+    lbp = np.zeros_like(image)
+    for i in range(radius, image.shape[0] - radius):
+        for j in range(radius, image.shape[1] - radius):
+            center = image[i, j]
+            code = 0
+            for k, (dy, dx) in enumerate(LBP_NEIGHBOR_OFFSETS):
+                if image[i + dy * radius, j + dx * radius] >= center:
+                    code |= (1 << k)
+            lbp[i, j] = code
+    return lbp
+
+
+def transitions(code):
+    bits = [(code >> k) & 1 for k in range(8)]
+    return sum(bits[k] != bits[(k + 1) % 8] for k in range(8))
+
+
+@pytest.fixture
+def verifier(tmp_path):
+    return FingerprintVerifier(str(tmp_path), use_feature_cache=False)
+
+
+@pytest.mark.parametrize('radius', [1, 2, 3])
+@pytest.mark.parametrize('shape', [(40, 37), (2 * 3 + 1, 9), (5, 5)])
+def test_vectorized_lbp_matches_loop(verifier, radius, shape):
+    rng = np.random.default_rng(radius)
+    # Few grey levels, so ties (neighbour == centre) are common
+    image = rng.integers(0, 4, size=shape, dtype=np.uint8) * 60
+    assert np.array_equal(verifier._compute_lbp(image, radius), loop_lbp(image, radius))
+
+
+def test_lbp_of_image_smaller_than_neighbourhood_is_zero(verifier):
+    image = np.full((2, 10), 7, dtype=np.uint8)
+    assert not verifier._compute_lbp(image).any()
+
+
+def test_uniform_mapping():
+    table, bins = _lbp_mapping('uniform')
+    assert bins == 59
+    uniform = [code for code in range(256) if transitions(code) <= 2]
+    assert len(uniform) == 58
+    assert sorted(set(table[uniform].tolist())) == list(range(58))
+    assert set(table[[code for code in range(256) if transitions(code) > 2]].tolist()) == {58}
+
+
+def test_rotation_invariant_mapping():
+    table, bins = _lbp_mapping('rotation_invariant')
+    assert bins == 36
+    for code in range(256):
+        rotated = ((code >> 1) | (code << 7)) & 0xFF
+        assert table[code] == table[rotated]
+    assert len(set(table.tolist())) == 36
+
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        _lbp_mapping('ror')
+
+
+def test_histogram_concatenates_radii(tmp_path):
+    verifier = FingerprintVerifier(str(tmp_path), lbp_method='uniform', lbp_radii=(1, 2), use_feature_cache=False)
+    image = np.random.default_rng(0).integers(0, 256, size=(32, 32), dtype=np.uint8)
+    hist = verifier._compute_lbp_histogram(image)
+    assert hist.shape == (2 * 59,)
+    table, _ = _lbp_mapping('uniform')
+    expected = np.bincount(table[loop_lbp(image, 2)].ravel(), minlength=59)
+    assert np.array_equal(hist[59:], expected)
+    # Default settings give the original 256-bin histogram
+    default = FingerprintVerifier(str(tmp_path), use_feature_cache=False)._compute_lbp_histogram(image)
+    assert np.array_equal(default, np.histogram(loop_lbp(image), bins=256, range=(0, 256))[0])
+
+
+@pytest.mark.parametrize('radii', [(0,), (1, -2)])
+def test_radius_below_one_is_rejected(tmp_path, radii):
+    with pytest.raises(ValueError, match='radii'):
+        FingerprintVerifier(str(tmp_path), lbp_radii=radii, use_feature_cache=False)
@@ -0,0 +1,78 @@
+import cv2
+import numpy as np
+import pytest
+
+from frame_io import decode_frame, frame_from_raw, load_frame, parse_shape
+
+
+@pytest.fixture
+def image():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, size=(24, 32, 3), dtype=np.uint8)
+
+
+def test_parse_shape():
+    assert parse_shape('480x640') == (480, 640, 3)
+    assert parse_shape('480X640x1') == (480, 640, 1)
+    assert parse_shape('480,640,4') == (480, 640, 4)
+    for text in ('480', '480x640x2', '0x640', 'axb', None):
+        with pytest.raises(ValueError):
+            parse_shape(text)
+
+
+@pytest.mark.parametrize('wrap', [bytes, bytearray, memoryview])
+def test_decode_png_round_trip(image, wrap):
+    ok, encoded = cv2.imencode('.png', image)
+    assert ok
+    assert np.array_equal(decode_frame(wrap(encoded.tobytes())), image)
+
+
+def test_decode_errors():
+    with pytest.raises(ValueError, match='Empty'):
+        decode_frame(b'')
+    with pytest.raises(ValueError, match='decode'):
+        decode_frame(b'not an image')
+
+
+@pytest.mark.parametrize('wrap', [bytes, bytearray, memoryview])
+def test_raw_round_trip_is_read_only_view(image, wrap):
+    data = wrap(image.tobytes())
+    frame = frame_from_raw(data, image.shape)
+    assert np.array_equal(frame, image)
+    assert not frame.flags.writeable
+    assert not frame.flags.owndata
+    with pytest.raises(ValueError):
+        frame[0, 0] = 0
+
+
+def test_writable_copies_only_immutable_buffers(image):
+    frame = frame_from_raw(image.tobytes(), image.shape, writable=True)
+    frame[0, 0] = 0
+    assert frame.flags.writeable
+
+    data = bytearray(image.tobytes())
+    frame = frame_from_raw(data, image.shape, writable=True)
+    frame[0, 0] = (1, 2, 3)
+    # A writable buffer is drawn on in place
+    assert data[:3] == bytearray(b'\x01\x02\x03')
+
+
+def test_gray_and_bgra_are_converted(image):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    frame = frame_from_raw(gray.tobytes(), gray.shape + (1,))
+    assert frame.shape == image.shape
+    assert np.array_equal(frame[..., 0], gray)
+
+    bgra = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+    assert np.array_equal(frame_from_raw(bgra.tobytes(), bgra.shape), image)
+
+
+def test_raw_size_mismatch(image):
+    with pytest.raises(ValueError, match='expected'):
+        frame_from_raw(image.tobytes()[:-1], image.shape)
+
+
+def test_load_frame_picks_raw_or_encoded(image):
+    assert np.array_equal(load_frame(image.tobytes(), image.shape), image)
+    ok, encoded = cv2.imencode('.png', image)
+    assert np.array_equal(load_frame(encoded.tobytes()), image)
@@ -0,0 +1,146 @@
+import sqlite3
+import time
+
+import pytest
+
+import database
+from stage_detection import GraduateQueueCache
+
+SCHEMA = """
+CREATE TABLE graduates (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id TEXT NOT NULL,
+    full_name TEXT NOT NULL,
+    program TEXT NOT NULL,
+    queued_at TEXT,
+    announced_at TEXT
+);
+CREATE TABLE current_announcement (id INTEGER PRIMARY KEY, graduate_id INTEGER, updated_at TEXT);
+INSERT INTO current_announcement (id, graduate_id, updated_at) VALUES (1, NULL, datetime('now'));
+"""
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(time, 'monotonic', fake)
+    return fake
+
+
+@pytest.fixture
+def connections(tmp_path):
+    path = str(tmp_path / 'app.sqlite')
+    # php plays the web side writing to the queue; detector is the cache's own connection
+    php = sqlite3.connect(path, isolation_level=None)
+    php.executescript(SCHEMA)
+    detector = sqlite3.connect(path, isolation_level=None)
+    detector.row_factory = sqlite3.Row
+    yield php, detector
+    php.close()
+    detector.close()
+
+
+def enqueue(conn, number):
+    conn.execute("INSERT INTO graduates (student_id, full_name, program, queued_at) "
+                 "VALUES (?, ?, 'BSc', datetime('now', ?))", (f'S{number}', f'Graduate {number}', f'+{number} seconds'))
+
+
+def test_loads_queue_in_order(connections, clock):
+    php, detector = connections
+    for number in (1, 2, 3):
+        enqueue(php, number)
+    cache = GraduateQueueCache(detector)
+    assert cache.peek()['student_id'] == 'S1'
+    assert [g['student_id'] for g in cache.pending] == ['S1', 'S2', 'S3']
+    assert cache.stats['reloads'] == 1
+
+
+def test_unchecked_peeks_run_no_queries(connections, clock):
+    php, detector = connections
+    enqueue(php, 1)
+    cache = GraduateQueueCache(detector, check_interval=0.0)
+    cache.peek()
+    enqueue(php, 0)
+    for _ in range(50):
+        clock.now += 0.1
+        assert cache.peek(check=False)['student_id'] == 'S1'
+    assert cache.stats == {'reloads': 1, 'version_checks': 0}
+    # A checked peek sees the other connection's commit
+    assert cache.peek()['student_id'] == 'S0'
+    assert cache.stats == {'reloads': 2, 'version_checks': 1}
+
+
+def test_version_checks_are_rate_limited(connections, clock):
+    php, detector = connections
+    enqueue(php, 1)
+    cache = GraduateQueueCache(detector, check_interval=5.0)
+    cache.peek()
+    enqueue(php, 0)
+    clock.now += 1.0
+    assert cache.peek()['student_id'] == 'S1'
+    assert cache.stats['version_checks'] == 0
+    clock.now += 5.0
+    assert cache.peek()['student_id'] == 'S0'
+    assert cache.stats['version_checks'] == 1
+
+
+def test_unchanged_database_is_not_reloaded(connections, clock):
+    php, detector = connections
+    enqueue(php, 1)
+    cache = GraduateQueueCache(detector, check_interval=0.0)
+    cache.peek()
+    clock.now += 1.0
+    cache.peek()
+    assert cache.stats == {'reloads': 1, 'version_checks': 1}
+
+
+def test_ttl_reloads_even_without_checks(connections, clock):
+    php, detector = connections
+    enqueue(php, 1)
+    cache = GraduateQueueCache(detector, ttl=30.0)
+    cache.peek(check=False)
+    enqueue(php, 0)
+    clock.now += 29.0
+    assert cache.peek(check=False)['student_id'] == 'S1'
+    clock.now += 1.0
+    assert cache.peek(check=False)['student_id'] == 'S0'
+
+
+def test_invalidate_and_pop(connections, clock):
+    php, detector = connections
+    for number in (1, 2):
+        enqueue(php, number)
+    cache = GraduateQueueCache(detector)
+    first = cache.peek()
+    assert database.announce_graduate(detector, first['id'])
+    # Our own commit does not change data_version for this connection, so pop() keeps the list current
+    assert cache.pop(first['id'])['student_id'] == 'S1'
+    assert cache.pop(first['id']) is None
+    assert cache.peek(check=False)['student_id'] == 'S2'
+    php.execute("UPDATE graduates SET announced_at = datetime('now')")
+    cache.invalidate()
+    assert cache.peek(check=False) is None
+
+
+def test_stale_cache_cannot_announce_after_queue_reset(connections, clock):
+    php, detector = connections
+    enqueue(php, 1)
+    cache = GraduateQueueCache(detector, check_interval=5.0)
+    cache.peek()
+    # The stage page resets the queue within check_interval, so the cache still lists S1
+    php.execute("UPDATE graduates SET queued_at = NULL, announced_at = NULL")
+    php.execute("UPDATE current_announcement SET graduate_id = NULL WHERE id = 1")
+    clock.now += 1.0
+    stale = cache.peek()
+    assert stale['student_id'] == 'S1'
+    assert not database.announce_graduate(detector, stale['id'])
+    assert php.execute("SELECT announced_at FROM graduates WHERE id = ?", (stale['id'],)).fetchone() == (None,)
+    assert php.execute("SELECT graduate_id FROM current_announcement").fetchone() == (None,)
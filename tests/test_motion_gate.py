@@ -0,0 +1,67 @@
+import numpy as np
+
+from stage_detection import MotionGate
+
+ZONES = [(0, 0, 320, 480), (320, 0, 320, 480)]
+
+
+def frame(box=None, value=220):
+    """Grey 640x480 frame, optionally with a bright (x, y, w, h) box"""
+    image = np.full((480, 640, 3), 60, dtype=np.uint8)
+    if box is not None:
+        x, y, w, h = box
+        image[y:y + h, x:x + w] = value
+    return image
+
+
+def test_first_frame_passes():
+    gate = MotionGate(ZONES)
+    assert gate.check(frame(), now=0.0)
+    assert gate.last_energy == 1.0
+
+
+def test_static_scene_is_skipped_until_idle_timeout():
+    gate = MotionGate(ZONES, max_idle_seconds=5.0)
+    assert gate.check(frame(), now=0.0)
+    assert not gate.check(frame(), now=1.0)
+    assert gate.last_energy == 0.0
+    assert not gate.check(frame(), now=4.9)
+    assert gate.check(frame(), now=5.0)
+
+
+def test_motion_in_one_zone_passes():
+    gate = MotionGate(ZONES, threshold=0.02)
+    gate.check(frame(), now=0.0)
+    # 80x200 px is ~10% of one zone but only ~5% of the frame
+    assert gate.check(frame((400, 100, 80, 200)), now=0.5)
+    assert 0.09 < gate.last_energy < 0.12
+
+
+def test_small_motion_is_skipped():
+    gate = MotionGate(ZONES, threshold=0.02)
+    gate.check(frame(), now=0.0)
+    assert not gate.check(frame((100, 100, 8, 8)), now=0.5)
+
+
+def test_motion_outside_zones_is_ignored():
+    gate = MotionGate([(0, 0, 320, 240)])
+    gate.check(frame(), now=0.0)
+    assert not gate.check(frame((400, 300, 200, 150)), now=0.5)
+    assert gate.last_energy == 0.0
+
+
+def test_slow_motion_accumulates_against_last_passed_frame():
+    gate = MotionGate(ZONES, threshold=0.05, max_idle_seconds=60.0)
+    gate.check(frame(), now=0.0)
+    passed = []
+    for step in range(1, 8):
+        # The box grows a little each frame; each step alone stays under the threshold
+        passed.append(gate.check(frame((40, 100, 12 * step, 100)), now=float(step)))
+    assert not passed[0]
+    assert any(passed)
+
+
+def test_resolution_change_passes():
+    gate = MotionGate(ZONES)
+    gate.check(frame(), now=0.0)
+    assert gate.check(np.full((240, 320, 3), 60, dtype=np.uint8), now=0.5)
@@ -0,0 +1,83 @@
+from person_tracking import PersonTracker, box_of, iou
+
+
+def person(x, y=240, width=80, height=200, confidence=0.9):
+    return {'x': x, 'y': y, 'width': width, 'height': height, 'confidence': confidence}
+
+
+def zone_of(x):
+    return 'left' if x < 213 else ('center' if x < 426 else 'right')
+
+
+def ids(people):
+    return [p['track_id'] for p in people]
+
+
+def test_iou():
+    a = box_of(person(100))
+    assert iou(a, a) == 1.0
+    assert iou(a, box_of(person(400))) == 0.0
+    # Half the width overlaps: intersection 40x200, union 120x200
+    assert abs(iou(a, box_of(person(140))) - 1 / 3) < 1e-9
+
+
+def test_ids_persist_while_people_walk():
+    tracker = PersonTracker(zone_of)
+    first = tracker.update([person(100), person(500)], now=0.0)
+    assert ids(first) == [1, 2]
+    for step in range(1, 6):
+        # Detector order changes between frames; IDs follow the people
+        people = tracker.update([person(500 - 20 * step), person(100 + 30 * step)], now=float(step))
+        by_id = {p['track_id']: p['x'] for p in people}
+        assert set(by_id) == {1, 2}
+        assert abs(by_id[1] - (100 + 30 * step)) < 25
+        assert abs(by_id[2] - (500 - 20 * step)) < 25
+
+
+def test_new_person_gets_new_id_and_lost_track_is_dropped():
+    tracker = PersonTracker(zone_of, max_misses=2)
+    tracker.update([person(100)], now=0.0)
+    people = tracker.update([person(100), person(550)], now=1.0)
+    assert sorted(ids(people)) == [1, 2]
+    for step in range(2, 5):
+        people = tracker.update([person(550)], now=float(step))
+    # Track 1 missed three detections in a row (more than max_misses)
+    assert ids(people) == [2]
+    people = tracker.update([person(100), person(550)], now=5.0)
+    assert sorted(ids(people)) == [2, 3]
+
+
+def test_far_detection_is_not_associated():
+    tracker = PersonTracker(zone_of, max_centroid_distance=120.0)
+    tracker.update([person(100)], now=0.0)
+    people = tracker.update([person(400)], now=0.5)
+    assert sorted(ids(people)) == [1, 2]
+
+
+def test_predict_follows_velocity_between_detections():
+    tracker = PersonTracker(zone_of)
+    for step in range(6):
+        tracker.update([person(100 + 40 * step)], now=float(step))
+    last_x = tracker.people()[0]['x']
+    predicted = tracker.predict(now=6.0)[0]
+    assert predicted['track_id'] == 1
+    assert predicted['x'] > last_x + 20
+
+
+def test_hold_keeps_tracks_in_place_and_records_zones():
+    tracker = PersonTracker(zone_of)
+    for step in range(4):
+        tracker.update([person(100 + 40 * step)], now=float(step))
+    held = tracker.hold(now=10.0)[0]
+    assert abs(held['x'] - tracker.predict(now=12.0)[0]['x']) <= 1
+    track = tracker.get(1)
+    assert track.zones_since(0.0) == ['left', 'center']
+    assert track.samples_since(10.0, 'center') >= 1
+    assert tracker.get(99) is None
+
+
+def test_tracks_expire_after_max_age():
+    tracker = PersonTracker(zone_of, max_age_seconds=15.0)
+    tracker.update([person(100)], now=0.0)
+    assert tracker.hold(now=15.0)
+    assert tracker.hold(now=15.5) == []
@@ -0,0 +1,102 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+import timing
+
+
+@pytest.fixture(autouse=True)
+def clean_env(monkeypatch):
+    monkeypatch.delenv(timing.ENABLE_ENV, raising=False)
+    monkeypatch.delenv(timing.LOG_ENV, raising=False)
+
+
+def test_disabled_by_default():
+    timings = timing.Timings('tool')
+    assert not timings.enabled
+    with timings.span('detect'):
+        pass
+    assert timings.seconds == {}
+    result = {'success': True}
+    assert timings.attach(result) is result
+    assert 'timings' not in result
+
+
+def test_spans_add_up():
+    timings = timing.Timings('tool', enabled=True)
+    assert 'imports' in timings.seconds
+    for _ in range(2):
+        with timings.span('match'):
+            time.sleep(0.01)
+    assert timings.seconds['match'] >= 0.02
+    with pytest.raises(RuntimeError):
+        with timings.span('fail'):
+            raise RuntimeError()
+    # A span that raised is still recorded
+    assert 'fail' in timings.seconds
+
+
+def test_attach_reports_milliseconds():
+    timings = timing.Timings('tool', enabled=True)
+    timings.add('detect', 0.0125)
+    result = timings.attach({'success': True})
+    report = result['timings']
+    assert report['stages_ms']['detect'] == 12.5
+    assert report['total_ms'] >= report['stages_ms']['imports']
+    assert timings.attach(['not', 'a', 'dict']) == ['not', 'a', 'dict']
+
+
+def test_enabled_from_environment(monkeypatch):
+    monkeypatch.setenv(timing.ENABLE_ENV, '1')
+    assert timing.Timings('tool').enabled
+    monkeypatch.setenv(timing.ENABLE_ENV, 'off')
+    assert not timing.Timings('tool').enabled
+
+
+def test_log_path_from_environment(monkeypatch, tmp_path):
+    assert timing.log_path_from_env() is None
+    monkeypatch.setenv(timing.LOG_ENV, 'yes')
+    assert timing.log_path_from_env() == timing.DEFAULT_LOG_PATH
+    monkeypatch.setenv(timing.LOG_ENV, str(tmp_path / 'custom.log'))
+    assert timing.log_path_from_env() == str(tmp_path / 'custom.log')
+
+
+def test_log_appends_and_rotates(monkeypatch, tmp_path):
+    log_path = tmp_path / 'logs' / 'timings.log'
+    monkeypatch.setenv(timing.LOG_ENV, str(log_path))
+    monkeypatch.setattr(timing, 'LOG_MAX_BYTES', 200)
+    timings = timing.Timings('face_verify')
+    assert timings.enabled
+    timings.attach({'success': True})
+    timings.attach({'ok': False})
+    lines = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert [(line['tool'], line['success']) for line in lines] == [('face_verify', True), ('face_verify', False)]
+    assert 'stages_ms' in lines[0]
+    # Past LOG_MAX_BYTES the log moves to .1 and a new one starts
+    timings.attach({'success': True})
+    assert (tmp_path / 'logs' / 'timings.log.1').exists()
+    assert len(log_path.read_text().splitlines()) == 1
+
+
+def test_module_span_without_timings():
+    with timing.span(None, 'detect'):
+        pass
+    timings = timing.Timings('tool', enabled=True)
+    with timing.span(timings, 'detect'):
+        pass
+    assert 'detect' in timings.seconds
+
+
+def test_percentiles_match_numpy():
+    assert timing.percentiles([]) == {'count': 0}
+    rng = np.random.default_rng(0)
+    for size in (1, 2, 7, 100, 1001):
+        samples = rng.uniform(0, 100, size).tolist()
+        summary = timing.percentiles(samples)
+        p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+        assert summary['count'] == size
+        assert (summary['p50'], summary['p90'], summary['p99']) == (round(p50, 2), round(p90, 2), round(p99, 2))
+        assert summary['max'] == round(max(samples), 2)
+        assert summary['mean'] == pytest.approx(np.mean(samples), abs=0.006)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+CLI Timings
+Opt-in per-stage wall-clock timings for the integration CLIs, so a slow request from PHP can be
+traced to imports, template loading, detection or matching.
+
+Enable with --timings or CLI_TIMINGS=1 to add a 'timings' object to the JSON result. Set
+CLI_TIMINGS_LOG=1 (or to a file path) to also append each run's timings to logs/timings.log,
+one JSON line per run, rotated once it grows past LOG_MAX_BYTES. percentiles() summarizes
+latency samples for stage_replay.py and the benchmarks.
+"""
+
+import contextlib
+import json
+import math
+import os
+import sys
+import time
+from datetime import datetime
+
+# Start of the clock: CLIs import this module before their heavy imports (cv2, numpy, models)
+IMPORTED_AT = time.perf_counter()
+
+ENABLE_ENV = 'CLI_TIMINGS'
+LOG_ENV = 'CLI_TIMINGS_LOG'
+DEFAULT_LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'timings.log')
+LOG_MAX_BYTES = 5 * 1024 * 1024
+
+
+def _env_flag(name):
+    return os.environ.get(name, '').strip().lower() not in ('', '0', 'false', 'no', 'off')
+
+
+def log_path_from_env():
+    """Rolling log path from CLI_TIMINGS_LOG: '1' means logs/timings.log, anything else is a path"""
+    value = os.environ.get(LOG_ENV, '').strip()
+    if not _env_flag(LOG_ENV):
+        return None
+    return DEFAULT_LOG_PATH if value.lower() in ('1', 'true', 'yes', 'on') else value
+
+
+def add_timing_argument(parser):
+    parser.add_argument('--timings', action='store_true',
+                        help=f'Add per-stage timings to the JSON result (or set {ENABLE_ENV}=1)')
+
+
+class Timings:
+    """
+    Seconds per named stage on the monotonic clock. Spans with the same name add up, and
+    .seconds can be handed to code that takes a plain timings dict (e.g. FaceRecognitionValidator).
+    When disabled, span() does nothing and attach() leaves the result untouched.
+    """
+
+    def __init__(self, tool, enabled=False):
+        self.tool = tool
+        self.log_path = log_path_from_env()
+        self.enabled = bool(enabled) or _env_flag(ENABLE_ENV) or self.log_path is not None
+        self.seconds = {}
+        if self.enabled:
+            # Everything between importing this module and starting work: mostly module imports
+            self.add('imports', time.perf_counter() - IMPORTED_AT)
+
+    def add(self, stage, seconds):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def span(self, stage):
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def report(self):
+        return {
+            'total_ms': round((time.perf_counter() - IMPORTED_AT) * 1000.0, 2),
+            'stages_ms': {stage: round(seconds * 1000.0, 2) for stage, seconds in self.seconds.items()},
+        }
+
+    def attach(self, result):
+        """Add result['timings'] (and log the run) when enabled; returns result for json.dumps"""
+        if not self.enabled or not isinstance(result, dict):
+            return result
+        result['timings'] = self.report()
+        if self.log_path:
+            self.write_log(result)
+        return result
+
+    def write_log(self, result):
+        entry = {
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'tool': self.tool,
+            'pid': os.getpid(),
+            'success': bool(result.get('success', result.get('ok', False))),
+        }
+        entry.update(result['timings'])
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+            if os.path.exists(self.log_path) and os.path.getsize(self.log_path) > LOG_MAX_BYTES:
+                os.replace(self.log_path, self.log_path + '.1')
+            # One short append per run, so concurrent CLI processes do not interleave lines
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+        except OSError as e:
+            print(f"Could not write timings log {self.log_path}: {e}", file=sys.stderr)
+
+
+def span(timings, stage):
+    """timings.span(stage), or a no-op when timings is None (library callers that do not time)"""
+    return timings.span(stage) if timings is not None else contextlib.nullcontext()
+
+
+def _percentile(ordered, q):
+    # Linear interpolation between closest ranks, as numpy.percentile does by default
+    position = (len(ordered) - 1) * q / 100.0
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def percentiles(samples):
+    """Count, mean, p50/p90/p99 and max of latency samples (ms), rounded to 0.01"""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(float(v) for v in samples)
+    return {
+        'count': len(ordered),
+        'mean': round(sum(ordered) / len(ordered), 2),
+        'p50': round(_percentile(ordered, 50), 2),
+        'p90': round(_percentile(ordered, 90), 2),
+        'p99': round(_percentile(ordered, 99), 2),
+        'max': round(ordered[-1], 2),
+    }